@@ -0,0 +1,409 @@
+"""End-to-end latency benchmarks for the CodeLab and Data Insights flows.
+
+Drives ``code_refactoring`` and ``data_analysis`` headlessly with Streamlit's
+AppTest against the mock LLM backend, for a matrix of code sizes and CSV
+sizes, and writes the timings as JSON. Response caches are disabled and the
+tokenizer is never downloaded, so the benchmark runs without network access.
+
+Usage:
+    python benchmarks/bench_e2e.py [--output FILE] [--baseline FILE]
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from statistics import median
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+sys.path.insert(0, SRC_DIR)
+
+# Timings of every model response streamed during the current run.
+STREAM_TIMINGS = []
+
+CODE_LAB_OPTIONS = {
+    "model_parameters": {"temperature": 0.3, "top_p": 0.9},
+    "refactor_options": {
+        "programming_language": "Python",
+        "optimize_for": ["Performance"],
+        "autogenerate_docstring": True,
+        "docstring_format": "Google",
+        "include_type_annotations": True,
+        "comment_verbosity": "Minimal",
+    },
+}
+DATA_INSIGHTS_OPTIONS = {
+    "menu_selection": "Data Analysis",
+    "model_parameters": {"temperature": 0.3, "top_p": 0.9},
+    "analysis_options": {
+        "data_sample": True,
+        "data_summary": True,
+        "descriptive_statistics": True,
+        "correlation": True,
+        "data_quality": True,
+        "data_insights": True,
+    },
+}
+
+
+def code_lab_app(options):
+    import streamlit as st
+    import layout.code_refactoring_page as code_refactoring_page
+
+    # AppTest cannot type into the ACE editor component.
+    code_refactoring_page.get_user_provided_code = (
+        lambda language: st.session_state["benchmark_code"]
+    )
+    code_refactoring_page.code_refactoring(options)
+
+
+def data_insights_app(options):
+    from layout.data_analysis_page import data_analysis
+
+    data_analysis(options)
+
+
+def write_benchmark_config(args, disable_caches: bool = True) -> str:
+    """Write an app config for the benchmark and return its path."""
+    from utils.config import DEFAULT_CONFIG_PATH
+
+    with open(DEFAULT_CONFIG_PATH, "r") as app_config_json:
+        config = json.load(app_config_json)
+    config["llm_backend"]["name"] = "mock"
+    config["llm_backend"]["mock"] = {
+        "time_to_first_token": args.time_to_first_token,
+        "tokens_per_second": args.tokens_per_second,
+        "response_tokens": args.response_tokens,
+    }
+    config["tokenizer"]["hub_model"] = ""
+    if disable_caches:
+        for section in ("response_cache", "similarity_cache", "dataset_cache"):
+            config.setdefault(section, {})["enabled"] = False
+
+    config_file = tempfile.NamedTemporaryFile(
+        "w", suffix=".json", prefix="puffin_bench_", delete=False
+    )
+    with config_file:
+        json.dump(config, config_file)
+    return config_file.name
+
+
+def install_stream_timer():
+    """Record time to first token and stream time of every model response."""
+    from utils.arctic_operations import ArcticOps
+
+    stream_completion = ArcticOps.stream_completion
+
+    def timed_stream_completion(self, *args, **kwargs):
+        start = time.perf_counter()
+        first_chunk = None
+        for chunk in stream_completion(self, *args, **kwargs):
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            yield chunk
+        STREAM_TIMINGS.append(
+            {
+                "time_to_first_token_s": first_chunk,
+                "stream_s": time.perf_counter() - start,
+            }
+        )
+
+    ArcticOps.stream_completion = timed_stream_completion
+
+
+def timed(function: Callable, *args, **kwargs) -> float:
+    """Run a function and return its wall time in seconds."""
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def make_code(num_lines: int) -> str:
+    """Generate Python source code with the given number of lines."""
+    lines = []
+    index = 0
+    while len(lines) < num_lines:
+        lines += [
+            f"def transform_{index}(values, factor={index}):",
+            "    result = []",
+            "    for value in values:",
+            f"        result.append(value * factor + {index})",
+            "    return result",
+            "",
+        ]
+        index += 1
+    return "\n".join(lines[:num_lines])
+
+
+def make_dataframe(num_rows: int, num_columns: int, seed: int = 0) -> pd.DataFrame:
+    """Generate a dataframe with numeric and categorical columns."""
+    generator = np.random.default_rng(seed)
+    columns = {}
+    for index in range(num_columns):
+        if index % 4 == 3:
+            categories = np.array([f"category_{i}" for i in range(20)])
+            columns[f"label_{index}"] = categories[
+                generator.integers(0, len(categories), num_rows)
+            ]
+        elif index % 4 == 2:
+            columns[f"count_{index}"] = generator.integers(0, 1000, num_rows)
+        else:
+            columns[f"value_{index}"] = generator.normal(index, 1 + index, num_rows)
+    return pd.DataFrame(columns)
+
+
+def pop_stream_timing() -> Dict:
+    timing = STREAM_TIMINGS[-1] if STREAM_TIMINGS else {}
+    STREAM_TIMINGS.clear()
+    return timing
+
+
+def check_app(app_test, label: str):
+    if app_test.exception:
+        raise RuntimeError(f"{label} raised: {app_test.exception[0].message}")
+
+
+def bench_code_lab(num_lines: int, timeout: float) -> Dict:
+    """Benchmark a refactor request for code of the given size."""
+    from streamlit.testing.v1 import AppTest
+    from utils.tokenizer import get_tokenizer_loader
+
+    code = make_code(num_lines)
+    loader = get_tokenizer_loader()
+    loader.get(timeout=None)
+
+    app_test = AppTest.from_function(
+        code_lab_app, args=(CODE_LAB_OPTIONS,), default_timeout=timeout
+    )
+    app_test.session_state["benchmark_code"] = code
+    initial_run = timed(app_test.run)
+    check_app(app_test, "CodeLab")
+
+    app_test.session_state["code_refactored"] = True
+    app_test.session_state["messages"] = []
+    refactor_run = timed(app_test.run)
+    check_app(app_test, "CodeLab refactor")
+    prompt = app_test.session_state["messages"][0]["content"]
+
+    return {
+        "flow": "codelab",
+        "code_lines": num_lines,
+        "prompt_tokens": loader.count_tokens(prompt),
+        "exact_token_counts": loader.is_ready,
+        "tokenize_s": timed(loader.count_tokens, prompt),
+        "initial_run_s": initial_run,
+        "refactor_run_s": refactor_run,
+        **pop_stream_timing(),
+    }
+
+
+def bench_data_insights(num_rows: int, num_columns: int, timeout: float) -> Dict:
+    """Benchmark loading, profiling and insights for a CSV of the given size."""
+    from streamlit.testing.v1 import AppTest
+    from layout import data_analysis_page
+    from utils.dataset_profile import (
+        generate_correlations,
+        generate_data_quality_report,
+        generate_descriptive_statistics,
+        get_random_sample,
+        profile_columns,
+    )
+    from utils.session_memory import get_session_memory_manager
+    from utils.tokenizer import get_tokenizer_loader
+
+    buffer = io.BytesIO()
+    make_dataframe(num_rows, num_columns).to_csv(buffer, index=False)
+    csv_bytes = buffer.tell()
+    buffer.seek(0)
+
+    start = time.perf_counter()
+    dataset = data_analysis_page.load_csv(buffer, compact=True)
+    load_time = time.perf_counter() - start
+    df, dataset_hash = dataset.df, dataset.dataset_hash
+
+    start = time.perf_counter()
+    dataset_profile = data_analysis_page.get_dataset_profile(
+        df, dataset_hash, stats=dataset.stats, sample=dataset.sample
+    )
+    profile_time = time.perf_counter() - start
+
+    profile = {
+        "profile_s": profile_time,
+        "sample_s": timed(get_random_sample, df),
+        "summary_s": timed(profile_columns, df),
+        "describe_s": timed(generate_descriptive_statistics, df),
+        "correlation_s": timed(generate_correlations, df),
+        "data_quality_s": timed(generate_data_quality_report, df, dataset.stats),
+        "insights_prompt_s": timed(
+            data_analysis_page.generate_data_insights_prompt, dataset_profile
+        ),
+        "insights_prompt_tokens": get_tokenizer_loader().count_tokens(
+            data_analysis_page.generate_data_insights_prompt(dataset_profile)
+        ),
+    }
+
+    app_test = AppTest.from_function(
+        data_insights_app, args=(DATA_INSIGHTS_OPTIONS,), default_timeout=timeout
+    )
+    app_test.session_state["dataframe"] = get_session_memory_manager().track(
+        df, dataset_hash
+    )
+    app_test.session_state["dataset_hash"] = dataset_hash
+    app_test.session_state["dataset_stats"] = dataset.stats
+    app_test.session_state["dataset_memory_usage"] = dataset.memory_usage
+    app_test.session_state["dataset_sample"] = dataset.sample
+    insights_run = timed(app_test.run)
+    check_app(app_test, "Data Insights")
+    stream_timing = pop_stream_timing()
+    rerun = timed(app_test.run)
+    check_app(app_test, "Data Insights rerun")
+
+    return {
+        "flow": "data_insights",
+        "rows": num_rows,
+        "columns": num_columns,
+        "csv_bytes": csv_bytes,
+        "large_file": dataset.large_file,
+        **dataset.memory_usage,
+        "load_s": load_time,
+        **profile,
+        "insights_run_s": insights_run,
+        "rerun_s": rerun,
+        **stream_timing,
+    }
+
+
+def repeat(bench: Callable, repeats: int, *args) -> Dict:
+    """Run a benchmark several times and keep the median of each timing."""
+    runs = [bench(*args) for _ in range(repeats)]
+    result = dict(runs[0])
+    for key, value in result.items():
+        if key.endswith("_s") and value is not None:
+            result[key] = median(run[key] for run in runs)
+    return result
+
+
+def get_metadata(args) -> Dict:
+    import streamlit
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "streamlit": streamlit.__version__,
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "repeats": args.repeats,
+        "mock_backend": {
+            "time_to_first_token": args.time_to_first_token,
+            "tokens_per_second": args.tokens_per_second,
+            "response_tokens": args.response_tokens,
+        },
+    }
+
+
+def result_id(result: Dict) -> tuple:
+    return tuple(
+        result.get(key) for key in ("flow", "code_lines", "rows", "columns")
+    )
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> list:
+    """List the timings that got slower than the baseline by over tolerance."""
+    baseline_by_id = {result_id(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline_by_id.get(result_id(result))
+        if previous is None:
+            continue
+        for key, value in result.items():
+            old_value = previous.get(key)
+            if not key.endswith("_s") or value is None or not old_value:
+                continue
+            if value > old_value * (1 + tolerance):
+                regressions.append(
+                    f"{result_id(result)} {key}: {old_value:.4f}s -> {value:.4f}s"
+                )
+    return regressions
+
+
+def parse_sizes(text: str) -> List[int]:
+    return [int(size) for size in text.split(",") if size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--code-lines", type=parse_sizes, default="10,40,100")
+    parser.add_argument("--csv-rows", type=parse_sizes, default="1000,50000,250000")
+    parser.add_argument("--csv-columns", type=int, default=12)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--time-to-first-token", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--response-tokens", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Earlier results to compare with.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Relative slowdown reported as a regression.",
+    )
+    args = parser.parse_args()
+
+    os.environ["PUFFIN_CONFIG"] = write_benchmark_config(args)
+    install_stream_timer()
+
+    results = []
+    for num_lines in args.code_lines:
+        results.append(
+            repeat(bench_code_lab, args.repeats, num_lines, args.timeout)
+        )
+        print(json.dumps(results[-1]))
+    for num_rows in args.csv_rows:
+        results.append(
+            repeat(
+                bench_data_insights,
+                args.repeats,
+                num_rows,
+                args.csv_columns,
+                args.timeout,
+            )
+        )
+        print(json.dumps(results[-1]))
+
+    with open(args.output, "w") as output_json:
+        json.dump({"metadata": get_metadata(args), "results": results}, output_json)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as baseline_json:
+            baseline = json.load(baseline_json)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,539 @@
+"""Concurrent-session load test of the app against the mock LLM backend.
+
+Starts ``streamlit run src/main.py`` with the mock backend and simulates many
+browser sessions over Streamlit's websocket protocol. Each session repeatedly
+picks a scenario: opening the home page, refactoring code with follow-up
+requests in CodeLab, or uploading a CSV and generating Data Insights. The
+report holds the p50/p99 rerun latency of every step, the websocket payload
+sizes and the server memory over time.
+
+Usage:
+    python benchmarks/load_test.py [--sessions N] [--duration SECONDS]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from bench_e2e import ROOT_DIR, get_metadata, make_code, make_dataframe
+from bench_e2e import write_benchmark_config
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.Common_pb2 import FileUploaderState, FileURLsRequest
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.httpclient import AsyncHTTPClient, HTTPClient, HTTPClientError
+from tornado.websocket import websocket_connect
+
+FINISHED_STATUSES = (
+    ForwardMsg.FINISHED_SUCCESSFULLY,
+    ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY,
+)
+SCENARIOS = ("home", "codelab", "data_insights")
+
+
+class StepError(Exception):
+    """Raised when a simulated interaction does not complete."""
+
+
+class SessionClient:
+    """
+    A browser session speaking Streamlit's websocket protocol.
+
+    Keeps the widget values a browser would send back on every rerun and the
+    elements of the last run, so widgets can be found by type and label.
+
+    Args:
+        base_url (str): The server URL, e.g. ``http://localhost:8501``.
+        timeout (float): Seconds to wait for a script run to finish.
+    """
+
+    def __init__(self, base_url: str, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session_id = None
+        self.page_script_hash = ""
+        self.widget_states = {}
+        self.elements = []
+        self._connection = None
+        self._request_id = 0
+
+    async def connect(self):
+        ws_url = self.base_url.replace("http", "ws", 1) + "/_stcore/stream"
+        self._connection = await websocket_connect(
+            ws_url, max_message_size=256 * 1024 * 1024
+        )
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+
+    async def _read(self) -> tuple:
+        data = await asyncio.wait_for(self._connection.read_message(), self.timeout)
+        if data is None:
+            raise StepError("The server closed the connection.")
+        message = ForwardMsg()
+        message.ParseFromString(data)
+        return message, len(data)
+
+    async def rerun(self, triggers: tuple = (), fragment_id: str = "") -> Dict:
+        """
+        Sends the widget values and waits for the script run to finish.
+
+        Args:
+            triggers (tuple): IDs of the buttons clicked in this run.
+            fragment_id (str): The fragment to rerun, or the whole script.
+
+        Returns:
+            Dict: The latency, message count and payload bytes of the run.
+
+        Raises:
+            StepError: If the script fails to compile or raises an exception.
+        """
+        back_msg = BackMsg()
+        client_state = back_msg.rerun_script
+        client_state.page_script_hash = self.page_script_hash
+        client_state.fragment_id = fragment_id
+        client_state.widget_states.widgets.extend(self.widget_states.values())
+        for widget_id in triggers:
+            client_state.widget_states.widgets.add(id=widget_id, trigger_value=True)
+
+        start = time.perf_counter()
+        await self._connection.write_message(
+            back_msg.SerializeToString(), binary=True
+        )
+        if not fragment_id:
+            self.elements = []
+        num_messages = num_bytes = 0
+        exceptions = []
+        while True:
+            message, size = await self._read()
+            num_messages += 1
+            num_bytes += size
+            kind = message.WhichOneof("type")
+            if kind == "new_session":
+                self.session_id = message.new_session.initialize.session_id
+                self.page_script_hash = message.new_session.page_script_hash
+                self.elements = []
+            elif kind == "delta" and message.delta.HasField("new_element"):
+                element = message.delta.new_element
+                self.elements.append((element, message.delta.fragment_id))
+                # Uncaught exceptions are rendered, and the run still finishes.
+                if element.WhichOneof("type") == "exception":
+                    exceptions.append(element.exception)
+            elif kind == "script_finished":
+                status = message.script_finished
+                if status in FINISHED_STATUSES:
+                    break
+                if status == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise StepError("The script failed to compile.")
+        if exceptions:
+            raise StepError(
+                f"The script raised {exceptions[0].type}: {exceptions[0].message}"
+            )
+        return {
+            "latency_s": time.perf_counter() - start,
+            "messages": num_messages,
+            "bytes": num_bytes,
+        }
+
+    def find(self, element_type: str, match: str = "") -> tuple:
+        """
+        Finds a widget of the last run by type and label or component name.
+
+        Args:
+            element_type (str): The element type, e.g. ``button``.
+            match (str): Text contained in the label or component name.
+
+        Returns:
+            tuple: The widget proto and the fragment it belongs to.
+        """
+        for element, fragment_id in reversed(self.elements):
+            if element.WhichOneof("type") != element_type:
+                continue
+            widget = getattr(element, element_type)
+            name = getattr(widget, "label", "") or getattr(
+                widget, "component_name", ""
+            )
+            if match in name:
+                return widget, fragment_id
+        raise StepError(f"No {element_type} matching {match!r} was rendered.")
+
+    def set_json_value(self, widget_id: str, value):
+        self.widget_states[widget_id] = WidgetState(
+            id=widget_id, json_value=json.dumps(value)
+        )
+
+    def set_bool_value(self, widget_id: str, value: bool):
+        self.widget_states[widget_id] = WidgetState(id=widget_id, bool_value=value)
+
+    async def click(self, label: str) -> Dict:
+        button, fragment_id = self.find("button", label)
+        return await self.rerun(triggers=(button.id,), fragment_id=fragment_id)
+
+    async def navigate(self, page: str) -> Dict:
+        navbar, _ = self.find("component_instance", "navigation_bar")
+        self.set_json_value(navbar.id, page)
+        return await self.rerun()
+
+    async def upload(self, name: str, data: bytes) -> Dict:
+        """
+        Uploads a file to the file uploader of the last run, like a browser.
+
+        Args:
+            name (str): The file name.
+            data (bytes): The file contents.
+
+        Returns:
+            Dict: The statistics of the rerun that receives the file.
+        """
+        uploader, _ = self.find("file_uploader")
+        self._request_id += 1
+        request_id = str(self._request_id)
+        back_msg = BackMsg(
+            file_urls_request=FileURLsRequest(
+                request_id=request_id,
+                file_names=[name],
+                session_id=self.session_id,
+            )
+        )
+        start = time.perf_counter()
+        await self._connection.write_message(
+            back_msg.SerializeToString(), binary=True
+        )
+        while True:
+            message, _ = await self._read()
+            response = message.file_urls_response
+            if (
+                message.WhichOneof("type") == "file_urls_response"
+                and response.response_id == request_id
+            ):
+                break
+        if response.error_msg:
+            raise StepError(response.error_msg)
+        file_urls = response.file_urls[0]
+
+        boundary = uuid.uuid4().hex
+        body = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{name}"\r\n'
+            "Content-Type: text/csv\r\n\r\n"
+        ).encode("utf-8") + data + f"\r\n--{boundary}--\r\n".encode("utf-8")
+        await AsyncHTTPClient().fetch(
+            self.base_url + file_urls.upload_url,
+            method="PUT",
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+            body=body,
+            request_timeout=self.timeout,
+        )
+        upload_time = time.perf_counter() - start
+
+        state = FileUploaderState(max_file_id=0)
+        state.uploaded_file_info.add(
+            name=name, size=len(data), file_id=file_urls.file_id, file_urls=file_urls
+        )
+        self.widget_states[uploader.id] = WidgetState(
+            id=uploader.id, file_uploader_state_value=state
+        )
+        stats = await self.rerun()
+        stats["upload_s"] = upload_time
+        stats["latency_s"] += upload_time
+        return stats
+
+
+class LoadTest:
+    """
+    Runs the simulated sessions and collects their measurements.
+
+    Args:
+        args: The parsed command line arguments.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.records = []
+        self.errors = []
+        self.code = make_code(args.code_lines)
+        buffer = io.StringIO()
+        make_dataframe(args.csv_rows, args.csv_columns).to_csv(buffer, index=False)
+        self.csv_data = buffer.getvalue().encode("utf-8")
+        self.weights = [args.home_weight, args.codelab_weight, args.data_weight]
+
+    def record(self, scenario: str, step: str, stats: Dict):
+        self.records.append({"scenario": scenario, "step": step, **stats})
+
+    async def think(self):
+        await asyncio.sleep(random.uniform(0, 2 * self.args.think_time))
+
+    async def run_home(self, client: SessionClient):
+        self.record("home", "open", await client.rerun())
+
+    async def run_codelab(self, client: SessionClient):
+        await client.rerun()
+        await self.think()
+        self.record("codelab", "open", await client.navigate("CodeLab"))
+        editor, _ = client.find("component_instance", "ace")
+        client.set_json_value(editor.id, self.code)
+        if self.args.prefetch:
+            toggle, _ = client.find("checkbox", "Prefetch follow-up")
+            client.set_bool_value(toggle.id, True)
+        await self.think()
+        self.record("codelab", "refactor", await client.click("Refactor Code"))
+        for label in ("Create Unit Test", "How to use"):
+            await self.think()
+            self.record("codelab", "follow_up", await client.click(label))
+
+    async def run_data_insights(self, client: SessionClient):
+        await client.rerun()
+        await self.think()
+        self.record("data_insights", "open", await client.navigate("Data Insights"))
+        await self.think()
+        self.record(
+            "data_insights", "upload", await client.upload("data.csv", self.csv_data)
+        )
+        await self.think()
+        self.record("data_insights", "insights", await client.click("Load Dataset"))
+        await self.think()
+        self.record("data_insights", "rerun", await client.rerun())
+
+    async def run_session(self, deadline: float):
+        runners = {
+            "home": self.run_home,
+            "codelab": self.run_codelab,
+            "data_insights": self.run_data_insights,
+        }
+        while time.monotonic() < deadline:
+            scenario = random.choices(SCENARIOS, weights=self.weights)[0]
+            client = SessionClient(self.args.url, self.args.step_timeout)
+            try:
+                await client.connect()
+                await runners[scenario](client)
+            except (StepError, HTTPClientError, OSError, asyncio.TimeoutError) as error:
+                self.errors.append(
+                    {"scenario": scenario, "error": repr(error), "time": time.time()}
+                )
+            finally:
+                client.close()
+            await self.think()
+
+    async def run(self) -> None:
+        deadline = time.monotonic() + self.args.duration
+        sessions = []
+        for _ in range(self.args.sessions):
+            sessions.append(asyncio.create_task(self.run_session(deadline)))
+            # Ramp up gradually instead of connecting every session at once.
+            await asyncio.sleep(self.args.ramp_up / max(self.args.sessions, 1))
+        await asyncio.gather(*sessions)
+
+
+async def sample_rss(pid: int, interval: float, samples: List, stop: asyncio.Event):
+    """Record the resident memory of the server process until stopped."""
+    start = time.monotonic()
+    while not stop.is_set():
+        rss_mb = read_rss_mb(pid)
+        if rss_mb is not None:
+            samples.append({"t_s": round(time.monotonic() - start, 2), "rss_mb": rss_mb})
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """Read the resident memory of a process from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status", "r") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, port: int) -> subprocess.Popen:
+    """Start the app with the mock LLM backend and wait until it is healthy."""
+    env = dict(os.environ)
+    env["PUFFIN_CONFIG"] = write_benchmark_config(
+        args, disable_caches=not args.enable_caches
+    )
+    command = [
+        sys.executable,
+        "-m",
+        "streamlit",
+        "run",
+        os.path.join("src", "main.py"),
+        "--server.headless=true",
+        f"--server.port={port}",
+        "--server.enableXsrfProtection=false",
+        "--server.fileWatcherType=none",
+        "--browser.gatherUsageStats=false",
+    ]
+    server = subprocess.Popen(
+        command,
+        cwd=ROOT_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=None if args.server_logs else subprocess.DEVNULL,
+    )
+    health_url = f"http://127.0.0.1:{port}/_stcore/health"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("The Streamlit server exited during start-up.")
+        try:
+            HTTPClient().fetch(health_url, request_timeout=2)
+            return server
+        except (HTTPClientError, OSError):
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("The Streamlit server did not become healthy in time.")
+
+
+def summarize(records: List[Dict]) -> Dict:
+    """Compute latency percentiles and payload sizes of every step."""
+    steps = {}
+    for record in records:
+        steps.setdefault(f"{record['scenario']}/{record['step']}", []).append(record)
+    summary = {}
+    for name, step_records in sorted(steps.items()):
+        latencies = np.array([record["latency_s"] for record in step_records])
+        payloads = np.array([record["bytes"] for record in step_records])
+        summary[name] = {
+            "count": len(step_records),
+            "p50_s": float(np.percentile(latencies, 50)),
+            "p99_s": float(np.percentile(latencies, 99)),
+            "max_s": float(latencies.max()),
+            "payload_median_bytes": int(np.median(payloads)),
+            "payload_max_bytes": int(payloads.max()),
+            "messages_median": int(
+                np.median([record["messages"] for record in step_records])
+            ),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--ramp-up", type=float, default=5)
+    parser.add_argument("--think-time", type=float, default=1.0)
+    parser.add_argument("--home-weight", type=float, default=0.3)
+    parser.add_argument("--codelab-weight", type=float, default=0.4)
+    parser.add_argument("--data-weight", type=float, default=0.3)
+    parser.add_argument("--code-lines", type=int, default=40)
+    parser.add_argument("--csv-rows", type=int, default=50000)
+    parser.add_argument("--csv-columns", type=int, default=12)
+    parser.add_argument("--time-to-first-token", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--response-tokens", type=int, default=300)
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="Prefetch the follow-up answers in CodeLab sessions.",
+    )
+    parser.add_argument("--step-timeout", type=float, default=300)
+    parser.add_argument("--rss-interval", type=float, default=1.0)
+    parser.add_argument(
+        "--enable-caches",
+        action="store_true",
+        help="Keep the response, similarity and dataset caches enabled.",
+    )
+    parser.add_argument(
+        "--url",
+        help="Load test a running server instead of starting one. Its memory"
+        " is only sampled if --pid is given.",
+    )
+    parser.add_argument("--pid", type=int, help="Process ID of the --url server.")
+    parser.add_argument("--server-logs", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="load_test_results.json")
+    args = parser.parse_args()
+    # get_metadata reports the repeats of the latency benchmarks.
+    args.repeats = 1
+    random.seed(args.seed)
+
+    server = None
+    if args.url is None:
+        port = get_free_port()
+        server = start_server(args, port)
+        args.url = f"http://127.0.0.1:{port}"
+        args.pid = server.pid
+
+    load_test = LoadTest(args)
+    rss_samples = []
+
+    async def run():
+        stop = asyncio.Event()
+        sampler = None
+        if args.pid:
+            sampler = asyncio.create_task(
+                sample_rss(args.pid, args.rss_interval, rss_samples, stop)
+            )
+        try:
+            await load_test.run()
+        finally:
+            stop.set()
+            if sampler is not None:
+                await sampler
+
+    try:
+        asyncio.run(run())
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    report = {
+        "metadata": {
+            **get_metadata(args),
+            "sessions": args.sessions,
+            "duration_s": args.duration,
+            "think_time_s": args.think_time,
+            "code_lines": args.code_lines,
+            "csv_rows": args.csv_rows,
+            "csv_columns": args.csv_columns,
+            "csv_bytes": len(load_test.csv_data),
+            "caches_enabled": args.enable_caches,
+        },
+        "steps": summarize(load_test.records),
+        "errors": load_test.errors,
+        "rss": {
+            "max_mb": max((sample["rss_mb"] for sample in rss_samples), default=None),
+            "samples": rss_samples,
+        },
+    }
+    with open(args.output, "w") as output_json:
+        json.dump(report, output_json, indent=2)
+
+    for name, step in report["steps"].items():
+        print(
+            f"{name:28} n={step['count']:<4} p50={step['p50_s']:.3f}s"
+            f" p99={step['p99_s']:.3f}s payload={step['payload_median_bytes']}B"
+        )
+    print(f"Server RSS max: {report['rss']['max_mb']} MB")
+    print(f"Errors: {len(load_test.errors)}")
+    print(f"Results written to {args.output}")
+    sys.exit(1 if load_test.errors else 0)
+
+
+if __name__ == "__main__":
+    main()
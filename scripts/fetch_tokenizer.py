@@ -0,0 +1,36 @@
+"""Download the tokenizer used for prompt token counts.
+
+Saves the ``tokenizer.json`` of the configured Hugging Face model to the
+configured path (``assets/tokenizer/tokenizer.json`` by default) so the app
+can load it without network access. Only the ``tokenizers`` package is needed.
+
+Usage:
+    python scripts/fetch_tokenizer.py [--model MODEL] [--output PATH]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from tokenizers import Tokenizer  # noqa: E402
+from utils.config import get_config, resolve_path  # noqa: E402
+
+
+def main():
+    config = get_config("tokenizer")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=config.get("hub_model"))
+    parser.add_argument("--output", default=resolve_path(config.get("path")))
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    Tokenizer.from_pretrained(args.model).save(args.output)
+    print(f"Saved the {args.model} tokenizer to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Transcode the tutorial GIFs to looping WebM and MP4 clips.
+
+The clips are written to ``assets/videos`` and picked up by the media
+registry in ``src/utils/media.py``; the GIFs stay in place as fallback.
+Requires ``ffmpeg`` on the PATH.
+
+Usage:
+    python scripts/transcode_media.py [--force]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+from typing import List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GIF_DIR = os.path.join(ROOT_DIR, "assets", "gifs")
+VIDEO_DIR = os.path.join(ROOT_DIR, "assets", "videos")
+
+# Video codecs need even frame sizes.
+EVEN_SIZE_FILTER = "scale=trunc(iw/2)*2:trunc(ih/2)*2"
+
+CODEC_ARGS = {
+    "webm": [
+        "-c:v", "libvpx-vp9",
+        "-b:v", "0",
+        "-crf", "40",
+        "-deadline", "good",
+        "-cpu-used", "4",
+        "-row-mt", "1",
+    ],
+    "mp4": [
+        "-c:v", "libx264",
+        "-preset", "slow",
+        "-crf", "28",
+        "-movflags", "+faststart",
+    ],
+}
+
+
+def build_command(gif_path: str, output_path: str, container: str) -> List[str]:
+    """Build the ffmpeg command line for one GIF and one container.
+
+    Args:
+        gif_path: Path to the source GIF.
+        output_path: Path of the clip to write.
+        container: Either "webm" or "mp4".
+
+    Returns:
+        The ffmpeg arguments.
+    """
+    return [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-i", gif_path,
+        "-vf", EVEN_SIZE_FILTER,
+        "-pix_fmt", "yuv420p",
+        "-an",
+        *CODEC_ARGS[container],
+        output_path,
+    ]
+
+
+def is_up_to_date(source_path: str, output_path: str) -> bool:
+    """Check whether an output file is newer than its source."""
+    return (
+        os.path.exists(output_path)
+        and os.path.getmtime(output_path) >= os.path.getmtime(source_path)
+    )
+
+
+def transcode_all(gif_dir: str, video_dir: str, force: bool = False) -> int:
+    """Transcode every GIF in a folder to WebM and MP4.
+
+    Args:
+        gif_dir: Folder containing the GIFs.
+        video_dir: Folder the clips are written to.
+        force: Transcode even if the clips are up to date.
+
+    Returns:
+        The number of failed conversions.
+    """
+    os.makedirs(video_dir, exist_ok=True)
+    failures = 0
+    for file_name in sorted(os.listdir(gif_dir)):
+        stem, extension = os.path.splitext(file_name)
+        if extension.lower() != ".gif":
+            continue
+        gif_path = os.path.join(gif_dir, file_name)
+        for container in CODEC_ARGS:
+            output_path = os.path.join(video_dir, f"{stem}.{container}")
+            if not force and is_up_to_date(gif_path, output_path):
+                print(f"Skipping {output_path} (up to date)")
+                continue
+            result = subprocess.run(
+                build_command(gif_path, output_path, container)
+            )
+            if result.returncode != 0:
+                failures += 1
+                print(f"Failed to transcode {gif_path} to {container}")
+                continue
+            print(
+                f"{file_name} -> {stem}.{container}:"
+                f" {os.path.getsize(gif_path) / 1e6:.1f} MB ->"
+                f" {os.path.getsize(output_path) / 1e6:.1f} MB"
+            )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--gif-dir", default=GIF_DIR)
+    parser.add_argument("--video-dir", default=VIDEO_DIR)
+    parser.add_argument(
+        "--force", action="store_true", help="Transcode up-to-date clips too."
+    )
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None:
+        sys.exit("ffmpeg was not found on the PATH.")
+    sys.exit(1 if transcode_all(args.gif_dir, args.video_dir, args.force) else 0)
+
+
+if __name__ == "__main__":
+    main()
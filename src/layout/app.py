@@ -2,6 +2,8 @@ import streamlit as st
 from layout import code_refactoring, data_analysis, homepage, navbar, page_config
 from layout.sidebar import sidebar
 from utils.arctic_operations import ArcticOps
+from utils.media import get_media_registry
+from utils.tokenizer import get_tokenizer_loader
 
 
 def init_session_state():
@@ -11,6 +13,10 @@ def init_session_state():
 
 def run_app():
     page_config()
+    # Hash and publish the tutorial media once per server process.
+    get_media_registry()
+    # Start loading the tokenizer in the background on the first run.
+    get_tokenizer_loader()
     page = navbar()
     init_session_state()
 
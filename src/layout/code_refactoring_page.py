@@ -1,7 +1,7 @@
 import streamlit as st
 import streamlit_antd_components as sac
 from streamlit_ace import st_ace
-from typing import Dict
+from typing import Dict, Iterator, Optional
 from utils import ArcticOps
 
 
@@ -20,7 +20,10 @@ def code_refactoring(refactor_options: Dict) -> ArcticOps:
     update_selected_functionality(selected_functionality)
 
     process_code(selected_functionality, refactor_options)
-    if st.session_state.get("code_refactored", False):
+    # No messages yet while a similar response is offered.
+    if st.session_state.get("code_refactored", False) and st.session_state.get(
+        "messages"
+    ):
         handle_follow_up_prompt(refactor_options)
     return
 
@@ -122,6 +125,7 @@ def process_code(selected_functionality: str, refactor_options: Dict) -> ArcticO
                 st.session_state["code_refactored"] = True
                 st.session_state["user_input"] = user_input
                 st.session_state["messages"] = []
+                st.session_state.pop("similar_response_choice", None)
                 st.rerun()
 
     if st.session_state.get("code_refactored", False):
@@ -139,7 +143,13 @@ def process_code(selected_functionality: str, refactor_options: Dict) -> ArcticO
                         result = refactor_code(
                             user_input, arctic_ops, refactor_options
                         )
+                        if result is None:
+                            return arctic_ops
                         st.write_stream(result)
+                        if refactor_options["refactor_options"].get(
+                            "prefetch_follow_ups"
+                        ):
+                            arctic_ops.speculate_follow_ups()
                         return arctic_ops
 
 
@@ -166,20 +176,64 @@ def get_user_provided_code(language_input: str) -> str:
 
 def refactor_code(
     user_input: str, arctic_ops: ArcticOps, refactor_options: Dict
-) -> str:
+) -> Optional[Iterator[str]]:
     """
     Refactors or Review the user-provided code using ArcticOps.
 
+    If a near-identical submission was answered before, its response is
+    offered first and the code is only processed once the user decides.
+
     Args:
         user_input (str): The user-provided code.
         arctic_ops (ArcticOps): The ArcticOps object.
         refactor_options (Dict): Options for code refactoring and generation.
 
     Returns:
-        str: The refactored code.
+        Optional[Iterator[str]]: The streamed response, or None while the
+        similar response is offered.
     """
     generate_prompt(user_input, refactor_options)
-    return arctic_ops.invoke_snowflake_arctic()
+    choice = st.session_state.get("similar_response_choice")
+    similar = arctic_ops.get_similar_response() if choice != "generate" else None
+    if similar is None:
+        return arctic_ops.invoke_snowflake_arctic()
+    response, similarity = similar
+    if choice == "accept":
+        return arctic_ops.invoke_snowflake_arctic(similar_response=response)
+    # The prompt is generated again once the user decides.
+    st.session_state.messages.pop()
+    offer_similar_response(similarity)
+    return None
+
+
+def offer_similar_response(similarity: float) -> None:
+    """
+    Offers the response to a near-identical earlier submission.
+
+    Args:
+        similarity (float): The estimated similarity of the submissions.
+    """
+    st.info(
+        f"A {similarity:.0%} similar submission was answered before. Its"
+        " response may not match every detail of your code."
+    )
+    col1, col2 = st.columns(2)
+    col1.button(
+        "Show that response",
+        on_click=choose_similar_response,
+        args=("accept",),
+        use_container_width=True,
+    )
+    col2.button(
+        "Generate a new response",
+        on_click=choose_similar_response,
+        args=("generate",),
+        use_container_width=True,
+    )
+
+
+def choose_similar_response(choice: str) -> None:
+    st.session_state["similar_response_choice"] = choice
 
 
 def generate_prompt(user_input: str, refactor_options: Dict) -> str:
@@ -1,12 +1,21 @@
-import numpy as np
-import pandas as pd
+import uuid
+import pyarrow as pa
 import streamlit as st
-from io import StringIO
 from pandas import DataFrame
 import streamlit_antd_components as sac
 from pygwalker.api.streamlit import StreamlitRenderer
+from pygwalker.communications.streamlit_comm import streamlit_comm_map
 
 from utils import ArcticOps
+from utils.correlation import METHODS as CORRELATION_METHODS
+from utils.data_quality import DataQualityReport
+from utils.dataset_profile import DatasetProfile, get_dataset_profile
+from utils.dataset_summary import get_dataset_summary
+from utils.config import get_config
+from utils.downsampling import ROWS_COLUMN, downsample_line, downsample_scatter
+from utils.ingestion import IngestedDataset, load_csv
+from utils.query_engine import describe_schema, extract_sql, get_query_engine
+from utils.session_memory import SpillableDataFrame, get_session_memory_manager
 
 
 def data_analysis(analysis_options):
@@ -20,31 +29,69 @@ def data_analysis(analysis_options):
         uploaded_file = get_uploaded_file()
         col1, col2, col3 = st.columns([1, 1, 3])
         if uploaded_file:
+            with col2:
+                compact = st.toggle(
+                    "Compact dtypes",
+                    value = True,
+                    help = "Store low-cardinality text as categories, downcast numbers where lossless and keep other text as Arrow strings to reduce memory usage.",
+                )
             with col1:
                 load_dataset_button = st.button(":arrow_up: Load Dataset", use_container_width = True)
                 if load_dataset_button:
-                    to_pop = ["data_insights_output", "visualization_insights", "visualization_markdown", "viz_insights_first"]
+                    to_pop = ["data_insights_output", "visualization_insights", "visualization_markdown", "viz_insights_first", "sample_stratify_by", "query_sql", "query_question"]
                     for key_to_pop in to_pop:
                         if st.session_state.get(key_to_pop):
                             st.session_state.pop(key_to_pop)
-                    df = load_data_to_dataframe(uploaded_file)
-                    st.session_state["dataframe"] = df
+                    dataset = load_dataset(uploaded_file, compact)
+                    if dataset is not None:
+                        # Idle sessions spill the dataframe to disk, see utils.session_memory.
+                        st.session_state["dataframe"] = get_session_memory_manager().track(
+                            dataset.df,
+                            dataset.dataset_hash,
+                            source_path = dataset.source_path,
+                            mapped_bytes = dataset.mapped_bytes,
+                        )
+                        st.session_state["dataset_hash"] = dataset.dataset_hash
+                        st.session_state["dataset_stats"] = dataset.stats
+                        st.session_state["dataset_memory_usage"] = dataset.memory_usage
+                        st.session_state["dataset_sample"] = dataset.sample
         else:
             with col1:
                 if st.session_state.get("dataframe", None) is not None:
                     clear_data_button = st.button(":wastebasket: Clear Data", use_container_width = True)
                     if clear_data_button:
                         st.session_state.pop("dataframe")
+                        st.session_state.pop("dataset_hash", None)
+                        st.session_state.pop("dataset_stats", None)
+                        st.session_state.pop("dataset_memory_usage", None)
+                        st.session_state.pop("dataset_sample", None)
                         st.rerun()
 
     if st.session_state.get("dataframe", None) is not None:
-        df = st.session_state["dataframe"]
+        df = st.session_state["dataframe"].get()
+        profile = get_dataset_profile(
+            df,
+            st.session_state.get("dataset_hash"),
+            stats = st.session_state.get("dataset_stats"),
+            sample = st.session_state.get("dataset_sample"),
+        )
+        if profile.sampled_rows is not None:
+            st.info(
+                f"The file is too large to analyse in memory. The data summary and descriptive "
+                f"statistics cover all {profile.num_rows:,} rows, with approximate quantiles, distinct "
+                f"counts and top values; everything else uses a random sample of "
+                f"{profile.sampled_rows:,} rows."
+            )
         if analysis_options["menu_selection"] == "Data Visualizations":
-            display_data_viz_insights(df, arctic_ops)
+            display_data_viz_insights(st.session_state["dataframe"], profile, arctic_ops)
                 
         elif analysis_options["menu_selection"] == "Data Analysis":
             with st.container(border = True):
-                display_data_analysis(analysis_options["analysis_options"], arctic_ops)
+                display_data_analysis(analysis_options["analysis_options"], df, profile, arctic_ops)
+
+        elif analysis_options["menu_selection"] == "Query":
+            with st.container(border = True):
+                display_query(df, profile, arctic_ops)
 
 
 def get_uploaded_file():
@@ -57,20 +104,54 @@ def get_uploaded_file():
     return(uploaded_file)
 
 
-def load_data_to_dataframe(uploaded_file):
-
-    df = pd.read_csv(uploaded_file)
-    return(df)
+def load_dataset(uploaded_file, compact: bool = False) -> IngestedDataset:
+
+    try:
+        with st.spinner("Loading dataset ..."):
+            dataset = load_csv(uploaded_file, compact = compact)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as error:
+        st.error(f"The file could not be read as a CSV file: {error}")
+        return(None)
+    return(dataset)
+
+
+def get_pyg_renderer(dataframe: SpillableDataFrame) -> StreamlitRenderer:
+
+    # Kept on the session's dataframe handle, so the renderer and its data are
+    # dropped when the dataframe spills or the dataset is unloaded.
+    config = get_config("visualization")
+    gid = f"pyg-{dataframe.dataset_hash[:16]}-{uuid.uuid4().hex[:8]}"
+    pyg_app = dataframe.get_derived(
+        "pyg_renderer",
+        lambda df: StreamlitRenderer(
+            df,
+            gid = gid,
+            kernel_computation = config.get("kernel_computation", True),
+            default_tab = "data",
+        ),
+        # PyGWalker keeps every renderer's communication object by gid.
+        release = lambda: streamlit_comm_map.pop(gid, None),
+    )
+    return(pyg_app)
 
 
-def display_data_viz_insights(df, arctic_ops: ArcticOps):
+def display_data_viz_insights(dataframe: SpillableDataFrame, profile: DatasetProfile, arctic_ops: ArcticOps):
 
     with st.container(border = True):
-        pyg_app = StreamlitRenderer(df)
-        pyg_app.explorer(default_tab = "data", height = 800)
+        viz_mode = st.radio(
+            "Mode",
+            ["Explorer", "Downsampled chart"],
+            horizontal = True,
+            key = "viz_mode",
+            help = "The downsampled chart sends at most a few thousand aggregated points to the browser.",
+        )
+        if viz_mode == "Explorer":
+            get_pyg_renderer(dataframe).explorer(default_tab = "data")
+        else:
+            display_downsampled_chart(dataframe.get())
         generate_viz_insights = st.button("Generate Visualization Insights")
         if generate_viz_insights:
-            prompt = generate_viz_insights_prompt(df)
+            prompt = generate_viz_insights_prompt(profile)
             response_markdown = ""
             with st.spinner("Generating ..."):
                 response = arctic_ops.invoke_snowflake_arctic_simple(prompt)
@@ -90,40 +171,73 @@ def display_data_viz_insights(df, arctic_ops: ArcticOps):
                 st.markdown(st.session_state["visualization_markdown"])
 
 
-def generate_viz_insights_prompt(df: pd.DataFrame) -> str:
+def display_downsampled_chart(df: DataFrame):
 
-    prompt = f"""   
-    You are an expert in data analysis and data visualization. You have been provided with a data set in the form
-    of a dataframe. You will be given the column names of the dataframe, the dtypes of the dataframe, a random sample
-    of the dataframe, and the descriptive statistics of a dataframe. With these information propose a list of the five most 
-    useful plots to gain insights from this dataset. For each plot specify which columns should be used and how the need to be
-    modified if necessary.
+    config = get_config("visualization")
+    max_points = config.get("max_points", 2000)
+    numeric_columns = list(df.select_dtypes(include = ["number"]).columns)
+    x_columns = numeric_columns + list(df.select_dtypes(include = ["datetime"]).columns)
+    if not numeric_columns:
+        st.info("The dataset has no numeric columns to plot.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        chart_type = st.selectbox("Chart", ["Line", "Scatter"], key = "downsampled_chart_type")
+    with col2:
+        x = st.selectbox("X axis", x_columns, key = "downsampled_chart_x")
+    with col3:
+        y_columns = [column for column in numeric_columns if column != x]
+        y = st.selectbox("Y axis", y_columns, key = "downsampled_chart_y")
+    if y is None:
+        st.info("Select two different columns to plot.")
+        return
+
+    with st.spinner("Aggregating ..."):
+        try:
+            if chart_type == "Line":
+                points = downsample_line(df, x, y, max_points = max_points)
+            else:
+                points = downsample_scatter(df, x, y, max_points = max_points)
+        except Exception as error:
+            st.error(f"The chart could not be aggregated: {error}")
+            return
+    if chart_type == "Line":
+        st.line_chart(points, x = str(x), y = str(y))
+        st.caption(f"{len(points):,} points of {len(df):,} rows, picked with LTTB.")
+    else:
+        st.scatter_chart(points, x = str(x), y = str(y), size = ROWS_COLUMN)
+        st.caption(f"{len(points):,} points for {int(points[ROWS_COLUMN].sum()):,} rows, binned on a grid.")
 
-    Dataframe Columns:
-    {df.columns} 
 
-    Dataframe Columns Dtypes:
-    {df.dtypes}
+def generate_viz_insights_prompt(profile: DatasetProfile) -> str:
 
-    Dataframe Data Sample:
-    {get_random_sample(df)}
+    prompt = f"""   
+    You are an expert in data analysis and data visualization. You have been provided with a data set in the form
+    of a dataframe. You will be given a compact summary of the dataframe with its most informative columns, their 
+    dtypes and statistics, its strongest correlations and a few sample rows. With these information propose a list of 
+    the five most useful plots to gain insights from this dataset. For each plot specify which columns should be used 
+    and how the need to be modified if necessary.
 
-    Dataframe Descriptive Statistics:
-    {df.describe()}
+    Dataframe Summary:
+    {get_dataset_summary(profile)}
     """
 
     return(prompt)
 
 
-def generate_data_insights_prompt(df: pd.DataFrame) -> str:
+def generate_data_insights_prompt(
+    profile: DatasetProfile, sample: DataFrame = None, data_quality: DataQualityReport = None
+) -> str:
 
     prompt = f"""   
     You are an expert in data and statistical analysis with a focus on extracting meaningful insights from datasets. 
-    You will be provided with the following details of a dataframe:
-    - Column names and data types.
-    - A random sample of the dataframe.
-    - Descriptive statistics of the dataframe.
-    - The correlation matrix of the dataframe.
+    You will be provided with a compact summary of a dataframe, limited to its most informative columns:
+    - Column names, data types, missing values and distinct counts.
+    - Descriptive statistics or the most frequent values of each column.
+    - The most strongly correlated pairs of numeric columns.
+    - Duplicate rows, missing values and outliers, if checked.
+    - A few rows of a random sample of the dataframe.
 
     Your task is to:
         1. Identify and isolate key characteristics of the dataset.
@@ -131,149 +245,177 @@ def generate_data_insights_prompt(df: pd.DataFrame) -> str:
         3. Propose further analyses that could deepen the understanding of the data.
         4. Interpret the statistical and other data provided to derive meaningful conclusions.
 
-    Data Sample:
-    {get_random_sample(df)}
-
-    Dataframe Information:
-    {get_dataframe_info_as_dataframe(df)}
-
-    Descriptive Statistics:
-    {df.describe()}
-
-    Correlation Matrix:
-    {generate_correlation_matrix(df)}
+    Dataframe Summary:
+    {get_dataset_summary(profile, sample, data_quality)}
     """
 
     return(prompt)
 
 
-def display_data_analysis(analysis_options, arctic_ops):
+def display_data_analysis(analysis_options, df, profile: DatasetProfile, arctic_ops):
 
     st.subheader("Data Insights")
-    df = st.session_state["dataframe"]
     col1, col2 = st.columns([1, 1])
+    sample = profile.sample
     with col1:
         if analysis_options["data_sample"]:
             with st.expander("**Data Sample**", expanded = True):
-                st.write(get_random_sample(df))
+                stratify_by = st.selectbox(
+                    "Stratify by",
+                    options = [None, *profile.strata_columns],
+                    format_func = lambda column: "No stratification" if column is None else column,
+                    key = "sample_stratify_by",
+                )
+                sample = profile.get_sample(df, stratify_by)
+                st.write(sample)
     with col2:
         if analysis_options["data_summary"]:
             with st.expander("**Data Summary**", expanded = True):
-                st.write(get_dataframe_info_as_dataframe(df))
+                st.write(profile.column_summary)
+                memory_usage = st.session_state.get("dataset_memory_usage")
+                if memory_usage:
+                    st.caption(
+                        f"Memory usage: {memory_usage['before_bytes'] / 1024 ** 2:,.1f} MB before and "
+                        f"{memory_usage['after_bytes'] / 1024 ** 2:,.1f} MB after compacting dtypes."
+                    )
 
     with col1:
         if analysis_options["descriptive_statistics"]:
             with st.expander("**Descriptive Statistics**", expanded = True):
-                st.write(generate_descriptive_statistics(df))
+                st.write(profile.descriptive_statistics)
     with col2:
         if analysis_options["correlation"]:
             with st.expander("**Pairwise correlation of columns**", expanded = True):
-                st.write(generate_correlation_matrix(df))
+                method = st.radio(
+                    "Method",
+                    options = list(CORRELATION_METHODS),
+                    index = CORRELATION_METHODS.index(profile.correlations["method"]),
+                    format_func = str.title,
+                    horizontal = True,
+                    key = "correlation_method",
+                )
+                correlations = profile.get_correlations(df, method)
+                if correlations["matrix"] is not None:
+                    st.write(correlations["matrix"])
+                st.caption("Strongest correlations")
+                st.dataframe(correlations["top_pairs"], hide_index = True)
+
+    data_quality = None
+    if analysis_options.get("data_quality"):
+        with st.expander("**Data Quality**", expanded = True):
+            data_quality = profile.get_data_quality(df, st.session_state.get("dataset_stats"))
+            display_data_quality(data_quality)
             
     if analysis_options["data_insights"]:
         with st.expander("**Data Insights**", expanded = True):
-            generate_data_insights(df, arctic_ops)
+            generate_data_insights(profile, arctic_ops, sample, data_quality)
 
 
-def get_random_sample(df: pd.DataFrame, sample_size: int = 10) -> pd.DataFrame:
-    """
-    Returns a random sample from the given DataFrame.
-
-    Args:
-        df (pd.DataFrame): The DataFrame to sample from.
-        sample_size (int): The number of rows to return in the sample.
-
-    Returns:
-        pd.DataFrame: A DataFrame containing the random sample.
-    """
-    return df.sample(n=sample_size, random_state=np.random.randint(0, 10000))
-
+def display_data_quality(data_quality: DataQualityReport):
 
-def generate_descriptive_statistics(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Generates descriptive statistics for the given DataFrame.
-
-    Args:
-        df (pd.DataFrame): The DataFrame for which to generate statistics.
-
-    Returns:
-        pd.DataFrame: A DataFrame containing the descriptive statistics.
-    """
-    return df.describe()
-
-
-def get_dataframe_info_as_dataframe(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Returns the information summary of a pandas DataFrame as a new DataFrame.
-
-    Args:
-        df (pd.DataFrame): The DataFrame for which to get the info summary.
-
-    Returns:
-        pd.DataFrame: A DataFrame containing the information summary.
-    """
-    buffer = StringIO()
-    df.info(buf=buffer)
-    info_str = buffer.getvalue()
-    
-    # Parse the info string
-    lines = info_str.split('\n')
-    parsed_lines = [line.strip() for line in lines if line.strip()]
-    
-    # Extract relevant parts
-    entries = []
-    for line in parsed_lines[5:-2]:  # Skip the non-relevant lines
-        parts = line.split()
-        col_name = parts[1]
-        non_null_count = parts[2]
-        dtype = parts[-1]
-        entries.append([col_name, non_null_count, dtype])
-    
-    # Create DataFrame
-    info_df = pd.DataFrame(entries, columns=['Column', 'Non-Null Count', 'Dtype'])
-    
-    return info_df
+    col1, col2, col3 = st.columns([1, 1, 1])
+    col1.metric("Rows", f"{data_quality.num_rows:,}")
+    col2.metric("Duplicate rows", f"{data_quality.duplicate_rows:,}")
+    col3.metric("Columns with missing values", len(data_quality.missing_values))
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        st.caption("Missing values")
+        st.dataframe(data_quality.missing_values, hide_index = True)
+    with col2:
+        st.caption("Most frequent missing value patterns")
+        st.dataframe(data_quality.missing_patterns, hide_index = True)
+    st.caption("Outliers")
+    st.dataframe(data_quality.outliers, hide_index = True)
 
 
-def count_duplicates(df: pd.DataFrame) -> int:
-    """
-    Returns the number of duplicate rows in a pandas DataFrame.
+def generate_data_quality_prompt(data_quality: DataQualityReport) -> str:
 
-    Args:
-        df (pd.DataFrame): The DataFrame to check for duplicates.
+    prompt = f"""
+    You are an expert in data quality and data cleaning. You will be provided with a data quality report of a
+    dataframe with its duplicate rows, missing values, most frequent missing value patterns and outliers by the IQR
+    and MAD rules. Comment on the most important data quality issues, their likely causes and how they could affect
+    an analysis, and propose concrete steps to clean the data.
 
-    Returns:
-        int: The number of duplicate rows in the DataFrame.
+    Data Quality Report:
+    {data_quality.to_prompt()}
     """
-    return df.duplicated().sum()
-
 
-def generate_correlation_matrix(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Generates a correlation matrix from the numeric columns of a pandas DataFrame.
+    return(prompt)
 
-    Args:
-        df (pd.DataFrame): The DataFrame for which to generate the correlation matrix.
 
-    Returns:
-        pd.DataFrame: A DataFrame representing the correlation matrix of numeric columns.
+def generate_data_insights(
+    profile: DatasetProfile, arctic_ops: ArcticOps, sample: DataFrame = None, data_quality: DataQualityReport = None
+):
+
+    # The sections are independent, so their responses are streamed at the same time.
+    prompts = {
+        "Insights": generate_data_insights_prompt(profile, sample, data_quality),
+        "Visualization Suggestions": generate_viz_insights_prompt(profile),
+    }
+    if data_quality is not None:
+        prompts["Data Quality Commentary"] = generate_data_quality_prompt(data_quality)
+
+    sections = st.session_state.get("data_insights_output")
+    if sections and set(sections) == set(prompts):
+        for title, markdown in sections.items():
+            st.markdown(f"#### {title}")
+            st.markdown(markdown)
+        return
+
+    placeholders = {}
+    for title in prompts:
+        st.markdown(f"#### {title}")
+        placeholders[title] = st.empty()
+        placeholders[title].caption("Generating ...")
+    sections = {title: "" for title in prompts}
+    for title, chunk in arctic_ops.stream_parallel(prompts):
+        sections[title] += chunk
+        placeholders[title].markdown(sections[title])
+    st.session_state["data_insights_output"] = sections
+    # The Data Visualizations page shows the same suggestions.
+    st.session_state["visualization_insights"] = True
+    st.session_state["visualization_markdown"] = sections["Visualization Suggestions"]
+
+
+def generate_sql_prompt(df: DataFrame, question: str) -> str:
+
+    prompt = f"""
+    You are an expert in SQL and the DuckDB dialect. Write a single DuckDB SELECT query that answers the question
+    below about a table named dataset. Only use the columns listed in the schema and quote column names with double
+    quotes exactly as they are listed. Return only the query in a ```sql code block, without explanations.
+
+    Schema of the dataset table:
+    {describe_schema(df)}
+
+    Question:
+    {question}
     """
-    # Select only the numeric columns
-    numeric_df = df.select_dtypes(include=['number'])
-    return numeric_df.corr()
 
+    return(prompt)
 
-def generate_data_insights(df: pd.DataFrame, arctic_ops: ArcticOps):
 
-    with st.spinner("Generating data insights ..."):
-        if not st.session_state.get("data_insights_output", False):
-            prompt = generate_data_insights_prompt(df)
-            response = arctic_ops.invoke_snowflake_arctic_simple(prompt)
-            response_markdown = ""
-            for item in response:
-                response_markdown += item
-            st.write(response_markdown)
-            st.session_state["data_insights_output"] = response_markdown
-        else:
-            st.markdown(st.session_state["data_insights_output"])
-    
\ No newline at end of file
+def display_query(df: DataFrame, profile: DatasetProfile, arctic_ops: ArcticOps):
+
+    st.subheader("Query")
+    if profile.sampled_rows is not None:
+        st.caption(f"Queries run over the random sample of {profile.sampled_rows:,} rows.")
+    question = st.text_input("Ask a question about the dataset:", key = "query_question")
+    if st.button("Generate SQL", disabled = not question):
+        with st.spinner("Generating SQL ..."):
+            response = "".join(arctic_ops.invoke_snowflake_arctic_simple(generate_sql_prompt(df, question)))
+        st.session_state["query_sql"] = extract_sql(response)
+
+    sql = st.text_area("SQL", key = "query_sql", height = 150, help = "The dataset is available as the table dataset.")
+    if st.button("Run query", disabled = not sql):
+        try:
+            answer = get_query_engine().run(df, sql, profile.dataset_hash)
+        except Exception as error:
+            st.error(f"The query failed: {error}")
+            return
+        st.dataframe(answer["result"], hide_index = True)
+        caption = f"{len(answer['result']):,} rows in {answer['seconds'] * 1000:,.0f} ms"
+        if answer["truncated"]:
+            caption += ", truncated"
+        if answer["cached"]:
+            caption += ", from cache"
+        st.caption(caption + ".")
@@ -1,14 +1,5 @@
-import os
-import platform
 import streamlit as st
-from utils.uitls import display_gif, set_page_width
-
-sys = platform.system()
-work_dir = (
-    os.path.dirname(os.path.abspath(__file__))
-    .replace("src\\layout", "")
-    .replace("src/layout", "")
-)
+from utils.uitls import display_media, set_page_width
 
 
 def homepage():
@@ -73,8 +64,7 @@ def homepage():
     #### Demo - Choosing Your Task:
     """
     )
-    gif_path = os.path.join(work_dir, "assets", "gifs", "funct_selection.gif")
-    display_gif(gif_path, width="80%")
+    display_media("funct_selection.gif", width="80%", alt="Choosing your task")
 
     # Step 2: Input Your Code or Requirements
     st.markdown("# ")
@@ -91,8 +81,7 @@ def homepage():
     #### **Demo: Inputting Code/Requirements**
     # """
     )
-    gif_path = os.path.join(work_dir, "assets", "gifs", "write_req.gif")
-    display_gif(gif_path, width="80%")
+    display_media("write_req.gif", width="80%", alt="Inputting code and requirements")
 
     # Step 3: Configure Options
     st.markdown("# ")
@@ -118,8 +107,7 @@ def homepage():
     #### **Demo: Configuring Options and Generate/Refactor/review  Code**
     # """
     )
-    gif_path = os.path.join(work_dir, "assets", "gifs", "generate_code.gif")
-    display_gif(gif_path, width="80%")
+    display_media("generate_code.gif", width="80%", alt="Generating code")
 
     # Step 5: View the Results
     st.markdown("# ")
@@ -142,8 +130,7 @@ def homepage():
     #### **Demo: Follow-Up Prompts**
     """
     )
-    gif_path = os.path.join(work_dir, "assets", "gifs", "follow_up_prompts.gif")
-    display_gif(gif_path, width="80%")
+    display_media("follow_up_prompts.gif", width="80%", alt="Follow-up prompts")
 
     st.divider()
 
@@ -159,8 +146,7 @@ def homepage():
     """
     )
 
-    gif_path = os.path.join(work_dir, "assets", "gifs", "example_1.gif")
-    display_gif(gif_path, width="80%")
+    display_media("example_1.gif", width="80%", alt="Refactoring code")
 
     st.markdown(
         """
@@ -170,8 +156,7 @@ def homepage():
     you. It’s like having a personal coder at your fingertips. 
     # """
     )
-    gif_path = os.path.join(work_dir, "assets", "gifs", "example_2.gif")
-    display_gif(gif_path, width="80%")
+    display_media("example_2.gif", width="80%", alt="Writing new code")
 
     st.markdown(
         """
@@ -183,8 +168,7 @@ def homepage():
 
     """
     )
-    gif_path = os.path.join(work_dir, "assets", "gifs", "example_3.gif")
-    display_gif(gif_path, width="80%")
+    display_media("example_3.gif", width="80%", alt="Reviewing code")
 
     st.markdown(
         """
@@ -197,5 +181,4 @@ def homepage():
 
     """
     )
-    gif_path = os.path.join(work_dir, "assets", "gifs", "data_insights_demo.gif")
-    display_gif(gif_path, width="80%")
+    display_media("data_insights_demo.gif", width="80%", alt="Data insights")
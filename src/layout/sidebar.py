@@ -160,6 +160,9 @@ def get_refactor_options() -> Dict[str, Any]:
             refactor_options["remove_unused_imports"] = generate_toggle(
                 "Remove unused imports", True
             )
+        refactor_options["prefetch_follow_ups"] = generate_toggle(
+            "Prefetch follow-up answers", False
+        )
 
         return refactor_options
 
@@ -237,6 +240,11 @@ def get_csv_data_analysis_options() -> None:
             "menu_selection": "Data Visualizations",
             "model_parameters": {"temperature": temperature, "top_p": top_p},
             }
+    elif menu_selection == "Query":
+        sidebar_options = {
+            "menu_selection": "Query",
+            "model_parameters": {"temperature": temperature, "top_p": top_p},
+            }
 
     return sidebar_options
 
@@ -245,7 +253,8 @@ def get_menu_selection():
 
     menu_options = {
         "Data Analysis": "clipboard-data",
-        "Data Visualizations": "graph-up"
+        "Data Visualizations": "graph-up",
+        "Query": "terminal"
     }
     menu_items = [sac.MenuItem(label, icon) for label, icon in menu_options.items()]
     with st.expander("Menu", expanded = True):
@@ -266,6 +275,7 @@ def get_analysis_options():
         analysis_options["data_summary"] = generate_toggle("Display data set summary", True)
         analysis_options["descriptive_statistics"] = generate_toggle("Generate descriptive statistics", True)
         analysis_options["correlation"] = generate_toggle("Compute pairwise correlation", True)
+        analysis_options["data_quality"] = generate_toggle("Check data quality", True)
         analysis_options["data_insights"] = generate_toggle("Generate data insights", True)
 
     return(analysis_options)
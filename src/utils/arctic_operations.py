@@ -1,22 +1,163 @@
 import os
+import queue
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 import replicate
 import streamlit as st
-from transformers import AutoTokenizer
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from typing import Dict, Iterator, List, Optional, Tuple
+from utils.config import get_config
+from utils.response_cache import ResponseCache, get_response_cache
+from utils.similarity_cache import get_similarity_cache
+from utils.speculation import get_speculation_cache
+from utils.tokenizer import get_tokenizer_loader
 
+MODEL_NAME = "snowflake/snowflake-arctic-instruct"
 
-class ArcticOps:
-    def __init__(
-        self, temperature: float, top_p: float, init_chat_history: bool = True
-    ):
+CODE_BLOCK_PATTERN = re.compile(r"```.*?(```|$)", re.DOTALL)
+
+
+class LLMBackend(ABC):
+    """Streams completions from a language model."""
+
+    model_name = MODEL_NAME
+
+    @abstractmethod
+    def stream(
+        self, prompt: str, temperature: float, top_p: float, **model_input
+    ) -> Iterator[str]:
+        """Stream the completion of a prompt.
+
+        Args:
+            prompt: The prompt sent to the model.
+            temperature: The sampling temperature.
+            top_p: The nucleus sampling parameter.
+            **model_input: Additional model input, e.g. the prompt template.
+
+        Yields:
+            The chunks of the completion.
+        """
+
+
+class ReplicateBackend(LLMBackend):
+    """Snowflake Arctic served by Replicate."""
+
+    def __init__(self, model_name: str = MODEL_NAME):
         if "REPLICATE_API_TOKEN" in st.secrets:
             replicate_api = st.secrets["REPLICATE_API_TOKEN"]
             os.environ["REPLICATE_API_TOKEN"] = replicate_api
         else:
             raise Exception("Replicate token not found.")
+        self.model_name = model_name
+
+    def stream(self, prompt, temperature, top_p, **model_input):
+        for event in replicate.stream(
+            self.model_name,
+            input={
+                "prompt": prompt,
+                "temperature": temperature,
+                "top_p": top_p,
+                **model_input,
+            },
+        ):
+            yield str(event)
+
+
+class MockBackend(LLMBackend):
+    """Local stand-in that streams a canned or synthetic response.
+
+    Used to benchmark and profile the app without network access or paid
+    generations. The response is streamed word by word after
+    ``time_to_first_token`` seconds, at ``tokens_per_second`` words per
+    second.
+    """
+
+    model_name = "mock"
+
+    def __init__(
+        self,
+        time_to_first_token: float = 0.5,
+        tokens_per_second: float = 40.0,
+        response: Optional[str] = None,
+        response_tokens: int = 300,
+    ):
+        self.time_to_first_token = time_to_first_token
+        self.tokens_per_second = tokens_per_second
+        self.response = response
+        self.response_tokens = response_tokens
+
+    def get_response(self, prompt: str) -> str:
+        """Get the canned response, or build a synthetic one."""
+        if self.response is not None:
+            return self.response
+        words = [f"Mock response to a {len(prompt.split())}-word prompt."]
+        words += [f"token{i}" for i in range(self.response_tokens - len(words))]
+        lines = [" ".join(words[i : i + 12]) for i in range(0, len(words), 12)]
+        return "\n".join(lines)
+
+    def stream(self, prompt, temperature, top_p, **model_input):
+        time.sleep(self.time_to_first_token)
+        delay = 1 / self.tokens_per_second if self.tokens_per_second else 0
+        for chunk in ResponseCache.replay(self.get_response(prompt)):
+            yield chunk
+            time.sleep(delay)
+
+
+@st.cache_resource(show_spinner=False)
+def get_llm_backend() -> LLMBackend:
+    """Create the language model backend selected in the app config.
+
+    The ``llm_backend`` config section selects "replicate" or "mock"; the
+    ``PUFFIN_LLM_BACKEND`` environment variable overrides the choice.
+
+    Returns:
+        The backend.
+    """
+    config = get_config("llm_backend")
+    name = os.environ.get("PUFFIN_LLM_BACKEND", config.get("name", "replicate"))
+    if name == "replicate":
+        return ReplicateBackend(config.get("model", MODEL_NAME))
+    if name == "mock":
+        return MockBackend(**config.get("mock", {}))
+    raise ValueError(f"Unknown LLM backend: {name}")
 
+
+class ArcticOps:
+    # Maximum number of prompt tokens sent to the model.
+    max_prompt_tokens = 1500
+    # Length of the excerpts that replace older responses over the budget.
+    excerpt_chars = 300
+    # Opens the assistant turn the model completes.
+    response_prefix = "<|im_start|>assistant\n"
+    # Maximum number of model calls streamed at once by stream_parallel.
+    max_parallel_requests = 4
+    # Canned follow-up prompts offered after a response, by button key.
+    follow_up_prompts = {
+        "create_unit_test": "\n - Create Unit Test",
+        "how_to_use": (
+            "\n - Show me step by step and with examples how to use the"
+            " provided code and how to implement it"
+        ),
+    }
+
+    def __init__(
+        self, temperature: float, top_p: float, init_chat_history: bool = True
+    ):
+        self.backend = get_llm_backend()
         self.chat_history = []
         self.temperature = temperature
         self.top_p = top_p
+        chat_config = get_config("chat")
+        self.max_prompt_tokens = chat_config.get(
+            "token_budget", self.max_prompt_tokens
+        )
+        self.excerpt_chars = chat_config.get("excerpt_chars", self.excerpt_chars)
+        self.max_parallel_requests = get_config("llm_backend").get(
+            "max_parallel_requests", self.max_parallel_requests
+        )
         st.session_state.chat_aborted = False
         st.session_state.unique_id_counter = 0
         if init_chat_history:
@@ -48,61 +189,226 @@ class ArcticOps:
         st.session_state.chat_aborted = True
         st.rerun()
 
+    def get_num_tokens(self, prompt: str) -> int:
+        """Get the number of tokens in a given prompt.
+
+        The count is estimated while the tokenizer is still warming up."""
+        return get_tokenizer_loader().count_tokens(prompt)
+
     @staticmethod
-    @st.cache_resource(show_spinner=False)
-    def get_tokenizer(model_name: str = "huggyllama/llama-7b") -> AutoTokenizer:
-        """Get a tokenizer to ensure we're not sending too much text to the model."""
-        return AutoTokenizer.from_pretrained(model_name)
+    def format_message(message: Dict) -> str:
+        """Format a chat message with the Arctic chat template."""
+        role = "user" if message["role"] == "user" else "assistant"
+        return f"<|im_start|>{role}\n{message['content']}<|im_end|>\n"
 
-    def get_num_tokens(self, prompt: str) -> int:
-        """Get the number of tokens in a given prompt."""
-        tokenizer = self.get_tokenizer()
-        tokens = tokenizer.tokenize(prompt)
-        return len(tokens)
-
-    def check_num_tokens_limit(self, num_tokens):
-        if num_tokens >= 3072:
-            st.stop()
-
-    def invoke_snowflake_arctic(self):
-        prompt = []
-        for dict_message in st.session_state.messages:
-            if dict_message["role"] == "user":
-                prompt.append(
-                    "<|im_start|>user\n" + dict_message["content"] + "<|im_end|>"
-                )
-            else:
-                prompt.append(
-                    "<|im_start|>assistant\n"
-                    + dict_message["content"]
-                    + "<|im_end|>"
-                )
+    def get_message_num_tokens(self, message: Dict) -> int:
+        """Get the number of tokens of a chat message.
+
+        The count is cached in the message together with a hash of its
+        content, so each message is only tokenized again when it changes.
+        Estimated counts are not cached."""
+        content_hash = hash(message["content"])
+        if message.get("num_tokens_hash") == content_hash:
+            return message["num_tokens"]
+
+        num_tokens = self.get_num_tokens(self.format_message(message))
+        if get_tokenizer_loader().is_ready:
+            message["num_tokens"] = num_tokens
+            message["num_tokens_hash"] = content_hash
+        return num_tokens
+
+    def get_chat_num_tokens(self, messages: List[Dict]) -> int:
+        """Get the number of tokens of the prompt built from chat messages."""
+        return sum(
+            self.get_message_num_tokens(message) for message in messages
+        ) + self.get_num_tokens(self.response_prefix)
+
+    def build_prompt(self, messages: List[Dict]) -> str:
+        """Build the Arctic prompt from chat messages."""
+        return (
+            "".join(self.format_message(message) for message in messages)
+            + self.response_prefix
+        )
+
+    def get_message_excerpt(self, message: Dict) -> Dict:
+        """Get a shortened version of an assistant message.
 
-        prompt.append("<|im_start|>assistant")
-        prompt.append("")
-        prompt_str = "\n".join(prompt)
+        Code blocks are left out and the text is cut to ``excerpt_chars``.
+        The excerpt is cached in the message until its content changes."""
+        content_hash = hash(message["content"])
+        excerpt = message.get("excerpt")
+        if excerpt is None or excerpt["source_hash"] != content_hash:
+            text = CODE_BLOCK_PATTERN.sub("[code omitted]", message["content"])
+            text = " ".join(text.split())
+            if len(text) > self.excerpt_chars:
+                text = text[: self.excerpt_chars].rsplit(" ", 1)[0] + " ..."
+            excerpt = {
+                "role": "assistant",
+                "content": f"(Earlier response, shortened) {text}",
+                "source_hash": content_hash,
+            }
+            message["excerpt"] = excerpt
+        return excerpt
 
-        num_tokens = self.get_num_tokens(prompt_str)
-        max_tokens = 1500
+    def compact_messages(self, messages: List[Dict]) -> List[Dict]:
+        """Fit the chat history into the prompt token budget.
 
-        if num_tokens >= max_tokens:
+        The first user message, which holds the original code, and the latest
+        message are always kept. The other messages are added from newest to
+        oldest while they fit, and assistant responses that do not fit are
+        replaced by a short excerpt. Adding stops at the first message that
+        does not fit even as an excerpt, so the kept history is a contiguous
+        run of the latest turns and never skips a turn in the middle.
+
+        Args:
+            messages: The chat messages.
+
+        Returns:
+            The messages to build the prompt from, in chat order.
+        """
+        if self.get_chat_num_tokens(messages) < self.max_prompt_tokens:
+            return list(messages)
+
+        pinned = {len(messages) - 1}
+        for index, message in enumerate(messages):
+            if message["role"] == "user":
+                pinned.add(index)
+                break
+
+        kept = {index: messages[index] for index in pinned}
+        used = self.get_chat_num_tokens(list(kept.values()))
+        for index in reversed(range(len(messages))):
+            if index in pinned:
+                continue
+            candidates = [messages[index]]
+            if messages[index]["role"] == "assistant":
+                candidates.append(self.get_message_excerpt(messages[index]))
+            for candidate in candidates:
+                num_tokens = self.get_message_num_tokens(candidate)
+                if used + num_tokens < self.max_prompt_tokens:
+                    kept[index] = candidate
+                    used += num_tokens
+                    break
+            else:
+                break
+        return [kept[index] for index in sorted(kept)]
+
+    def check_num_tokens_limit(self, num_tokens: int):
+        """Abort the chat if the prompt is longer than the token limit."""
+        if num_tokens >= self.max_prompt_tokens:
             self.abort_chat(
                 "Conversation length too long. Please keep it under"
-                f" {max_tokens} tokens."
+                f" {self.max_prompt_tokens} tokens."
             )
 
+    def invoke_snowflake_arctic(self, similar_response: Optional[str] = None):
+        """Stream the response to the chat, or a similar response the user accepted.
+
+        Args:
+            similar_response: The response to a near-identical submission,
+                from ``get_similar_response``, to show instead of calling
+                the model.
+        """
+        messages = self.compact_messages(st.session_state.messages)
+        self.check_num_tokens_limit(self.get_chat_num_tokens(messages))
+        prompt_str = self.build_prompt(messages)
+
+        # On the first turn the prompt only holds the submitted code and the
+        # selected options, so near-identical submissions can share a response.
+        submission = messages[0]["content"] if len(messages) == 1 else None
+
+        # Any new turn changes the history the other speculations were built on.
+        speculation_cache = get_speculation_cache(self.get_num_tokens)
+        speculation = speculation_cache.take(self.get_completion_key(prompt_str))
+        speculation_cache.cancel()
+
         st.session_state.messages.append({"role": "assistant", "content": ""})
-        for event in replicate.stream(
-            "snowflake/snowflake-arctic-instruct",
-            input={
-                "prompt": prompt_str,
-                "temperature": self.temperature,
-                "prompt_template": r"{prompt}",
-                "top_p": self.top_p,
-            },
-        ):
-            st.session_state.messages[-1]["content"] += str(event)
-            yield str(event)
+        if similar_response is not None:
+            events = ResponseCache.replay(similar_response)
+        elif speculation is not None:
+            events = speculation.stream()
+        else:
+            events = self.stream_completion(
+                prompt_str, submission=submission, prompt_template=r"{prompt}"
+            )
+        for event in events:
+            st.session_state.messages[-1]["content"] += event
+            yield event
+
+    def get_similar_response(self) -> Optional[Tuple[str, float]]:
+        """Find the response to a near-identical earlier submission.
+
+        Only the first turn of a chat holds a submission. The response is
+        offered to the user rather than shown as the model response, as the
+        submissions may still differ, e.g. in an operator or a constant.
+
+        Returns:
+            The response and its estimated similarity, or None if there is
+            none or the exact response cache answers the prompt.
+        """
+        similarity_cache = get_similarity_cache()
+        messages = st.session_state.messages
+        if similarity_cache is None or len(messages) != 1:
+            return None
+        cache = get_response_cache()
+        prompt_str = self.build_prompt(self.compact_messages(messages))
+        key = self.get_completion_key(prompt_str)
+        if cache is not None and cache.get(key) is not None:
+            return None
+        return similarity_cache.lookup(
+            messages[0]["content"],
+            self.get_completion_params(prompt_template=r"{prompt}"),
+        )
+
+    def get_completion_params(self, **model_input) -> Dict:
+        """Get the parameters a similar response must have been generated with."""
+        return {
+            "model": self.backend.model_name,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            **model_input,
+        }
+
+    def get_completion_key(self, prompt_str: str) -> str:
+        """Get the key of a chat completion with the current parameters."""
+        return ResponseCache.make_key(
+            self.backend.model_name,
+            prompt_str,
+            self.temperature,
+            self.top_p,
+            prompt_template=r"{prompt}",
+        )
+
+    def speculate_follow_ups(self):
+        """Generate the responses to the canned follow-ups in the background.
+
+        Each follow-up prompt is built from the current chat history exactly
+        as ``invoke_snowflake_arctic`` would build it on click, so a click
+        serves the speculative response, or follows it while it is still
+        streaming. Prompts over the token limit are skipped, and the session
+        speculation cache enforces the concurrency cap and token budget.
+        """
+        speculation_cache = get_speculation_cache(self.get_num_tokens)
+        keys = []
+        for follow_up in self.follow_up_prompts.values():
+            messages = self.compact_messages(
+                st.session_state.messages + [{"role": "user", "content": follow_up}]
+            )
+            num_tokens = self.get_chat_num_tokens(messages)
+            if num_tokens >= self.max_prompt_tokens:
+                continue
+            prompt_str = self.build_prompt(messages)
+            key = self.get_completion_key(prompt_str)
+            speculation = speculation_cache.start(
+                key,
+                num_tokens,
+                lambda prompt_str=prompt_str: self.stream_completion(
+                    prompt_str, prompt_template=r"{prompt}"
+                ),
+            )
+            if speculation is not None:
+                keys.append(key)
+        speculation_cache.cancel(keep=keys)
 
     def send_prompt(self, prompt):
         st.session_state.messages.append({"role": "user", "content": prompt})
@@ -135,8 +441,7 @@ class ArcticOps:
             key=f"create_unit_test_{unique_id}",
             use_container_width=True,
         ):
-            prompt = "\n - Create Unit Test"
-            self.send_prompt(prompt)
+            self.send_prompt(self.follow_up_prompts["create_unit_test"])
 
         col[2].markdown(create_space_markdown, unsafe_allow_html=True)
         if col[2].button(
@@ -144,11 +449,7 @@ class ArcticOps:
             key=f"how_to_use_{unique_id}",
             use_container_width=True,
         ):
-            prompt = (
-                "\n - Show me step by step and with examples how to use the"
-                " provided code and how to implement it"
-            )
-            self.send_prompt(prompt)
+            self.send_prompt(self.follow_up_prompts["how_to_use"])
 
         prompt = col[3].text_input(
             "Enter your follow up message:",
@@ -160,12 +461,112 @@ class ArcticOps:
             self.send_prompt(f"\n - {prompt}")
 
     def invoke_snowflake_arctic_simple(self, prompt):
-        for event in replicate.stream(
-            "snowflake/snowflake-arctic-instruct",
-            input={
-                "prompt": prompt,
-                "temperature": self.temperature,
-                "top_p": self.top_p,
-            },
+        yield from self.stream_completion(prompt)
+
+    def stream_parallel(self, prompts: Dict[str, str]) -> Iterator[Tuple[str, str]]:
+        """Stream the responses to several independent prompts at once.
+
+        Every prompt is streamed with ``stream_completion`` on a thread pool of
+        at most ``max_parallel_requests`` threads, so the total time is about
+        that of the slowest response instead of the sum. The worker threads
+        only push chunks to a queue, which the calling thread drains, so all
+        Streamlit elements are still written from the script thread. Closing
+        the iterator, e.g. when the script is rerun, cancels the responses
+        still streaming.
+
+        Args:
+            prompts: The prompts by name.
+
+        Yields:
+            The name of a prompt and the next chunk of its response, in the
+            order the chunks arrive.
+
+        Raises:
+            Exception: The first error raised while streaming a response.
+        """
+        ctx = get_script_run_ctx()
+        events = queue.Queue()
+        cancelled = threading.Event()
+
+        def stream(name: str, prompt: str):
+            try:
+                for chunk in self.stream_completion(prompt):
+                    if cancelled.is_set():
+                        break
+                    events.put((name, chunk, None))
+            except Exception as error:
+                events.put((name, None, error))
+            else:
+                events.put((name, None, None))
+
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_parallel_requests, len(prompts))),
+            thread_name_prefix="arctic",
+            # Worker threads need the script context for the cached resources.
+            initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx),
+        )
+        try:
+            for name, prompt in prompts.items():
+                executor.submit(stream, name, prompt)
+            remaining = len(prompts)
+            while remaining:
+                name, chunk, error = events.get()
+                if error is not None:
+                    raise error
+                if chunk is None:
+                    remaining -= 1
+                else:
+                    yield name, chunk
+        finally:
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stream_completion(
+        self, prompt: str, submission: Optional[str] = None, **model_input
+    ) -> Iterator[str]:
+        """Stream the model response to a prompt, using the response caches.
+
+        Responses cached for the exact same call are replayed as a stream.
+        A response is only cached once it has been streamed completely; if a
+        submission is given, it is also indexed in the similarity cache, see
+        ``get_similar_response``.
+
+        Args:
+            prompt: The prompt sent to the model.
+            submission: The user message holding the submitted code, if the
+                response may be offered for similar submissions.
+            **model_input: Additional model input, e.g. the prompt template.
+
+        Yields:
+            The chunks of the response.
+        """
+        cache = get_response_cache()
+        key = None
+        if cache is not None:
+            key = cache.make_key(
+                self.backend.model_name,
+                prompt,
+                self.temperature,
+                self.top_p,
+                **model_input,
+            )
+            response = cache.get(key)
+            if response is not None:
+                yield from cache.replay(response)
+                return
+
+        chunks = []
+        for event in self.backend.stream(
+            prompt, self.temperature, self.top_p, **model_input
         ):
-            yield str(event)
+            chunks.append(event)
+            yield event
+
+        response = "".join(chunks)
+        if cache is not None:
+            cache.set(key, response)
+        similarity_cache = get_similarity_cache() if submission else None
+        if similarity_cache is not None:
+            similarity_cache.add(
+                submission, self.get_completion_params(**model_input), response
+            )
@@ -0,0 +1,48 @@
+import json
+import os
+from functools import lru_cache
+from typing import Any, Dict
+
+ROOT_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+DEFAULT_CONFIG_PATH = os.path.join(ROOT_DIR, "src", "config", "app_config.json")
+
+
+@lru_cache(maxsize=None)
+def load_app_config() -> Dict[str, Any]:
+    """Load the application configuration from a JSON file.
+
+    The file defaults to ``src/config/app_config.json`` and can be replaced
+    by pointing the ``PUFFIN_CONFIG`` environment variable to another file.
+
+    Returns:
+        A dictionary of configuration sections.
+    """
+    file_path = os.environ.get("PUFFIN_CONFIG", DEFAULT_CONFIG_PATH)
+    with open(file_path, "r") as app_config_json:
+        return json.load(app_config_json)
+
+
+def get_config(section: str) -> Dict[str, Any]:
+    """Get one section of the application configuration.
+
+    Args:
+        section: The name of the configuration section.
+
+    Returns:
+        The settings of the section, or an empty dictionary if it is missing.
+    """
+    return load_app_config().get(section, {})
+
+
+def resolve_path(path: str) -> str:
+    """Resolve a configured path relative to the repository root.
+
+    Args:
+        path: An absolute path, or a path relative to the repository root.
+
+    Returns:
+        The absolute path.
+    """
+    return os.path.join(ROOT_DIR, os.path.expanduser(path))
@@ -0,0 +1,200 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+METHODS = ("pearson", "spearman")
+
+
+def _prepare(df: pd.DataFrame, method: str) -> np.ndarray:
+    numeric_df = df.select_dtypes(include=["number"])
+    if method == "spearman":
+        numeric_df = numeric_df.rank()
+    return numeric_df.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+class _Standardised:
+    """
+    Column statistics shared by all blocks of one correlation computation.
+
+    Without missing values every column is centred and scaled to unit norm
+    once, so a block of correlations is a single matrix product. With
+    missing values the pairwise-complete sums are computed per block from
+    the mean-centred, zero-filled values and the missing value mask; the
+    centring keeps large offsets from cancelling out. Spearman ranks are
+    computed over the rows where both values are present, so pairs whose
+    columns miss different rows are ranked again. Both give the same result
+    as ``DataFrame.corr``.
+
+    Args:
+        values (np.ndarray): The numeric columns, ranked for Spearman.
+        method (str): ``pearson`` or ``spearman``.
+    """
+
+    def __init__(self, values: np.ndarray, method: str = "pearson"):
+        self.method = method
+        self.mask = ~np.isnan(values)
+        self.complete = bool(self.mask.all())
+        if self.complete:
+            centred = values - values.mean(axis=0)
+            norms = np.sqrt((centred**2).sum(axis=0))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                self.unit = centred / norms
+        else:
+            self.values = values
+            self.weights = self.mask.astype(np.float64)
+            self.counts = self.weights.sum(axis=0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                means = np.where(self.mask, values, 0.0).sum(axis=0) / self.counts
+            self.filled = np.where(self.mask, values - means, 0.0)
+            self.squared = self.filled**2
+
+    def block(self, rows: slice, columns: slice) -> np.ndarray:
+        if self.complete:
+            return self.unit[:, rows].T @ self.unit[:, columns]
+        x, y = self.filled[:, rows], self.filled[:, columns]
+        mask_x, mask_y = self.weights[:, rows], self.weights[:, columns]
+        count = mask_x.T @ mask_y
+        sum_x = x.T @ mask_y
+        sum_y = mask_x.T @ y
+        with np.errstate(divide="ignore", invalid="ignore"):
+            covariance = x.T @ y - sum_x * sum_y / count
+            variance_x = self.squared[:, rows].T @ mask_y - sum_x**2 / count
+            variance_y = mask_x.T @ self.squared[:, columns] - sum_y**2 / count
+            correlation = covariance / np.sqrt(variance_x * variance_y)
+        correlation[(count < 2) | (variance_x <= 0) | (variance_y <= 0)] = np.nan
+        if self.method == "spearman":
+            self._rerank(correlation, count, rows, columns)
+        return correlation
+
+    def _rerank(
+        self, correlation: np.ndarray, count: np.ndarray, rows: slice, columns: slice
+    ):
+        # Ranks over each column hold for the pairs missing the same rows.
+        same_rows = (count == self.counts[rows, None]) & (
+            count == self.counts[None, columns]
+        )
+        for i, j in zip(*np.nonzero(~same_rows & (count >= 2))):
+            row, column = rows.start + i, columns.start + j
+            both = self.mask[:, row] & self.mask[:, column]
+            x = pd.Series(self.values[both, row]).rank().to_numpy()
+            y = pd.Series(self.values[both, column]).rank().to_numpy()
+            x, y = x - x.mean(), y - y.mean()
+            denominator = np.sqrt((x**2).sum() * (y**2).sum())
+            correlation[i, j] = (x @ y) / denominator if denominator > 0 else np.nan
+
+
+def _top_pairs(
+    correlation: np.ndarray, row_start: int, column_start: int, top_k: int
+) -> List[Tuple[int, int, float]]:
+    strength = np.abs(correlation)
+    rows, columns = np.indices(correlation.shape)
+    rows, columns = rows + row_start, columns + column_start
+    # Each pair once, without the diagonal.
+    valid = (rows < columns) & ~np.isnan(strength)
+    strength, rows, columns = strength[valid], rows[valid], columns[valid]
+    values = correlation[valid]
+    if len(strength) > top_k:
+        best = np.argpartition(-strength, top_k - 1)[:top_k]
+        rows, columns, values = rows[best], columns[best], values[best]
+    return list(zip(rows.tolist(), columns.tolist(), values.tolist()))
+
+
+def compute_correlations(
+    df: pd.DataFrame,
+    method: str = "pearson",
+    top_k: int = 10,
+    max_matrix_columns: int = 25,
+    block_size: int = 256,
+    max_workers: Optional[int] = None,
+) -> Dict:
+    """
+    Computes the pairwise correlations of the numeric columns of a DataFrame.
+
+    The columns are split into blocks and every block pair of the upper
+    triangle is computed on a thread pool; NumPy releases the GIL during
+    the matrix products. Only the strongest pairs of each block are kept,
+    so wide datasets never need the full matrix in memory. The full matrix
+    is assembled for datasets with at most ``max_matrix_columns`` numeric
+    columns.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to correlate.
+        method (str): ``pearson`` or ``spearman``.
+        top_k (int): Number of strongest pairs to return.
+        max_matrix_columns (int): Largest number of numeric columns for
+            which the full matrix is returned.
+        block_size (int): Number of columns per block.
+        max_workers (Optional[int]): Threads of the pool, defaults to the
+            number of CPUs.
+
+    Returns:
+        Dict: The method, the full correlation matrix or None, and the
+        ``top_k`` pairs with the largest absolute correlation.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown correlation method {method!r}.")
+    columns = df.select_dtypes(include=["number"]).columns
+    values = _prepare(df, method)
+    num_columns = values.shape[1]
+    standardised = _Standardised(values, method)
+    matrix = (
+        np.empty((num_columns, num_columns))
+        if num_columns <= max_matrix_columns
+        else None
+    )
+
+    starts = range(0, num_columns, block_size)
+    block_pairs = [
+        (row, column) for row in starts for column in starts if row <= column
+    ]
+
+    def compute_block(block_pair: Tuple[int, int]) -> list:
+        row, column = block_pair
+        rows = slice(row, min(row + block_size, num_columns))
+        columns_slice = slice(column, min(column + block_size, num_columns))
+        correlation = np.clip(standardised.block(rows, columns_slice), -1.0, 1.0)
+        if matrix is not None:
+            matrix[rows, columns_slice] = correlation
+            matrix[columns_slice, rows] = correlation.T
+        return _top_pairs(correlation, row, column, top_k)
+
+    workers = max_workers or os.cpu_count() or 1
+    if len(block_pairs) > 1 and workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            blocks = list(executor.map(compute_block, block_pairs))
+    else:
+        blocks = [compute_block(block_pair) for block_pair in block_pairs]
+
+    candidates = [pair for block in blocks for pair in block]
+
+    candidates.sort(key=lambda pair: abs(pair[2]), reverse=True)
+    top_pairs = pd.DataFrame(
+        [
+            (str(columns[row]), str(columns[column]), value)
+            for row, column, value in candidates[:top_k]
+        ],
+        columns=["Column 1", "Column 2", "Correlation"],
+    )
+    if matrix is not None:
+        matrix = pd.DataFrame(matrix, index=columns, columns=columns)
+    return {"method": method, "matrix": matrix, "top_pairs": top_pairs}
+
+
+def format_top_pairs(top_pairs: pd.DataFrame) -> str:
+    """
+    Formats the strongest correlations as one line per pair for a prompt.
+
+    Args:
+        top_pairs (pd.DataFrame): The pairs returned by ``compute_correlations``.
+
+    Returns:
+        str: The formatted pairs.
+    """
+    if top_pairs.empty:
+        return "No pairs of numeric columns."
+    return "\n".join(
+        f"{first} ~ {second}: {value:+.3f}"
+        for first, second, value in top_pairs.itertuples(index=False)
+    )
@@ -0,0 +1,270 @@
+import warnings
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+from utils.ingestion import StreamingStats
+from utils.sketches import DuplicateCounter, hash_rows
+
+# Number of values processed at once by the outlier counts.
+CHUNK_CELLS = 1 << 22
+
+
+def count_duplicate_rows(
+    df: pd.DataFrame,
+    chunk_rows: int = 100000,
+    max_memory_bytes: int = 256 * 1024 * 1024,
+    spill_directory: Optional[str] = None,
+) -> int:
+    """
+    Counts the rows of a DataFrame that repeat an earlier row.
+
+    Rows are hashed a chunk at a time and the 64-bit row hashes are counted
+    by a ``DuplicateCounter``, which spills them to disk once they take more
+    than ``max_memory_bytes``, so the count costs no more than one chunk and
+    that much memory besides the DataFrame.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to check for duplicates.
+        chunk_rows (int): Number of rows hashed at once.
+        max_memory_bytes (int): Memory of the row hashes before they spill.
+        spill_directory (Optional[str]): Directory of the spilled row hashes.
+
+    Returns:
+        int: The number of duplicate rows.
+    """
+    counter = DuplicateCounter(
+        max_memory_bytes=max_memory_bytes, spill_directory=spill_directory
+    )
+    try:
+        for start in range(0, len(df), chunk_rows):
+            counter.add(hash_rows(df.iloc[start : start + chunk_rows]))
+        return counter.duplicates
+    finally:
+        counter.close()
+
+
+def missing_patterns(df: pd.DataFrame, max_patterns: int = 5) -> pd.DataFrame:
+    """
+    Finds the most frequent combinations of missing columns.
+
+    The missing value mask of the columns with missing values is packed into
+    bytes, one row per row of the DataFrame, and the distinct rows of the
+    packed mask are counted.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to check.
+        max_patterns (int): Number of patterns to return.
+
+    Returns:
+        pd.DataFrame: The missing columns of each pattern, with the number
+        and percentage of rows that have exactly these columns missing.
+    """
+    columns = ["Missing Columns", "Rows", "Rows %"]
+    mask = df.isna().to_numpy()
+    with_missing = mask.any(axis=0)
+    if not with_missing.any():
+        return pd.DataFrame(columns=columns)
+    mask = mask[:, with_missing]
+    rows_with_missing = mask.any(axis=1)
+    patterns, counts = np.unique(
+        np.packbits(mask[rows_with_missing], axis=1), axis=0, return_counts=True
+    )
+    names = df.columns[with_missing].astype(str)
+    order = np.argsort(-counts, kind="stable")[:max_patterns]
+    unpacked = np.unpackbits(patterns[order], axis=1, count=len(names)).astype(bool)
+    return pd.DataFrame(
+        {
+            "Missing Columns": [", ".join(names[pattern]) for pattern in unpacked],
+            "Rows": counts[order],
+            "Rows %": np.round(100 * counts[order] / len(df), 2),
+        },
+        columns=columns,
+    )
+
+
+def count_outliers(
+    df: pd.DataFrame, iqr_multiplier: float = 1.5, mad_threshold: float = 3.5
+) -> pd.DataFrame:
+    """
+    Counts outliers of every numeric column by the IQR and MAD rules.
+
+    A value is an IQR outlier outside ``[Q1 - k * IQR, Q3 + k * IQR]`` and a
+    MAD outlier when its modified z-score ``0.6745 * |x - median| / MAD``
+    exceeds the threshold. Quantiles, medians and counts are computed for
+    blocks of columns at once.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to check.
+        iqr_multiplier (float): The IQR multiplier ``k``.
+        mad_threshold (float): The modified z-score threshold.
+
+    Returns:
+        pd.DataFrame: One row per numeric column with its quartiles, median,
+        MAD and the number and percentage of outliers under each rule.
+    """
+    numeric_df = df.select_dtypes(include=["number"])
+    num_rows, num_columns = numeric_df.shape
+    chunk_columns = max(1, CHUNK_CELLS // max(num_rows, 1))
+    # Quartiles, median, MAD, IQR and MAD outlier counts per column.
+    results = [np.empty(0)] * 6
+    for start in range(0, num_columns, chunk_columns):
+        values = numeric_df.iloc[:, start : start + chunk_columns].to_numpy(
+            dtype=np.float64, na_value=np.nan
+        )
+        with warnings.catch_warnings():
+            # Columns without values yield NaN statistics and no outliers.
+            warnings.simplefilter("ignore", RuntimeWarning)
+            q1, median, q3 = np.nanpercentile(values, [25, 50, 75], axis=0)
+            deviations = np.abs(values - median)
+            mad = np.nanmedian(deviations, axis=0)
+        iqr = q3 - q1
+        with np.errstate(invalid="ignore", divide="ignore"):
+            iqr_outliers = (values < q1 - iqr_multiplier * iqr) | (
+                values > q3 + iqr_multiplier * iqr
+            )
+            mad_outliers = 0.6745 * deviations / mad > mad_threshold
+        chunk_results = (
+            q1,
+            median,
+            q3,
+            mad,
+            iqr_outliers.sum(axis=0),
+            mad_outliers.sum(axis=0),
+        )
+        results = [
+            np.concatenate([result, chunk_result])
+            for result, chunk_result in zip(results, chunk_results)
+        ]
+
+    q1, median, q3, mad, iqr_counts, mad_counts = results
+    non_null = numeric_df.count().to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        iqr_percent = np.round(100 * iqr_counts / non_null, 2)
+        mad_percent = np.round(100 * mad_counts / non_null, 2)
+    return pd.DataFrame(
+        {
+            "Column": numeric_df.columns.astype(str),
+            "Q1": q1,
+            "Median": median,
+            "Q3": q3,
+            "MAD": mad,
+            "IQR Outliers": iqr_counts.astype(np.int64),
+            "IQR Outliers %": iqr_percent,
+            "MAD Outliers": mad_counts.astype(np.int64),
+            "MAD Outliers %": mad_percent,
+        }
+    )
+
+
+class DataQualityReport:
+    """
+    Duplicate rows, missing values and outliers of a dataset.
+
+    In large file mode ``df`` is a sample of the file. The duplicate and
+    missing value counts then come from ``stats`` and cover the whole file;
+    missing value patterns and outliers are estimated from the sample.
+
+    Args:
+        df (pd.DataFrame): The dataset to check, or its sample.
+        stats (Optional[StreamingStats]): Statistics of the whole file in
+            large file mode.
+        chunk_rows (int): Number of rows hashed at once.
+        duplicate_memory_bytes (int): Memory of the row hashes before they
+            are spilled to disk.
+        spill_directory (Optional[str]): Directory of the spilled row hashes.
+        max_patterns (int): Number of missing value patterns listed.
+        iqr_multiplier (float): The IQR multiplier of the outlier rule.
+        mad_threshold (float): The modified z-score threshold of the MAD rule.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        stats: Optional[StreamingStats] = None,
+        chunk_rows: int = 100000,
+        duplicate_memory_bytes: int = 256 * 1024 * 1024,
+        spill_directory: Optional[str] = None,
+        max_patterns: int = 5,
+        iqr_multiplier: float = 1.5,
+        mad_threshold: float = 3.5,
+    ):
+        if stats is None:
+            self.num_rows = len(df)
+            self.duplicate_rows = count_duplicate_rows(
+                df, chunk_rows, duplicate_memory_bytes, spill_directory
+            )
+            missing = df.isna().sum()
+        else:
+            self.num_rows = stats.num_rows
+            self.duplicate_rows = stats.duplicate_rows
+            missing = pd.Series(
+                stats.null_counts, index=[field.name for field in stats.schema]
+            )
+        missing = missing[missing > 0].sort_values(ascending=False, kind="stable")
+        self.missing_values = pd.DataFrame(
+            {
+                "Column": missing.index.astype(str),
+                "Missing": missing.to_numpy(),
+                "Missing %": np.round(
+                    100 * missing.to_numpy() / max(self.num_rows, 1), 2
+                ),
+            }
+        )
+        self.missing_patterns = missing_patterns(df, max_patterns)
+        self.outliers = count_outliers(df, iqr_multiplier, mad_threshold)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the report in bytes."""
+        frames = (self.missing_values, self.missing_patterns, self.outliers)
+        return int(
+            sum(frame.memory_usage(index=True, deep=True).sum() for frame in frames)
+        )
+
+    def to_prompt(self) -> str:
+        """
+        Formats the report as short plain text for an LLM prompt.
+
+        Returns:
+            str: The duplicate count, the columns with missing values, the
+            most frequent missing value patterns and the columns with
+            outliers.
+        """
+        duplicate_percent = 100 * self.duplicate_rows / max(self.num_rows, 1)
+        lines = [
+            f"Duplicate rows: {self.duplicate_rows:,} of {self.num_rows:,} "
+            f"({duplicate_percent:.2f}%)"
+        ]
+        if self.missing_values.empty:
+            lines.append("Missing values: none")
+        else:
+            lines.append("Missing values (column: count, %):")
+            lines.extend(
+                f"- {column}: {count:,}, {percent}%"
+                for column, count, percent in self.missing_values.itertuples(
+                    index=False
+                )
+            )
+        if not self.missing_patterns.empty:
+            lines.append("Most frequent missing value patterns (columns: % of rows):")
+            lines.extend(
+                f"- {columns}: {percent}%"
+                for columns, _, percent in self.missing_patterns.itertuples(index=False)
+            )
+        outliers = self.outliers[
+            (self.outliers["IQR Outliers"] > 0) | (self.outliers["MAD Outliers"] > 0)
+        ]
+        if outliers.empty:
+            lines.append("Outliers: none")
+        else:
+            lines.append("Outliers (column: IQR rule %, MAD rule %):")
+            lines.extend(
+                f"- {column}: {iqr_percent}%, {mad_percent}%"
+                for column, iqr_percent, mad_percent in zip(
+                    outliers["Column"],
+                    outliers["IQR Outliers %"],
+                    outliers["MAD Outliers %"],
+                )
+            )
+        return "\n".join(lines)
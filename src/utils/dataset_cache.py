@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import streamlit as st
+from typing import Dict, Optional, Tuple
+
+from utils.config import get_config, resolve_path
+
+logger = logging.getLogger(__name__)
+
+METADATA_KEY = b"puffin.dataset"
+# Metadata values stored as Arrow IPC tables and schemas instead of JSON.
+TABLE_KEY_PREFIX = b"puffin.table."
+SCHEMA_KEY_PREFIX = b"puffin.schema."
+
+
+def _encode_metadata(metadata: Dict) -> Dict[bytes, bytes]:
+    encoded, values = {}, {}
+    for name, value in metadata.items():
+        if isinstance(value, pa.Table):
+            sink = pa.BufferOutputStream()
+            with ipc.new_stream(sink, value.schema) as writer:
+                writer.write_table(value)
+            encoded[TABLE_KEY_PREFIX + name.encode()] = sink.getvalue().to_pybytes()
+        elif isinstance(value, pa.Schema):
+            encoded[SCHEMA_KEY_PREFIX + name.encode()] = value.serialize().to_pybytes()
+        else:
+            values[name] = value
+    encoded[METADATA_KEY] = json.dumps(values).encode("utf-8")
+    return encoded
+
+
+def _decode_metadata(schema_metadata: Dict[bytes, bytes]) -> Dict:
+    metadata = json.loads(schema_metadata[METADATA_KEY])
+    for key, value in schema_metadata.items():
+        if key.startswith(TABLE_KEY_PREFIX):
+            name = key[len(TABLE_KEY_PREFIX) :].decode()
+            metadata[name] = ipc.open_stream(value).read_all()
+        elif key.startswith(SCHEMA_KEY_PREFIX):
+            name = key[len(SCHEMA_KEY_PREFIX) :].decode()
+            metadata[name] = ipc.read_schema(pa.py_buffer(value))
+    return metadata
+
+
+class DatasetDiskCache:
+    """
+    Content-addressed cache of loaded datasets as Arrow IPC files.
+
+    Every dataset is written once as an uncompressed Arrow IPC file named
+    after its cache key, and later loads memory-map that file. Memory-mapped
+    buffers are backed by the OS page cache, so sessions and server
+    processes reading the same dataset share its pages instead of holding
+    private copies. Reading a file refreshes its modification time, and
+    the least recently used files are deleted once the cache grows over
+    ``max_bytes``. A file deleted while mapped stays readable until it is
+    unmapped.
+
+    The metadata stored with a dataset is kept in the schema metadata of its
+    file as JSON, with Arrow tables and schemas as IPC messages, so reading
+    a cache file never runs code from it.
+
+    Args:
+        directory (str): The cache directory.
+        max_bytes (int): Size cap of the cache directory.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 2 * 1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        """
+        Returns the path of the cache file of a dataset.
+
+        Args:
+            key (str): The cache key of the dataset.
+
+        Returns:
+            str: The path, whether or not the dataset is cached.
+        """
+        return os.path.join(self.directory, f"{key}.arrow")
+
+    def get(self, key: str) -> Optional[Tuple[pa.Table, Dict]]:
+        """
+        Memory-maps a cached dataset.
+
+        Args:
+            key (str): The cache key of the dataset.
+
+        Returns:
+            Optional[Tuple[pa.Table, Dict]]: The table, whose buffers point
+            into the mapped file, and the metadata stored with it, or None if
+            the dataset is not cached or its entry cannot be read.
+        """
+        path = self.path(key)
+        try:
+            source = pa.memory_map(path, "r")
+            table = ipc.open_file(source).read_all()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, pa.ArrowInvalid) as error:
+            logger.warning("Could not read cached dataset %s: %s", path, error)
+            return None
+        try:
+            metadata = _decode_metadata(table.schema.metadata or {})
+        except Exception as error:
+            # Corrupt entries and entries of older versions count as misses.
+            logger.warning("Dropping unreadable cached dataset %s: %s", path, error)
+            self.remove(key)
+            return None
+        return table, metadata
+
+    def remove(self, key: str):
+        """
+        Deletes a cached dataset. Mapped copies stay readable until unmapped.
+
+        Args:
+            key (str): The cache key of the dataset.
+        """
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def put(self, key: str, table: pa.Table, metadata: Dict):
+        """
+        Writes a dataset to the cache, evicting old datasets over the size cap.
+
+        Args:
+            key (str): The cache key of the dataset.
+            table (pa.Table): The data.
+            metadata (Dict): Data stored alongside, e.g. statistics, as JSON
+                values, Arrow tables and Arrow schemas.
+        """
+        schema_metadata = dict(table.schema.metadata or {})
+        schema_metadata.update(_encode_metadata(metadata))
+        table = table.replace_schema_metadata(schema_metadata)
+        # Written under a temporary name so readers never see partial files.
+        file_descriptor, temporary_path = tempfile.mkstemp(
+            dir=self.directory, suffix=".tmp"
+        )
+        os.close(file_descriptor)
+        try:
+            with pa.OSFile(temporary_path, "wb") as sink:
+                with ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(temporary_path, self.path(key))
+        except OSError as error:
+            logger.warning("Could not cache dataset %s: %s", key[:12], error)
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            return
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".arrow"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total_size <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total_size -= size
+                except FileNotFoundError:
+                    pass
+
+
+@st.cache_resource(show_spinner=False)
+def get_dataset_disk_cache() -> Optional[DatasetDiskCache]:
+    """
+    Creates the dataset disk cache from the app config.
+
+    Returns:
+        Optional[DatasetDiskCache]: The dataset cache, or None if it is
+        disabled.
+    """
+    config = get_config("dataset_cache")
+    if not config.get("enabled", True):
+        return None
+    return DatasetDiskCache(
+        directory=resolve_path(config.get("directory", ".cache/datasets")),
+        max_bytes=int(config.get("max_disk_mb", 2048) * 1024 * 1024),
+    )
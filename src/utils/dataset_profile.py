@@ -0,0 +1,628 @@
+import hashlib
+import logging
+import sys
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import streamlit as st
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple
+
+from utils.config import get_config, resolve_path
+from utils.correlation import compute_correlations
+from utils.data_quality import DataQualityReport
+from utils.ingestion import StreamingStats, is_arrow_dtype
+
+logger = logging.getLogger(__name__)
+
+# Number of values factorized at once by the column profiler.
+CHUNK_CELLS = 1 << 20
+
+
+def hash_dataframe(df: pd.DataFrame) -> str:
+    """
+    Computes a content hash of a DataFrame.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to hash.
+
+    Returns:
+        str: A hex digest of the values, index, column names and dtypes.
+    """
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    digest.update(repr(list(df.columns)).encode("utf-8"))
+    digest.update(repr(list(df.dtypes.astype(str))).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_random_sample(
+    df: pd.DataFrame, sample_size: int = 10, random_state: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Returns a random sample from the given DataFrame.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to sample from.
+        sample_size (int): The number of rows to return in the sample.
+        random_state (Optional[int]): Seed of the sample, random if None.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing the random sample.
+    """
+    if random_state is None:
+        random_state = np.random.randint(0, 10000)
+    return df.sample(n=min(sample_size, len(df)), random_state=random_state)
+
+
+def stratified_sample(
+    df: pd.DataFrame, column: str, sample_size: int = 10, random_state: int = 0
+) -> pd.DataFrame:
+    """
+    Returns a sample with rows from the groups of a column.
+
+    Rows are allocated to the groups in proportion to their size, with at
+    least one row per group while there are fewer groups than rows; with
+    more groups, the largest groups get one row each. Missing values form
+    their own group. Rows are drawn without replacement, in their original
+    order.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to sample from.
+        column (str): The column defining the groups.
+        sample_size (int): The number of rows to return in the sample.
+        random_state (int): Seed of the sample.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing the stratified sample.
+    """
+    sample_size = min(sample_size, len(df))
+    codes, _ = pd.factorize(df[column], use_na_sentinel=False)
+    sizes = np.bincount(codes)
+    if len(sizes) >= sample_size:
+        allocation = np.zeros(len(sizes), dtype=np.int64)
+        allocation[np.argsort(-sizes, kind="stable")[:sample_size]] = 1
+    else:
+        shares = (sample_size - len(sizes)) * sizes / sizes.sum()
+        allocation = 1 + np.floor(shares).astype(np.int64)
+        # Hand out the remaining rows by largest remainder.
+        remainder = sample_size - allocation.sum()
+        allocation[np.argsort(np.floor(shares) - shares, kind="stable")[:remainder]] += 1
+        allocation = np.minimum(allocation, sizes)
+
+    # Rank the rows of every group by a random key and keep the first ones.
+    keys = np.random.default_rng(random_state).random(len(df))
+    order = np.lexsort((keys, codes))
+    group_starts = np.r_[0, np.cumsum(sizes)[:-1]]
+    rank = np.arange(len(df)) - group_starts[codes[order]]
+    selected = np.sort(order[rank < allocation[codes[order]]])
+    return df.iloc[selected]
+
+
+def generate_descriptive_statistics(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Generates descriptive statistics for the given DataFrame.
+
+    Args:
+        df (pd.DataFrame): The DataFrame for which to generate statistics.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing the descriptive statistics.
+    """
+    return df.describe()
+
+
+def _format_top_values(values, counts) -> str:
+    if getattr(values, "dtype", None) is not None and values.dtype.kind in "mM":
+        # Shown as timestamps and timedeltas, not as raw NumPy values.
+        values = pd.Index(values)
+    return ", ".join(f"{value} ({count})" for value, count in zip(values, counts))
+
+
+def _format_repeated_values(value_counts: list) -> str:
+    repeated = [(value, count) for value, count in value_counts if count > 1]
+    return _format_top_values(*zip(*repeated)) if repeated else ""
+
+
+def _top_runs(
+    run_columns: np.ndarray,
+    lengths: np.ndarray,
+    values: np.ndarray,
+    top_values: int,
+) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    # Only values that occur more than once are listed as top values.
+    repeated = lengths > 1
+    if top_values <= 0 or not repeated.any():
+        return
+    run_columns, lengths, values = (
+        run_columns[repeated],
+        lengths[repeated],
+        values[repeated],
+    )
+    order = np.lexsort((-lengths, run_columns))
+    run_columns, lengths, values = run_columns[order], lengths[order], values[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(run_columns)) + 1]
+    rank = np.arange(len(run_columns)) - np.repeat(
+        starts, np.diff(np.r_[starts, len(run_columns)])
+    )
+    keep = rank < top_values
+    run_columns, lengths, values = run_columns[keep], lengths[keep], values[keep]
+    bounds = np.flatnonzero(np.diff(run_columns)) + 1
+    yield from zip(
+        run_columns[np.r_[0, bounds]].tolist(),
+        np.split(values, bounds),
+        np.split(lengths, bounds),
+    )
+
+
+def _profile_sorted(values: np.ndarray, non_null: np.ndarray, top_values: int):
+    # Every column is sorted, missing values last, so its distinct values
+    # are runs of equal values and the run lengths are their counts.
+    num_columns, num_rows = values.shape
+    values = np.sort(values, axis=1)
+    valid = np.arange(num_rows) < non_null[:, None]
+    boundaries = np.ones(values.shape, dtype=bool)
+    boundaries[:, 1:] = values[:, 1:] != values[:, :-1]
+    # The first missing value ends the last run of its column.
+    ends = ~valid & np.c_[np.ones(num_columns, dtype=bool), valid[:, :-1]]
+    starts = np.flatnonzero((boundaries & valid) | ends)
+    lengths = np.diff(np.r_[starts, values.size])
+    is_run = valid.ravel()[starts]
+    starts, lengths = starts[is_run], lengths[is_run]
+    run_columns = starts // num_rows
+    unique = np.bincount(run_columns, minlength=num_columns)
+    run_values = values.ravel()[starts]
+    if run_values.dtype.kind == "f":
+        # Zero is listed as 0.0, whichever of 0.0 and -0.0 sorted first.
+        run_values = run_values + 0.0
+    top = _top_runs(run_columns, lengths, run_values, top_values)
+    return unique, top
+
+
+def _profile_factorized(values: np.ndarray, top_values: int):
+    num_columns, num_rows = values.shape
+    # Codes of the values, column by column; missing values are -1.
+    codes, uniques = pd.factorize(values.ravel())
+    column_of = np.repeat(np.arange(num_columns), num_rows)
+    valid = codes >= 0
+    pairs = column_of[valid] * len(uniques) + codes[valid]
+    if len(uniques) * num_columns <= 4 * len(pairs):
+        counts = np.bincount(pairs, minlength=len(uniques) * num_columns)
+        pairs = np.flatnonzero(counts)
+        counts = counts[pairs]
+    else:
+        pairs, counts = np.unique(pairs, return_counts=True)
+    run_columns, run_codes = np.divmod(pairs, max(len(uniques), 1))
+    unique = np.bincount(run_columns, minlength=num_columns)
+    top = _top_runs(run_columns, counts, np.asarray(uniques)[run_codes], top_values)
+    return unique, top, uniques, codes, column_of, valid
+
+
+def _profile_arrow(block: pd.DataFrame, top_values: int):
+    # Arrow counts the values of a column faster than a factorization.
+    unique = np.zeros(block.shape[1], dtype=np.int64)
+    top = []
+    for column, (_, series) in enumerate(block.items()):
+        value_counts = pc.value_counts(pc.drop_null(pa.array(series.array)))
+        unique[column] = len(value_counts)
+        counts = value_counts.field("counts").to_numpy()
+        best = np.argsort(-counts, kind="stable")[: max(top_values, 0)]
+        best = best[counts[best] > 1]
+        if len(best):
+            values = value_counts.field("values").take(best)
+            top.append((column, values.to_numpy(zero_copy_only=False), counts[best]))
+    return unique, top
+
+
+def profile_columns(df: pd.DataFrame, top_values: int = 3) -> pd.DataFrame:
+    """
+    Summarises every column of a DataFrame in one vectorised pass.
+
+    Columns are processed in blocks of the same dtype. Numeric and datetime
+    blocks are sorted column by column in one NumPy call, so the distinct
+    values and their counts are runs of equal values. Arrow-backed columns
+    are counted by Arrow one at a time. Other blocks are factorized once,
+    which yields the distinct values and the most frequent values of all
+    their columns together instead of column by column.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to summarise.
+        top_values (int): Number of most frequent values listed per column.
+
+    Returns:
+        pd.DataFrame: One row per column with its dtype, non-null count,
+        null percentage, number of distinct values, most frequent values and
+        memory usage.
+    """
+    num_rows, num_columns = df.shape
+    dtypes = df.dtypes
+    dtype_codes, dtype_uniques = pd.factorize(dtypes.to_numpy())
+    dtype_names = np.array([str(dtype) for dtype in dtype_uniques])[dtype_codes]
+    non_null = df.notna().sum().to_numpy()
+    unique = np.zeros(num_columns, dtype=np.int64)
+    memory = np.zeros(num_columns, dtype=np.int64)
+    top = np.full(num_columns, "", dtype=object)
+
+    # Columns processed together, sized so the working set stays small.
+    chunk_columns = max(1, CHUNK_CELLS // max(num_rows, 1))
+    chunks = []
+    for dtype_code, dtype in enumerate(dtype_uniques):
+        dtype_positions = np.flatnonzero(dtype_codes == dtype_code)
+        for start in range(0, len(dtype_positions), chunk_columns):
+            chunks.append((dtype, dtype_positions[start : start + chunk_columns]))
+
+    for dtype, positions in chunks:
+        block = df.iloc[:, positions]
+        is_numpy = isinstance(dtype, np.dtype)
+        if is_numpy and dtype != object:
+            memory[positions] = dtype.itemsize * num_rows
+        elif not is_numpy:
+            memory[positions] = block.memory_usage(index=False, deep=True).to_numpy()
+        if num_rows == 0:
+            continue
+
+        if is_arrow_dtype(dtype):
+            unique[positions], column_top = _profile_arrow(block, top_values)
+            for column, column_values, column_counts in column_top:
+                top[positions[column]] = _format_top_values(
+                    column_values, column_counts
+                )
+            continue
+
+        # One row per column, so every column is contiguous.
+        values = block.to_numpy().T
+        if is_numpy and dtype.kind in "biufmM":
+            unique[positions], column_top = _profile_sorted(
+                values, non_null[positions], top_values
+            )
+        else:
+            unique[positions], column_top, uniques, codes, column_of, valid = (
+                _profile_factorized(values, top_values)
+            )
+            if dtype == object:
+                # Pointer array plus the size of every referenced object.
+                value_sizes = np.fromiter(
+                    (sys.getsizeof(value) for value in uniques),
+                    dtype=np.float64,
+                    count=len(uniques),
+                )
+                memory[positions] = num_rows * dtype.itemsize + np.bincount(
+                    column_of[valid],
+                    weights=value_sizes[codes[valid]],
+                    minlength=len(positions),
+                ).astype(np.int64)
+        for column, column_values, column_counts in column_top:
+            top[positions[column]] = _format_top_values(column_values, column_counts)
+
+    null_percent = (
+        np.round(100 * (1 - non_null / num_rows), 2)
+        if num_rows
+        else np.zeros(num_columns)
+    )
+    return pd.DataFrame(
+        {
+            "Column": df.columns.astype(str),
+            "Dtype": dtype_names,
+            "Non-Null Count": non_null,
+            "Null %": null_percent,
+            "Unique": unique,
+            "Top Values": top,
+            "Memory (KB)": np.round(memory / 1024, 1),
+        }
+    )
+
+
+def generate_correlations(df: pd.DataFrame, method: Optional[str] = None) -> Dict:
+    """
+    Computes the correlations of the numeric columns with the configured engine.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to correlate.
+        method (Optional[str]): ``pearson`` or ``spearman``, the configured
+            method if None.
+
+    Returns:
+        Dict: The method, the full correlation matrix of narrow datasets or
+        None, and the strongest pairs of columns.
+    """
+    config = get_config("correlation")
+    return compute_correlations(
+        df,
+        method=method or config.get("method", "pearson"),
+        top_k=config.get("top_k", 10),
+        max_matrix_columns=config.get("max_matrix_columns", 25),
+        block_size=config.get("block_size", 256),
+        max_workers=config.get("max_workers"),
+    )
+
+
+def generate_data_quality_report(
+    df: pd.DataFrame, stats: Optional[StreamingStats] = None
+) -> DataQualityReport:
+    """
+    Checks duplicates, missing values and outliers with the configured rules.
+
+    Args:
+        df (pd.DataFrame): The dataset, or its sample in large file mode.
+        stats (Optional[StreamingStats]): Statistics of the whole file in
+            large file mode.
+
+    Returns:
+        DataQualityReport: The data quality report.
+    """
+    config = get_config("data_quality")
+    return DataQualityReport(
+        df,
+        stats,
+        chunk_rows=config.get("chunk_rows", 100000),
+        duplicate_memory_bytes=int(
+            config.get("duplicate_memory_mb", 256) * 1024 * 1024
+        ),
+        spill_directory=resolve_path(config.get("spill_directory", ".cache/spill")),
+        max_patterns=config.get("max_patterns", 5),
+        iqr_multiplier=config.get("iqr_multiplier", 1.5),
+        mad_threshold=config.get("mad_threshold", 3.5),
+    )
+
+
+class DatasetProfile:
+    """
+    Statistics of a loaded dataset, computed once and shared by every panel
+    and prompt builder of the Data Insights page.
+
+    In large file mode ``df`` is a sample of the file. Row counts, null
+    counts, distinct and top values and the descriptive statistics then come
+    from ``stats``, which covers the whole file with exact counts and
+    moments and approximate quantiles, distinct counts and top values;
+    correlations are estimated from the sample. Correlations for the
+    configured method are computed upfront, other methods on first request,
+    and so are stratified data samples and the data quality report.
+
+    Args:
+        dataset_hash (str): The content hash of the dataset.
+        df (pd.DataFrame): The dataset to profile, or its sample.
+        sample_size (int): Number of rows in the data sample.
+        stats (Optional[StreamingStats]): Statistics of the whole file in
+            large file mode.
+        sample (Optional[pd.DataFrame]): The data sample drawn at ingestion,
+            drawn from ``df`` if not given.
+        max_strata (int): Most distinct values of a column offered for
+            stratified samples.
+    """
+
+    def __init__(
+        self,
+        dataset_hash: str,
+        df: pd.DataFrame,
+        sample_size: int = 10,
+        stats: Optional[StreamingStats] = None,
+        sample: Optional[pd.DataFrame] = None,
+        max_strata: int = 50,
+    ):
+        self.dataset_hash = dataset_hash
+        self.num_rows, self.num_columns = df.shape
+        self.sampled_rows = None
+        self.columns = df.columns
+        self.dtypes = df.dtypes
+        self.sample_size = sample_size
+        # Seeded by the content hash so the sample is stable across reruns.
+        self.sample = (
+            sample
+            if sample is not None
+            else get_random_sample(df, sample_size, random_state=self.seed)
+        )
+        self._samples = {None: self.sample}
+        self.column_summary = profile_columns(df)
+        self.descriptive_statistics = generate_descriptive_statistics(df)
+        self.correlations = generate_correlations(df)
+        self._correlations = {self.correlations["method"]: self.correlations}
+        self._data_quality = None
+        self._lock = threading.Lock()
+        if stats is not None:
+            self.sampled_rows = self.num_rows
+            self.num_rows = stats.num_rows
+            non_null = self.column_summary["Column"].map(stats.non_null_counts)
+            self.column_summary["Non-Null Count"] = non_null.to_numpy()
+            self.column_summary["Null %"] = (
+                np.round(100 * (1 - non_null / stats.num_rows), 2).to_numpy()
+                if stats.num_rows
+                else 0.0
+            )
+            columns = self.column_summary["Column"]
+            self.column_summary["Unique"] = columns.map(stats.distinct_counts).to_numpy()
+            top_values = {
+                name: _format_repeated_values(top)
+                for name, top in stats.top_values().items()
+            }
+            self.column_summary["Top Values"] = columns.map(top_values).to_numpy()
+            self.descriptive_statistics = stats.describe()
+        unique = self.column_summary["Unique"].to_numpy()
+        self.strata_columns = list(self.columns[(unique > 1) & (unique <= max_strata)])
+
+    @property
+    def seed(self) -> int:
+        """Seed of the samples, derived from the content hash."""
+        return int(self.dataset_hash[:8], 16)
+
+    def get_sample(
+        self, df: pd.DataFrame, stratify_by: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        Gets the data sample, stratified by a column on request.
+
+        Args:
+            df (pd.DataFrame): The profiled dataset, or its sample.
+            stratify_by (Optional[str]): One of ``strata_columns``, or None
+                for the sample drawn at ingestion.
+
+        Returns:
+            pd.DataFrame: The data sample.
+        """
+        with self._lock:
+            sample = self._samples.get(stratify_by)
+            if sample is None:
+                sample = stratified_sample(
+                    df, stratify_by, self.sample_size, random_state=self.seed
+                )
+                self._samples[stratify_by] = sample
+        return sample
+
+    def get_correlations(self, df: pd.DataFrame, method: str) -> Dict:
+        """
+        Gets the correlations for a method, computing them on first request.
+
+        Args:
+            df (pd.DataFrame): The profiled dataset, or its sample.
+            method (str): ``pearson`` or ``spearman``.
+
+        Returns:
+            Dict: The correlations as returned by ``generate_correlations``.
+        """
+        with self._lock:
+            correlations = self._correlations.get(method)
+            if correlations is None:
+                correlations = generate_correlations(df, method)
+                self._correlations[method] = correlations
+        return correlations
+
+    def get_data_quality(
+        self, df: pd.DataFrame, stats: Optional[StreamingStats] = None
+    ) -> DataQualityReport:
+        """
+        Gets the data quality report, computing it on first request.
+
+        Args:
+            df (pd.DataFrame): The profiled dataset, or its sample.
+            stats (Optional[StreamingStats]): Statistics of the whole file in
+                large file mode.
+
+        Returns:
+            DataQualityReport: The data quality report.
+        """
+        with self._lock:
+            if self._data_quality is None:
+                self._data_quality = generate_data_quality_report(df, stats)
+        return self._data_quality
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the profile in bytes."""
+        frames = [
+            self.sample,
+            self.column_summary,
+            self.descriptive_statistics,
+            self.correlations["top_pairs"],
+        ]
+        if self.correlations["matrix"] is not None:
+            frames.append(self.correlations["matrix"])
+        return int(
+            sum(frame.memory_usage(index=True, deep=True).sum() for frame in frames)
+        )
+
+
+class DatasetProfileCache:
+    """
+    Process-wide cache of dataset profiles keyed by content hash.
+
+    Sessions that load the same data share one profile. The least recently
+    used profiles are evicted once the cache holds more than ``max_bytes``.
+
+    Args:
+        max_bytes (int): Memory budget of the cached profiles.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, dataset_hash: str) -> Optional[DatasetProfile]:
+        """
+        Gets the profile of a dataset.
+
+        Args:
+            dataset_hash (str): The content hash of the dataset.
+
+        Returns:
+            Optional[DatasetProfile]: The profile, or None if it is not cached.
+        """
+        with self._lock:
+            entry = self._profiles.get(dataset_hash)
+            if entry is None:
+                return None
+            self._profiles.move_to_end(dataset_hash)
+            return entry[0]
+
+    def set(self, profile: DatasetProfile):
+        """
+        Caches a profile, evicting the least recently used ones over budget.
+
+        Args:
+            profile (DatasetProfile): The profile to cache.
+        """
+        size = profile.nbytes
+        with self._lock:
+            previous = self._profiles.pop(profile.dataset_hash, None)
+            if previous is not None:
+                self.total_bytes -= previous[1]
+            self._profiles[profile.dataset_hash] = (profile, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and len(self._profiles) > 1:
+                _, (_, evicted_size) = self._profiles.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+
+@st.cache_resource(show_spinner=False)
+def get_dataset_profile_cache() -> DatasetProfileCache:
+    """
+    Creates the process-wide dataset profile cache from the app config.
+
+    Returns:
+        DatasetProfileCache: The dataset profile cache.
+    """
+    config = get_config("dataset_profile")
+    return DatasetProfileCache(
+        max_bytes=int(config.get("max_memory_mb", 256) * 1024 * 1024)
+    )
+
+
+def get_dataset_profile(
+    df: pd.DataFrame,
+    dataset_hash: Optional[str] = None,
+    stats: Optional[StreamingStats] = None,
+    sample: Optional[pd.DataFrame] = None,
+) -> DatasetProfile:
+    """
+    Gets the profile of a dataset, computing it on the first request.
+
+    Args:
+        df (pd.DataFrame): The dataset, or its sample in large file mode.
+        dataset_hash (Optional[str]): The content hash of the dataset, computed
+            from the data if not given.
+        stats (Optional[StreamingStats]): Statistics of the whole file in
+            large file mode.
+        sample (Optional[pd.DataFrame]): The data sample drawn at ingestion.
+
+    Returns:
+        DatasetProfile: The profile of the dataset.
+    """
+    if dataset_hash is None:
+        dataset_hash = hash_dataframe(df)
+    cache = get_dataset_profile_cache()
+    profile = cache.get(dataset_hash)
+    if profile is None:
+        logger.info("Profiling dataset %s", dataset_hash[:12])
+        config = get_config("dataset_profile")
+        profile = DatasetProfile(
+            dataset_hash,
+            df,
+            sample_size=config.get("sample_size", 10),
+            stats=stats,
+            sample=sample,
+            max_strata=config.get("max_strata", 50),
+        )
+        cache.set(profile)
+    return profile
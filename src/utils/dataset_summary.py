@@ -0,0 +1,261 @@
+import numpy as np
+import pandas as pd
+from typing import Callable, List, Optional, Tuple
+
+from utils.config import get_config
+from utils.correlation import format_top_pairs
+from utils.data_quality import DataQualityReport
+from utils.dataset_profile import DatasetProfile
+from utils.tokenizer import get_tokenizer_loader
+
+# Share of the token budget each section may use at most, in priority order.
+SECTION_SHARES = {
+    "columns": 0.5,
+    "correlations": 0.15,
+    "data_quality": 0.15,
+    "sample": 0.3,
+}
+# Statistics listed per numeric column and their labels.
+STATISTICS = {"mean": "mean", "std": "std", "min": "min", "50%": "median", "max": "max"}
+# Longest rendered value in the sample and the top values.
+MAX_VALUE_CHARS = 24
+# Most columns shown in the sample rows.
+MAX_SAMPLE_COLUMNS = 12
+# Weakest correlation that makes a column rank higher.
+MIN_CORRELATION = 0.3
+
+
+def _format_number(value) -> str:
+    if pd.isna(value):
+        return "nan"
+    return f"{value:.4g}"
+
+
+def _truncate(value, max_chars: int = MAX_VALUE_CHARS) -> str:
+    text = str(value).replace("\n", " ")
+    return text if len(text) <= max_chars else text[: max_chars - 1] + "…"
+
+
+def _format_value(value) -> str:
+    if isinstance(value, (float, np.floating)):
+        return _format_number(value)
+    return _truncate(value)
+
+
+def rank_columns(profile: DatasetProfile) -> np.ndarray:
+    """
+    Ranks the columns of a profiled dataset from most to least informative.
+
+    Constant and empty columns rank last. Columns in strong correlations
+    rank first, then columns by how complete they are; text
+    columns that are nearly unique, such as identifiers or free text, are
+    ranked down. Ties keep the original column order.
+
+    Args:
+        profile (DatasetProfile): The profile of the dataset.
+
+    Returns:
+        np.ndarray: Positions of the columns, most informative first.
+    """
+    summary = profile.column_summary
+    non_null = summary["Non-Null Count"].to_numpy(dtype=np.float64)
+    unique = summary["Unique"].to_numpy(dtype=np.float64)
+    numeric = summary["Column"].isin(profile.descriptive_statistics.columns.astype(str))
+    completeness = non_null / max(profile.num_rows, 1)
+
+    top_pairs = profile.correlations["top_pairs"]
+    strength = pd.concat(
+        [
+            top_pairs.set_index("Column 1")["Correlation"].abs(),
+            top_pairs.set_index("Column 2")["Correlation"].abs(),
+        ]
+    )
+    strength = strength.groupby(level=0).max()
+    strength = strength[strength >= MIN_CORRELATION]
+    correlated = summary["Column"].map(strength).fillna(0).to_numpy()
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        identifier_like = ~numeric.to_numpy() & (unique / non_null > 0.9)
+    score = 1 + completeness + correlated - 0.75 * identifier_like
+    score[(unique <= 1) | (non_null == 0)] = 0
+    return np.argsort(-score, kind="stable")
+
+
+def _describe_column(profile: DatasetProfile, position: int) -> str:
+    row = profile.column_summary.iloc[position]
+    name = row["Column"]
+    parts = [
+        name,
+        row["Dtype"],
+        f"{row['Null %']:g}% null",
+        f"{int(row['Unique']):,} unique",
+    ]
+    statistics = profile.descriptive_statistics
+    if name in statistics.columns:
+        column = statistics[name]
+        parts.append(
+            " ".join(
+                f"{label}={_format_number(column[statistic])}"
+                for statistic, label in STATISTICS.items()
+                if statistic in column.index
+            )
+        )
+    elif row["Top Values"]:
+        parts.append(f"top: {_truncate(row['Top Values'], 3 * MAX_VALUE_CHARS)}")
+    return " | ".join(parts)
+
+
+def _fit_lines(
+    lines, budget: int, count_tokens: Callable[[str], int]
+) -> Tuple[List[str], int]:
+    """Takes lines from an iterable until the next one would exceed the budget."""
+    fitted, used = [], 0
+    for line in lines:
+        tokens = count_tokens(line) + 1
+        if used + tokens > budget:
+            break
+        fitted.append(line)
+        used += tokens
+    return fitted, used
+
+
+def summarize_dataset(
+    profile: DatasetProfile,
+    token_budget: int = 1500,
+    sample: Optional[pd.DataFrame] = None,
+    data_quality: Optional[DataQualityReport] = None,
+    sample_rows: int = 5,
+    count_tokens: Optional[Callable[[str], int]] = None,
+) -> str:
+    """
+    Renders a dataset profile as dense text that fits a token budget.
+
+    Columns are listed one per line, most informative first (see
+    ``rank_columns``), with their dtype, missing values, distinct count and
+    either their statistics or their most frequent values. Then come the
+    strongest correlations, the data quality report and a few sample rows
+    restricted to the listed columns. Every section may use a share of the
+    budget and is truncated line by line, so the summary of a wide dataset
+    costs about as many tokens as that of a narrow one.
+
+    Args:
+        profile (DatasetProfile): The profile of the dataset.
+        token_budget (int): Maximum number of tokens of the summary.
+        sample (Optional[pd.DataFrame]): The sample to include, the profile's
+            data sample if None.
+        data_quality (Optional[DataQualityReport]): The data quality report,
+            left out if None.
+        sample_rows (int): Maximum number of sample rows.
+        count_tokens (Optional[Callable[[str], int]]): Counts the tokens of a
+            text, the app's tokenizer if None.
+
+    Returns:
+        str: The summary.
+    """
+    if count_tokens is None:
+        count_tokens = get_tokenizer_loader().count_tokens
+    if sample is None:
+        sample = profile.sample
+
+    header = f"Dataset: {profile.num_rows:,} rows x {profile.num_columns:,} columns"
+    if profile.sampled_rows is not None:
+        header += (
+            f" (too large to load; statistics cover all rows, quartiles, distinct"
+            f" counts and top values are approximate, correlations use a sample"
+            f" of {profile.sampled_rows:,} rows)"
+        )
+    lines = [header]
+    remaining = token_budget
+
+    def add_title(title: str):
+        nonlocal remaining
+        lines.append(title)
+        remaining -= count_tokens(title) + 1
+
+    remaining -= count_tokens(header) + 1
+
+    ranking = rank_columns(profile)
+    column_lines, used = _fit_lines(
+        (_describe_column(profile, position) for position in ranking),
+        int(SECTION_SHARES["columns"] * token_budget),
+        count_tokens,
+    )
+    remaining -= used
+    add_title("Columns (name | dtype | missing | distinct | statistics):")
+    lines.extend(column_lines)
+    omitted = len(ranking) - len(column_lines)
+    if omitted:
+        add_title(f"... {omitted:,} less informative columns omitted")
+
+    top_pairs = profile.correlations["top_pairs"]
+    correlation_lines, used = _fit_lines(
+        format_top_pairs(top_pairs).splitlines() if len(top_pairs) else [],
+        min(remaining, int(SECTION_SHARES["correlations"] * token_budget)),
+        count_tokens,
+    )
+    remaining -= used
+    if correlation_lines:
+        add_title(f"Strongest correlations ({profile.correlations['method']}):")
+        lines.extend(correlation_lines)
+
+    if data_quality is not None:
+        quality_lines, used = _fit_lines(
+            data_quality.to_prompt().splitlines(),
+            min(remaining, int(SECTION_SHARES["data_quality"] * token_budget)),
+            count_tokens,
+        )
+        remaining -= used
+        add_title("Data quality:")
+        lines.extend(quality_lines)
+
+    listed = profile.column_summary["Column"].iloc[ranking[: len(column_lines)]]
+    shown = [
+        column for column in listed if column in sample.columns.astype(str)
+    ][:MAX_SAMPLE_COLUMNS]
+    if shown and len(sample):
+        sample = sample.set_axis(sample.columns.astype(str), axis=1)[shown]
+        sample_lines = [",".join(shown)] + [
+            ",".join(_format_value(value) for value in row)
+            for row in sample.head(sample_rows).itertuples(index=False)
+        ]
+        title = "Sample rows (CSV, listed columns):"
+        sample_lines, _ = _fit_lines(
+            sample_lines,
+            min(
+                remaining - count_tokens(title) - 1,
+                int(SECTION_SHARES["sample"] * token_budget),
+            ),
+            count_tokens,
+        )
+        if len(sample_lines) > 1:
+            add_title(title)
+            lines.extend(sample_lines)
+    return "\n".join(lines)
+
+
+def get_dataset_summary(
+    profile: DatasetProfile,
+    sample: Optional[pd.DataFrame] = None,
+    data_quality: Optional[DataQualityReport] = None,
+) -> str:
+    """
+    Renders a dataset summary with the settings of the app config.
+
+    Args:
+        profile (DatasetProfile): The profile of the dataset.
+        sample (Optional[pd.DataFrame]): The sample to include, the profile's
+            data sample if None.
+        data_quality (Optional[DataQualityReport]): The data quality report,
+            left out if None.
+
+    Returns:
+        str: The summary.
+    """
+    config = get_config("dataset_summary")
+    return summarize_dataset(
+        profile,
+        token_budget=config.get("token_budget", 1500),
+        sample=sample,
+        data_quality=data_quality,
+        sample_rows=config.get("sample_rows", 5),
+    )
@@ -0,0 +1,193 @@
+import duckdb
+import numpy as np
+import pandas as pd
+
+# Name of the column with the number of rows of every scatter point, chosen
+# so that it does not clash with the columns of a dataset.
+ROWS_COLUMN = "__rows"
+
+
+def quote_identifier(name: str) -> str:
+    """
+    Quotes a column name for a DuckDB query.
+
+    Args:
+        name (str): The column name.
+
+    Returns:
+        str: The quoted name.
+    """
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _query(df: pd.DataFrame, query: str) -> pd.DataFrame:
+    connection = duckdb.connect()
+    try:
+        connection.register("dataset", df)
+        return connection.execute(query).df()
+    finally:
+        connection.close()
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Picks the points of a line that preserve its shape best.
+
+    Largest-Triangle-Three-Buckets: the points between the first and the
+    last one are split into ``threshold - 2`` buckets, and each bucket keeps
+    the point forming the largest triangle with the point kept from the
+    previous bucket and the average of the next bucket. The triangle areas
+    of a bucket are computed with NumPy at once.
+
+    Args:
+        x (np.ndarray): The x values, sorted.
+        y (np.ndarray): The y values.
+        threshold (int): Number of points to keep.
+
+    Returns:
+        np.ndarray: The positions of the kept points.
+    """
+    num_points = len(x)
+    if threshold >= num_points or threshold < 3:
+        return np.arange(num_points)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bucket i holds the points from edges[i] up to edges[i + 1].
+    edges = (np.arange(threshold - 1) * (num_points - 2) / (threshold - 2)).astype(
+        np.int64
+    ) + 1
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, num_points - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # The last bucket is followed by the last point only.
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else num_points
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas)) if len(areas) else start
+        selected[bucket + 1] = previous
+    return selected
+
+
+def downsample_line(
+    df: pd.DataFrame, x: str, y: str, max_points: int = 2000
+) -> pd.DataFrame:
+    """
+    Sorts a line by ``x`` with DuckDB and keeps at most ``max_points`` points.
+
+    Args:
+        df (pd.DataFrame): The dataset.
+        x (str): The numeric or datetime column of the x axis.
+        y (str): The numeric column of the y axis.
+        max_points (int): Number of points sent to the browser.
+
+    Returns:
+        pd.DataFrame: The ``x`` and ``y`` columns of the kept points.
+    """
+    x_column, y_column = quote_identifier(x), quote_identifier(y)
+    line = _query(
+        df[[x, y]],
+        f"SELECT {x_column}, {y_column} FROM dataset "
+        f"WHERE {x_column} IS NOT NULL AND {y_column} IS NOT NULL "
+        f"ORDER BY {x_column}",
+    )
+    x_values = line[x]
+    if pd.api.types.is_datetime64_any_dtype(x_values.dtype):
+        # Time zone aware columns only convert to datetime64 in UTC.
+        if getattr(x_values.dtype, "tz", None) is not None:
+            x_values = x_values.dt.tz_convert(None)
+        x_values = x_values.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    else:
+        x_values = x_values.to_numpy()
+    selected = lttb(x_values, line[y].to_numpy(dtype=np.float64), max_points)
+    return line.iloc[selected].reset_index(drop=True)
+
+
+def _epoch_microseconds(column: str, dtype) -> str:
+    # Datetimes are binned and averaged as microseconds since the epoch.
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return f"epoch_us({column})"
+    return column
+
+
+def _from_epoch_microseconds(values: pd.Series, dtype) -> pd.Series:
+    if not pd.api.types.is_datetime64_any_dtype(dtype):
+        return values
+    timestamps = pd.to_datetime(values.round(), unit="us")
+    tz = getattr(dtype, "tz", None)
+    if tz is not None:
+        timestamps = timestamps.dt.tz_localize("UTC").dt.tz_convert(tz)
+    return timestamps
+
+
+def downsample_scatter(
+    df: pd.DataFrame, x: str, y: str, max_points: int = 2000
+) -> pd.DataFrame:
+    """
+    Aggregates a scatter plot into a grid of bins with DuckDB.
+
+    Datasets with at most ``max_points`` complete rows are returned as they
+    are, with one row per point. Larger ones are binned into a square grid
+    of at most ``max_points`` bins over the range of both columns; every
+    non-empty bin becomes one point at the mean of its rows. Datetime
+    columns are binned by their microseconds since the epoch.
+
+    Args:
+        df (pd.DataFrame): The dataset.
+        x (str): The numeric or datetime column of the x axis.
+        y (str): The numeric or datetime column of the y axis.
+        max_points (int): Number of points sent to the browser.
+
+    Returns:
+        pd.DataFrame: The ``x`` and ``y`` columns and the number of rows of
+        every point in ``ROWS_COLUMN``.
+    """
+    x_column, y_column = quote_identifier(x), quote_identifier(y)
+    complete = f"{x_column} IS NOT NULL AND {y_column} IS NOT NULL"
+    num_rows = _query(
+        df[[x, y]], f"SELECT count(*) AS n FROM dataset WHERE {complete}"
+    )
+    if num_rows["n"].iloc[0] <= max_points:
+        return _query(
+            df[[x, y]],
+            f"SELECT {x_column}, {y_column}, 1 AS {ROWS_COLUMN} "
+            f"FROM dataset WHERE {complete}",
+        )
+
+    bins = max(1, int(np.sqrt(max_points)))
+
+    def bin_of(column: str, low: str, high: str) -> str:
+        # Rows at the maximum fall into the last bin; constant columns into one.
+        return (
+            f"coalesce(least(floor(({column} - {low}) / nullif({high} - {low}, 0)"
+            f" * {bins}), {bins - 1}), 0)"
+        )
+
+    points = _query(
+        df[[x, y]],
+        f"""
+        WITH points AS (
+            SELECT
+                {_epoch_microseconds(x_column, df[x].dtype)} AS x,
+                {_epoch_microseconds(y_column, df[y].dtype)} AS y
+            FROM dataset WHERE {complete}
+        ),
+        bounds AS (
+            SELECT min(x) AS x0, max(x) AS x1, min(y) AS y0, max(y) AS y1 FROM points
+        )
+        SELECT
+            avg(x) AS {x_column},
+            avg(y) AS {y_column},
+            count(*) AS {ROWS_COLUMN}
+        FROM points, bounds
+        GROUP BY {bin_of("x", "x0", "x1")}, {bin_of("y", "y0", "y1")}
+        """,
+    )
+    points[x] = _from_epoch_microseconds(points[x], df[x].dtype)
+    points[y] = _from_epoch_microseconds(points[y], df[y].dtype)
+    return points
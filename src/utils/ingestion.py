@@ -0,0 +1,1023 @@
+import hashlib
+import json
+import logging
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from utils.config import get_config, resolve_path
+from utils.dataset_cache import get_dataset_disk_cache
+from utils.sketches import (
+    DuplicateCounter,
+    HeavyHitters,
+    HyperLogLog,
+    TDigest,
+    hash_rows,
+    hash_values,
+)
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_BYTES = 1 << 20
+# Version of the layout of datasets in the disk cache, see IngestedDataset.to_cache.
+CACHE_FORMAT_VERSION = 3
+# The column of a PyArrow CSV conversion error, e.g. "In CSV column #2: ...".
+CSV_COLUMN_PATTERN = re.compile(r"CSV column #(\d+)")
+INTEGER_DTYPES = (np.int8, np.int16, np.int32, np.int64)
+ARROW_STRING_TYPES = {
+    pa.string(): pd.StringDtype("pyarrow"),
+    pa.large_string(): pd.StringDtype("pyarrow"),
+}
+# Moments and sketches of every column of StreamingStats in the dataset cache.
+STATS_CACHE_SCHEMA = pa.schema(
+    [
+        ("null_count", pa.int64()),
+        ("count", pa.int64()),
+        ("mean", pa.float64()),
+        ("m2", pa.float64()),
+        ("min", pa.float64()),
+        ("max", pa.float64()),
+        ("centroid_means", pa.list_(pa.float64())),
+        ("centroid_weights", pa.list_(pa.float64())),
+        ("digest_min", pa.float64()),
+        ("digest_max", pa.float64()),
+        ("registers", pa.binary()),
+        ("frequent_counts", pa.list_(pa.int64())),
+        ("frequent_error", pa.int64()),
+    ]
+)
+
+
+def hash_upload(uploaded_file: BinaryIO) -> str:
+    """
+    Computes the content hash of an uploaded file and rewinds it.
+
+    Args:
+        uploaded_file (BinaryIO): The uploaded file.
+
+    Returns:
+        str: The hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    uploaded_file.seek(0)
+    for chunk in iter(lambda: uploaded_file.read(HASH_CHUNK_BYTES), b""):
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def is_numeric_type(data_type: pa.DataType) -> bool:
+    return pa.types.is_integer(data_type) or pa.types.is_floating(data_type)
+
+
+def is_arrow_dtype(dtype) -> bool:
+    """Whether a column of this dtype is backed by an Arrow array."""
+    return isinstance(dtype, pd.ArrowDtype) or (
+        isinstance(dtype, pd.StringDtype) and dtype.storage.startswith("pyarrow")
+    )
+
+
+def _column_buffers(series: pd.Series) -> List[Tuple[int, int]]:
+    # The address and size of every buffer of a NumPy or Arrow backed column.
+    if isinstance(series.dtype, np.dtype) and series.dtype != object:
+        values = series.to_numpy()
+        return [(values.__array_interface__["data"][0], values.nbytes)]
+    if not is_arrow_dtype(series.dtype):
+        return []
+    array = pa.array(series.array)
+    chunks = array.chunks if isinstance(array, pa.ChunkedArray) else [array]
+    return [
+        (buffer.address, buffer.size)
+        for chunk in chunks
+        for buffer in chunk.buffers()
+        if buffer is not None
+    ]
+
+
+def mapped_bytes(df: pd.DataFrame, table: pa.Table) -> int:
+    """
+    Measures the memory of a dataframe that points into a memory-mapped table.
+
+    Such memory is backed by the file of the table and shared through the OS
+    page cache instead of being private to the process.
+
+    Args:
+        df (pd.DataFrame): The dataframe converted from the table.
+        table (pa.Table): The memory-mapped table.
+
+    Returns:
+        int: The size of the buffers of ``df`` that lie in the mapped table.
+    """
+    table_buffers = [
+        (buffer.address, buffer.address + buffer.size)
+        for column in table.columns
+        for chunk in column.chunks
+        for buffer in chunk.buffers()
+        if buffer is not None
+    ]
+    if not table_buffers:
+        return 0
+    start = min(low for low, _ in table_buffers)
+    end = max(high for _, high in table_buffers)
+    return sum(
+        size
+        for _, series in df.items()
+        for address, size in _column_buffers(series)
+        if start <= address < end
+    )
+
+
+class ReservoirSample:
+    """
+    Uniform random sample of a fixed number of rows from a stream of batches.
+
+    Implements reservoir sampling (Algorithm R) one batch at a time: each
+    row after the first ``size`` replaces a random slot with probability
+    ``size / rows_seen``. Accepted rows are kept with their slot and the
+    latest row of every slot wins when the sample is compacted.
+
+    Args:
+        size (int): Number of rows in the sample.
+        seed (int): Seed of the random generator.
+    """
+
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        self.rows_seen = 0
+        self._generator = np.random.default_rng(seed)
+        self._tables = []
+        self._slots = []
+        self._row_ids = []
+        self._num_candidates = 0
+
+    def add(self, batch: pa.RecordBatch):
+        """
+        Offers the rows of a batch to the sample.
+
+        Args:
+            batch (pa.RecordBatch): The next batch of the stream.
+        """
+        row_ids = np.arange(self.rows_seen, self.rows_seen + batch.num_rows)
+        self.rows_seen += batch.num_rows
+        slots = np.where(
+            row_ids < self.size,
+            row_ids,
+            self._generator.integers(0, row_ids + 1),
+        )
+        accepted = np.flatnonzero(slots < self.size)
+        if len(accepted) == 0:
+            return
+        self._tables.append(pa.Table.from_batches([batch.take(accepted)]))
+        self._slots.append(slots[accepted])
+        self._row_ids.append(row_ids[accepted])
+        self._num_candidates += len(accepted)
+        if self._num_candidates > 2 * self.size:
+            self._compact()
+
+    def _compact(self):
+        table = pa.concat_tables(self._tables)
+        slots = np.concatenate(self._slots)
+        row_ids = np.concatenate(self._row_ids)
+        # The last row written to a slot is the one in the sample.
+        _, last = np.unique(slots[::-1], return_index=True)
+        keep = np.sort(len(slots) - 1 - last)
+        self._tables = [table.take(keep)]
+        self._slots = [slots[keep]]
+        self._row_ids = [row_ids[keep]]
+        self._num_candidates = len(keep)
+
+    def to_table(self, schema: pa.Schema) -> pa.Table:
+        """
+        Returns the sampled rows in their original order.
+
+        Args:
+            schema (pa.Schema): The schema of the stream.
+
+        Returns:
+            pa.Table: The sample.
+        """
+        if not self._tables:
+            return schema.empty_table()
+        self._compact()
+        order = np.argsort(self._row_ids[0], kind="stable")
+        return self._tables[0].take(order)
+
+    def to_pandas(self, schema: pa.Schema) -> pd.DataFrame:
+        """
+        Returns the sampled rows in their original order, indexed by their
+        row numbers in the stream.
+
+        Args:
+            schema (pa.Schema): The schema of the stream.
+
+        Returns:
+            pd.DataFrame: The sample.
+        """
+        df = self.to_table(schema).to_pandas()
+        if self._row_ids:
+            df.index = pd.Index(np.sort(self._row_ids[0]))
+        return df
+
+
+class StreamingStats:
+    """
+    Per-column statistics computed one batch at a time with mergeable sketches.
+
+    Counts rows and nulls of every column exactly, and the mean, variance,
+    minimum and maximum of numeric columns with Welford's update, merging
+    batches with Chan's parallel formula. Quantiles of numeric columns come
+    from t-digests, distinct counts of every column from HyperLogLog
+    sketches and the most frequent values from Misra-Gries summaries, and
+    duplicate rows are counted from row hashes, so the whole file never has
+    to be in memory. Statistics of separate chunks
+    can be combined with ``merge``.
+
+    Args:
+        schema (pa.Schema): The schema of the stream.
+        compression (float): Compression of the t-digests.
+        hll_precision (int): Precision of the HyperLogLog sketches.
+        heavy_hitters (int): Number of frequent values tracked per column.
+        duplicate_memory_bytes (int): Memory of the row hashes of the
+            duplicate count before they are spilled to disk.
+        spill_directory (Optional[str]): Directory of the spilled row hashes.
+    """
+
+    def __init__(
+        self,
+        schema: pa.Schema,
+        compression: float = 100,
+        hll_precision: int = 12,
+        heavy_hitters: int = 32,
+        duplicate_memory_bytes: int = 256 * 1024 * 1024,
+        spill_directory: Optional[str] = None,
+    ):
+        self.schema = schema
+        self.compression = compression
+        self.hll_precision = hll_precision
+        self.heavy_hitters = heavy_hitters
+        self.num_rows = 0
+        self.null_counts = np.zeros(len(schema), dtype=np.int64)
+        self.numeric_columns = [
+            field.name for field in schema if is_numeric_type(field.type)
+        ]
+        self._moments = {
+            name: {"count": 0, "mean": 0.0, "m2": 0.0, "min": None, "max": None}
+            for name in self.numeric_columns
+        }
+        self._digests = {
+            name: TDigest(compression) for name in self.numeric_columns
+        }
+        self._distinct = {field.name: HyperLogLog(hll_precision) for field in schema}
+        self._frequent = {field.name: HeavyHitters(heavy_hitters) for field in schema}
+        self._duplicates = DuplicateCounter(
+            max_memory_bytes=duplicate_memory_bytes, spill_directory=spill_directory
+        )
+
+    def add(self, batch: pa.RecordBatch):
+        """
+        Updates the statistics with a batch.
+
+        Args:
+            batch (pa.RecordBatch): The next batch of the stream.
+        """
+        self.num_rows += batch.num_rows
+        self.null_counts += [column.null_count for column in batch.columns]
+        self._duplicates.add(hash_rows(batch))
+        for field, column in zip(self.schema, batch.columns):
+            self._distinct[field.name].add(hash_values(column))
+            self._frequent[field.name].add(column)
+        for name in self.numeric_columns:
+            column = batch.column(name)
+            count = len(column) - column.null_count
+            if count == 0:
+                continue
+            values = pc.cast(column, pa.float64())
+            self._digests[name].add(pc.drop_null(values).to_numpy())
+            min_max = pc.min_max(values)
+            self._update_moments(
+                name,
+                {
+                    "count": count,
+                    "mean": pc.mean(values).as_py(),
+                    "m2": pc.variance(values, ddof=0).as_py() * count,
+                    "min": min_max["min"].as_py(),
+                    "max": min_max["max"].as_py(),
+                },
+            )
+
+    def _update_moments(self, name: str, other: Dict):
+        moments = self._moments[name]
+        total = moments["count"] + other["count"]
+        delta = other["mean"] - moments["mean"]
+        moments["mean"] += delta * other["count"] / total
+        moments["m2"] += (
+            other["m2"] + delta**2 * moments["count"] * other["count"] / total
+        )
+        moments["count"] = total
+        if moments["min"] is None or other["min"] < moments["min"]:
+            moments["min"] = other["min"]
+        if moments["max"] is None or other["max"] > moments["max"]:
+            moments["max"] = other["max"]
+
+    def merge(self, other: "StreamingStats"):
+        """
+        Merges the statistics of another chunk of the same stream.
+
+        Args:
+            other (StreamingStats): Statistics with the same schema and
+                sketch settings.
+        """
+        self.num_rows += other.num_rows
+        self.null_counts += other.null_counts
+        self._duplicates.merge(other._duplicates)
+        for name in self.numeric_columns:
+            if other._moments[name]["count"]:
+                self._update_moments(name, other._moments[name])
+            self._digests[name].merge(other._digests[name])
+        for field in self.schema:
+            self._distinct[field.name].merge(other._distinct[field.name])
+            self._frequent[field.name].merge(other._frequent[field.name])
+
+    @property
+    def non_null_counts(self) -> Dict[str, int]:
+        """Number of non-null values of every column."""
+        return {
+            field.name: int(self.num_rows - nulls)
+            for field, nulls in zip(self.schema, self.null_counts)
+        }
+
+    def close(self):
+        """
+        Drops the row hashes once the stream is complete.
+
+        The duplicate count stays available, but the statistics can no longer
+        be updated or merged. This keeps the statistics small enough for the
+        session state and the dataset cache.
+        """
+        if self._duplicates is not None:
+            self._duplicate_rows = self._duplicates.duplicates
+            self._duplicates.close()
+            self._duplicates = None
+
+    def to_cache(self) -> Tuple[Dict, pa.Table, pa.Table]:
+        """
+        Returns the statistics as stored in the dataset disk cache.
+
+        Returns:
+            Tuple[Dict, pa.Table, pa.Table]: The totals and sketch settings,
+            the moments and sketches with one row per column, and the most
+            frequent values with one list column per column.
+        """
+        rows, frequent_values = [], {}
+        for position, field in enumerate(self.schema):
+            row = dict(self._moments.get(field.name, {}))
+            digest = self._digests.get(field.name)
+            if digest is not None:
+                means, weights = digest.centroids
+                row["centroid_means"], row["centroid_weights"] = means, weights
+                row["digest_min"], row["digest_max"] = digest.min, digest.max
+            frequent = self._frequent[field.name]
+            row["null_count"] = self.null_counts[position]
+            row["registers"] = self._distinct[field.name].registers.tobytes()
+            row["frequent_counts"] = list(frequent.counters.values())
+            row["frequent_error"] = frequent.error
+            rows.append(row)
+            # Named by position, the values keep the type of their column.
+            frequent_values[str(position)] = pa.array(
+                [list(frequent.counters)], type=pa.list_(field.type)
+            )
+        metadata = {
+            "num_rows": int(self.num_rows),
+            "duplicate_rows": int(self.duplicate_rows),
+            "compression": self.compression,
+            "hll_precision": self.hll_precision,
+            "heavy_hitters": self.heavy_hitters,
+        }
+        columns = pa.Table.from_pylist(rows, schema=STATS_CACHE_SCHEMA)
+        return metadata, columns, pa.table(frequent_values)
+
+    @classmethod
+    def from_cache(
+        cls, schema: pa.Schema, metadata: Dict, columns: pa.Table, frequent: pa.Table
+    ) -> "StreamingStats":
+        """
+        Rebuilds closed statistics from the dataset disk cache.
+
+        Args:
+            schema (pa.Schema): The schema of the stream.
+            metadata (Dict): The totals and sketch settings.
+            columns (pa.Table): The moments and sketches of every column.
+            frequent (pa.Table): The most frequent values of every column.
+
+        Returns:
+            StreamingStats: The statistics.
+        """
+        stats = cls(
+            schema,
+            metadata["compression"],
+            metadata["hll_precision"],
+            metadata["heavy_hitters"],
+        )
+        stats.close()
+        stats.num_rows = metadata["num_rows"]
+        stats._duplicate_rows = metadata["duplicate_rows"]
+        stats.null_counts = np.array(columns.column("null_count"), dtype=np.int64)
+        for position, (field, row) in enumerate(zip(schema, columns.to_pylist())):
+            if field.name in stats._moments:
+                stats._moments[field.name] = {
+                    key: row[key] for key in ("count", "mean", "m2", "min", "max")
+                }
+                stats._digests[field.name] = TDigest.from_centroids(
+                    row["centroid_means"],
+                    row["centroid_weights"],
+                    row["digest_min"],
+                    row["digest_max"],
+                    stats.compression,
+                )
+            stats._distinct[field.name].registers = np.frombuffer(
+                row["registers"], dtype=np.uint8
+            ).copy()
+            values = frequent.column(str(position))[0].as_py()
+            stats._frequent[field.name].counters = dict(
+                zip(values, row["frequent_counts"])
+            )
+            stats._frequent[field.name].error = row["frequent_error"]
+        return stats
+
+    @property
+    def duplicate_rows(self) -> int:
+        """Number of rows that repeat an earlier row."""
+        if self._duplicates is None:
+            return self._duplicate_rows
+        return self._duplicates.duplicates
+
+    @property
+    def distinct_counts(self) -> Dict[str, int]:
+        """Approximate number of distinct values of every column."""
+        return {name: sketch.count() for name, sketch in self._distinct.items()}
+
+    def top_values(self, k: int = 3) -> Dict[str, List[Tuple[object, int]]]:
+        """
+        Returns the most frequent values of every column.
+
+        Args:
+            k (int): Number of values per column.
+
+        Returns:
+            Dict[str, List[Tuple[object, int]]]: Values with lower bounds of
+            their counts, most frequent first.
+        """
+        return {name: summary.top(k) for name, summary in self._frequent.items()}
+
+    def describe(self) -> pd.DataFrame:
+        """
+        Returns the statistics of the numeric columns like ``df.describe()``.
+
+        Returns:
+            pd.DataFrame: Count, mean, standard deviation, minimum, quartiles
+            and maximum of every numeric column; the quartiles are estimated.
+        """
+        statistics = {}
+        for name, moments in self._moments.items():
+            count = moments["count"]
+            digest = self._digests[name]
+            statistics[name] = {
+                "count": float(count),
+                "mean": moments["mean"] if count else np.nan,
+                "std": np.sqrt(moments["m2"] / (count - 1)) if count > 1 else np.nan,
+                "min": moments["min"] if count else np.nan,
+                "25%": digest.quantile(0.25),
+                "50%": digest.quantile(0.5),
+                "75%": digest.quantile(0.75),
+                "max": moments["max"] if count else np.nan,
+            }
+        return pd.DataFrame(
+            statistics,
+            index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"],
+            dtype=float,
+        )
+
+
+class IngestedDataset:
+    """
+    A CSV upload read into memory, or sampled when it is over budget.
+
+    Args:
+        df (pd.DataFrame): The whole dataset, or its sample in large file mode.
+        dataset_hash (str): The content hash of the uploaded file.
+        schema (pa.Schema): The schema of the whole file.
+        num_rows (int): The number of rows of the whole file.
+        stats (Optional[StreamingStats]): Statistics of the whole file, only
+            computed in large file mode.
+        sample (Optional[pd.DataFrame]): Rows of the whole file drawn by a
+            reservoir sample during ingestion, indexed by row number.
+
+    Datasets loaded from the dataset disk cache also record the path of
+    their cache file in ``source_path`` and the memory of ``df`` that is
+    mapped from that file in ``mapped_bytes``.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        dataset_hash: str,
+        schema: pa.Schema,
+        num_rows: int,
+        stats: Optional[StreamingStats] = None,
+        sample: Optional[pd.DataFrame] = None,
+    ):
+        self.df = df
+        self.dataset_hash = dataset_hash
+        self.schema = schema
+        self.num_rows = num_rows
+        self.stats = stats
+        self.sample = sample
+        self.memory_usage = None
+        self.source_path = None
+        self.mapped_bytes = 0
+
+    @property
+    def large_file(self) -> bool:
+        return self.stats is not None
+
+    def compact(self, category_max_ratio: float = 0.5):
+        """
+        Compacts the dtypes of the dataframe and records its memory usage
+        before and after.
+
+        The compacted dataframe gets its own hash, so its profile is cached
+        separately from the one of the uncompacted data.
+
+        Args:
+            category_max_ratio (float): Maximum ratio of distinct to non-null
+                values of a string column stored as a category.
+        """
+        before = int(self.df.memory_usage(index=True, deep=True).sum())
+        self.df = compact_dtypes(self.df, category_max_ratio)
+        if self.sample is not None and not self.large_file:
+            # The sampled rows are rows of the dataframe; keep their dtypes in sync.
+            self.sample = self.df.loc[self.sample.index]
+        after = int(self.df.memory_usage(index=True, deep=True).sum())
+        self.memory_usage = {"before_bytes": before, "after_bytes": after}
+        self.dataset_hash = get_compact_hash(self.dataset_hash)
+
+    def to_cache(self) -> Tuple[pa.Table, Dict]:
+        """
+        Returns the data and metadata stored in the dataset disk cache.
+
+        The schema, the sample and the statistics are stored as Arrow schemas
+        and tables, everything else as JSON values.
+        """
+        table = pa.Table.from_pandas(self.df)
+        metadata = {
+            "schema": self.schema,
+            "num_rows": int(self.num_rows),
+            "memory_usage": self.memory_usage,
+            "sample": None,
+            "stats": None,
+        }
+        if self.sample is not None:
+            metadata["sample"] = pa.Table.from_pandas(self.sample)
+        if self.stats is not None:
+            (
+                metadata["stats"],
+                metadata["stats_columns"],
+                metadata["stats_frequent"],
+            ) = self.stats.to_cache()
+        return table, metadata
+
+    @classmethod
+    def from_cache(
+        cls,
+        dataset_hash: str,
+        table: pa.Table,
+        metadata: Dict,
+        source_path: Optional[str] = None,
+    ) -> "IngestedDataset":
+        """
+        Rebuilds a dataset from the dataset disk cache.
+
+        Numeric columns without missing values and strings stay zero-copy
+        views of the memory-mapped table.
+
+        Args:
+            dataset_hash (str): The dataset hash.
+            table (pa.Table): The memory-mapped data.
+            metadata (Dict): The metadata stored with the data.
+            source_path (Optional[str]): The cache file the table is mapped
+                from.
+
+        Returns:
+            IngestedDataset: The dataset.
+        """
+        df = table.to_pandas(split_blocks=True, types_mapper=ARROW_STRING_TYPES.get)
+        stats = metadata["stats"]
+        if stats is not None:
+            stats = StreamingStats.from_cache(
+                metadata["schema"],
+                stats,
+                metadata["stats_columns"],
+                metadata["stats_frequent"],
+            )
+        sample = metadata["sample"]
+        dataset = cls(
+            df,
+            dataset_hash,
+            metadata["schema"],
+            metadata["num_rows"],
+            stats,
+            sample.to_pandas() if sample is not None else None,
+        )
+        dataset.memory_usage = metadata["memory_usage"]
+        dataset.source_path = source_path
+        dataset.mapped_bytes = mapped_bytes(df, table)
+        return dataset
+
+
+def get_cache_key(dataset_hash: str, config: Dict) -> str:
+    """
+    Derives the dataset disk cache key of a dataset.
+
+    The key covers the ingestion settings and the cache format version, so
+    changing either never serves a dataset loaded differently.
+
+    Args:
+        dataset_hash (str): The dataset hash.
+        config (Dict): The ingestion settings the dataset is loaded with.
+
+    Returns:
+        str: The cache key.
+    """
+    key = json.dumps(
+        {"dataset": dataset_hash, "version": CACHE_FORMAT_VERSION, "config": config},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def get_compact_hash(dataset_hash: str) -> str:
+    """
+    Derives the hash of the compacted version of a dataset.
+
+    Args:
+        dataset_hash (str): The hash of the uploaded file.
+
+    Returns:
+        str: The hash of the dataset after dtype compaction.
+    """
+    return hashlib.sha256(f"{dataset_hash}:compact".encode("utf-8")).hexdigest()
+
+
+def _smallest_integer_dtypes(minimums: np.ndarray, maximums: np.ndarray) -> list:
+    dtypes = []
+    for minimum, maximum in zip(minimums, maximums):
+        for dtype in INTEGER_DTYPES:
+            info = np.iinfo(dtype)
+            if info.min <= minimum and maximum <= info.max:
+                dtypes.append(dtype)
+                break
+    return dtypes
+
+
+def compact_dtypes(df: pd.DataFrame, category_max_ratio: float = 0.5) -> pd.DataFrame:
+    """
+    Converts the columns of a DataFrame to the smallest lossless dtypes.
+
+    Integers are downcast to the smallest type holding their range, floats
+    to float32 where every value survives the round trip, low-cardinality
+    strings become categoricals and the remaining strings Arrow-backed
+    strings. Object columns that are not purely strings are left as they are.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to compact.
+        category_max_ratio (float): Maximum ratio of distinct to non-null
+            values of a string column stored as a category.
+
+    Returns:
+        pd.DataFrame: The compacted DataFrame.
+    """
+    if not df.columns.is_unique or df.empty:
+        return df
+    dtypes = {}
+
+    integers = df.select_dtypes(include=["integer"])
+    if integers.shape[1]:
+        smallest = _smallest_integer_dtypes(
+            integers.min().to_numpy(), integers.max().to_numpy()
+        )
+        dtypes.update(zip(integers.columns, smallest))
+
+    floats = df.select_dtypes(include=["float64"])
+    if floats.shape[1]:
+        values = floats.to_numpy()
+        lossless = (
+            (values.astype(np.float32).astype(np.float64) == values)
+            | np.isnan(values)
+        ).all(axis=0)
+        dtypes.update((column, np.float32) for column in floats.columns[lossless])
+
+    for column in df.select_dtypes(include=["object", "string"]).columns:
+        values = df[column]
+        if pd.api.types.infer_dtype(values, skipna=True) != "string":
+            continue
+        non_null = values.count()
+        if non_null and values.nunique() <= category_max_ratio * non_null:
+            dtypes[column] = "category"
+        else:
+            dtypes[column] = pd.StringDtype("pyarrow")
+
+    dtypes = {
+        column: dtype for column, dtype in dtypes.items() if df[column].dtype != dtype
+    }
+    return df.astype(dtypes) if dtypes else df
+
+
+def deduplicate_names(names: List[str]) -> List[str]:
+    """
+    Renames duplicate column names the way ``pandas.read_csv`` does.
+
+    Repeated names get a ``.1``, ``.2``, ... suffix, e.g. ``["a", "a", "b"]``
+    becomes ``["a", "a.1", "b"]``.
+
+    Args:
+        names (List[str]): The column names of the header.
+
+    Returns:
+        List[str]: The unique column names.
+    """
+    taken = set(names)
+    counts: Dict[str, int] = {}
+    unique_names = []
+    for name in names:
+        original = name
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[original] = count + 1
+            name = f"{original}.{count}"
+            # Suffixes used by other columns of the header are skipped.
+            count = count + 1 if name in taken else counts.get(name, 0)
+        unique_names.append(name)
+        counts[name] = count + 1
+    return unique_names
+
+
+def _open_csv(
+    uploaded_file: BinaryIO,
+    block_size: int,
+    use_threads: bool,
+    column_types: Dict[str, pa.DataType],
+) -> csv.CSVStreamingReader:
+    uploaded_file.seek(0)
+    read_options = csv.ReadOptions(block_size=block_size, use_threads=use_threads)
+    # Empty strings are missing values, as with pandas.read_csv.
+    convert_options = csv.ConvertOptions(
+        column_types=column_types, strings_can_be_null=True
+    )
+    reader = csv.open_csv(
+        uploaded_file, read_options=read_options, convert_options=convert_options
+    )
+    names = deduplicate_names(reader.schema.names)
+    if names == reader.schema.names:
+        return reader
+    # Reopened with unique names, so columns can be selected by name.
+    uploaded_file.seek(0)
+    read_options.column_names = names
+    read_options.skip_rows = 1
+    return csv.open_csv(
+        uploaded_file, read_options=read_options, convert_options=convert_options
+    )
+
+
+def read_csv(
+    uploaded_file: BinaryIO,
+    memory_budget_bytes: int = 1024 * 1024 * 1024,
+    block_size: int = 16 * 1024 * 1024,
+    sample_rows: int = 100000,
+    use_threads: bool = True,
+    dataset_hash: Optional[str] = None,
+    sketch_options: Optional[Dict] = None,
+    preview_rows: int = 10,
+) -> IngestedDataset:
+    """
+    Reads a CSV file in blocks with the multithreaded PyArrow reader.
+
+    Blocks are collected until the data would take more than the memory
+    budget. Past the budget the file switches to large file mode: the rest
+    is streamed through a reservoir sample and incremental statistics and
+    only the sample is kept in memory. In both modes every block also goes
+    through a small reservoir sample of ``preview_rows`` rows, seeded by the
+    file hash, which becomes the dataset's data sample.
+
+    Column types are inferred from the first block. When a later block does
+    not match them, e.g. an integer column holding ``x1``, the file is read
+    again with that column as strings. Duplicate column names are renamed
+    as with ``pandas.read_csv``.
+
+    Args:
+        uploaded_file (BinaryIO): The CSV file.
+        memory_budget_bytes (int): Memory the parsed data may take.
+        block_size (int): Bytes parsed per block; the column types are
+            inferred from the first block.
+        sample_rows (int): Rows kept in large file mode.
+        use_threads (bool): Whether to parse with multiple threads.
+        dataset_hash (Optional[str]): The content hash of the file, computed
+            if not given.
+        sketch_options (Optional[Dict]): Keyword arguments of the
+            ``StreamingStats`` of large file mode.
+        preview_rows (int): Rows in the data sample.
+
+    Returns:
+        IngestedDataset: The dataset.
+
+    Raises:
+        pa.ArrowInvalid: If the file cannot be parsed.
+    """
+    if dataset_hash is None:
+        dataset_hash = hash_upload(uploaded_file)
+    column_types: Dict[str, pa.DataType] = {}
+    while True:
+        reader = _open_csv(uploaded_file, block_size, use_threads, column_types)
+        try:
+            return _read_batches(
+                reader,
+                dataset_hash,
+                memory_budget_bytes,
+                sample_rows,
+                sketch_options,
+                preview_rows,
+            )
+        except pa.ArrowInvalid as error:
+            match = CSV_COLUMN_PATTERN.search(str(error))
+            if match is None:
+                raise
+            name = reader.schema.names[int(match.group(1))]
+            if name in column_types:
+                raise
+            logger.warning(
+                "Reading column %r of dataset %s as strings: %s",
+                name,
+                dataset_hash[:12],
+                error,
+            )
+            column_types[name] = pa.string()
+
+
+def _read_batches(
+    reader: csv.CSVStreamingReader,
+    dataset_hash: str,
+    memory_budget_bytes: int,
+    sample_rows: int,
+    sketch_options: Optional[Dict],
+    preview_rows: int,
+) -> IngestedDataset:
+    schema = reader.schema
+    seed = int(dataset_hash[:8], 16)
+    preview = ReservoirSample(preview_rows, seed=seed)
+
+    batches: List[pa.RecordBatch] = []
+    batch_bytes = 0
+    sample = stats = None
+    for batch in reader:
+        preview.add(batch)
+        if stats is None:
+            batches.append(batch)
+            batch_bytes += batch.nbytes
+            if batch_bytes <= memory_budget_bytes:
+                continue
+            logger.info(
+                "Dataset %s is over the memory budget, switching to large"
+                " file mode.",
+                dataset_hash[:12],
+            )
+            sample = ReservoirSample(sample_rows, seed=seed)
+            stats = StreamingStats(schema, **(sketch_options or {}))
+            for collected_batch in batches:
+                sample.add(collected_batch)
+                stats.add(collected_batch)
+            batches = []
+        else:
+            sample.add(batch)
+            stats.add(batch)
+
+    if stats is None:
+        table = pa.Table.from_batches(batches, schema=schema)
+        num_rows = table.num_rows
+        # Columns are released as they are converted, so the Arrow data and
+        # the dataframe are not both held in full.
+        del batches
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        del table
+        # Rows of the dataframe, so the sample shares its dtypes.
+        return IngestedDataset(
+            df,
+            dataset_hash,
+            schema,
+            num_rows,
+            sample=df.loc[preview.to_pandas(schema).index],
+        )
+    stats.close()
+    # Indexed by row number in the file, like the data sample.
+    df = sample.to_pandas(schema)
+    return IngestedDataset(
+        df, dataset_hash, schema, stats.num_rows, stats, preview.to_pandas(schema)
+    )
+
+
+def load_csv(uploaded_file: BinaryIO, compact: bool = False) -> IngestedDataset:
+    """
+    Reads an uploaded CSV file with the ingestion settings of the app config.
+
+    Files PyArrow cannot parse, e.g. because of a malformed row, are read
+    with pandas instead if they fit the memory budget.
+    Loaded datasets are kept in the dataset disk cache, so uploading the
+    same file again memory-maps the cached data instead of parsing it.
+
+    Args:
+        uploaded_file (BinaryIO): The uploaded CSV file.
+        compact (bool): Whether to compact the dtypes after loading.
+
+    Returns:
+        IngestedDataset: The dataset.
+
+    Raises:
+        pa.ArrowInvalid: If the file cannot be parsed by PyArrow and, for
+            files within the memory budget, by pandas either.
+    """
+    config = dict(get_config("ingestion"))
+    config["preview_rows"] = get_config("dataset_profile").get("sample_size", 10)
+    file_hash = hash_upload(uploaded_file)
+    dataset_hash = get_compact_hash(file_hash) if compact else file_hash
+    cache = get_dataset_disk_cache()
+    cache_key = get_cache_key(dataset_hash, config)
+    cached = cache.get(cache_key) if cache is not None else None
+    if cached is not None:
+        logger.info("Dataset %s loaded from the disk cache.", dataset_hash[:12])
+        return IngestedDataset.from_cache(
+            dataset_hash, *cached, source_path=cache.path(cache_key)
+        )
+
+    dataset = _read_upload(uploaded_file, config, file_hash)
+    if compact:
+        dataset.compact(config.get("category_max_ratio", 0.5))
+    if cache is None:
+        return dataset
+    try:
+        cache.put(cache_key, *dataset.to_cache())
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as error:
+        logger.warning("Could not cache dataset %s: %s", dataset_hash[:12], error)
+        return dataset
+    # Continue on the mapped copy so this session shares it as well.
+    cached = cache.get(cache_key)
+    if cached is None:
+        return dataset
+    return IngestedDataset.from_cache(
+        dataset_hash, *cached, source_path=cache.path(cache_key)
+    )
+
+
+def _read_upload(
+    uploaded_file: BinaryIO, config: Dict, dataset_hash: str
+) -> IngestedDataset:
+    memory_budget_bytes = int(config.get("memory_budget_mb", 1024) * 1024 * 1024)
+    try:
+        return read_csv(
+            uploaded_file,
+            memory_budget_bytes=memory_budget_bytes,
+            block_size=int(config.get("block_size_mb", 16) * 1024 * 1024),
+            sample_rows=config.get("sample_rows", 100000),
+            use_threads=config.get("use_threads", True),
+            dataset_hash=dataset_hash,
+            sketch_options={
+                "compression": config.get("tdigest_compression", 100),
+                "hll_precision": config.get("hll_precision", 12),
+                "heavy_hitters": config.get("heavy_hitters", 32),
+                "duplicate_memory_bytes": int(
+                    config.get("duplicate_memory_mb", 256) * 1024 * 1024
+                ),
+                "spill_directory": resolve_path(
+                    config.get("spill_directory", ".cache/spill")
+                ),
+            },
+            preview_rows=config["preview_rows"],
+        )
+    except pa.ArrowInvalid as error:
+        file_size = uploaded_file.seek(0, 2)
+        if file_size > memory_budget_bytes:
+            raise
+        logger.warning("PyArrow could not parse the CSV, using pandas: %s", error)
+        uploaded_file.seek(0)
+        try:
+            df = pd.read_csv(uploaded_file)
+        except (pd.errors.EmptyDataError, pd.errors.ParserError) as pandas_error:
+            raise pa.ArrowInvalid(str(pandas_error)) from pandas_error
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        sample = df.sample(
+            n=min(config["preview_rows"], len(df)),
+            random_state=int(dataset_hash[:8], 16),
+        ).sort_index()
+        return IngestedDataset(df, dataset_hash, schema, len(df), sample=sample)
@@ -0,0 +1,187 @@
+import hashlib
+import logging
+import os
+import shutil
+import struct
+import streamlit as st
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+GIF_SOURCE_DIR = os.path.join(ROOT_DIR, "assets", "gifs")
+# Looping WebM/MP4 versions of the GIFs, produced by scripts/transcode_media.py.
+VIDEO_SOURCE_DIR = os.path.join(ROOT_DIR, "assets", "videos")
+MEDIA_SOURCE_DIRS = (GIF_SOURCE_DIR, VIDEO_SOURCE_DIR)
+# Streamlit serves ``<main script dir>/static`` under ``app/static`` when
+# ``server.enableStaticServing`` is on.
+STATIC_DIR = os.path.join(ROOT_DIR, "src", "static")
+STATIC_MEDIA_DIR = os.path.join(STATIC_DIR, "media")
+STATIC_MEDIA_URL = "app/static/media"
+MEDIA_EXTENSIONS = (".gif", ".webm", ".mp4")
+# Preferred order of the sources offered to the browser.
+MEDIA_SOURCE_ORDER = (".webm", ".mp4", ".gif")
+
+
+def hash_file(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Computes a short content hash of a file.
+
+    Args:
+        file_path (str): Path to the file.
+        chunk_size (int): Number of bytes read per iteration.
+
+    Returns:
+        str: The first 16 hex characters of the file's SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file_:
+        for chunk in iter(lambda: file_.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def get_gif_size(file_path: str) -> Optional[Tuple[int, int]]:
+    """
+    Reads the logical screen size from a GIF header.
+
+    Args:
+        file_path (str): Path to the GIF file.
+
+    Returns:
+        Optional[Tuple[int, int]]: Width and height in pixels, or None if the
+        file is not a GIF.
+    """
+    with open(file_path, "rb") as file_:
+        header = file_.read(10)
+    if len(header) < 10 or header[:3] != b"GIF":
+        return None
+    return struct.unpack("<HH", header[6:10])
+
+
+def remove_stale_versions(stem: str, extension: str) -> None:
+    """
+    Removes previously published versions of a media file.
+
+    Args:
+        stem (str): File name of the asset without its extension.
+        extension (str): Extension of the asset, including the dot.
+    """
+    for file_name in os.listdir(STATIC_MEDIA_DIR):
+        name, digest, ext = (file_name.rsplit(".", 2) + ["", ""])[:3]
+        if name == stem and f".{ext}" == extension and len(digest) == 16:
+            os.remove(os.path.join(STATIC_MEDIA_DIR, file_name))
+
+
+def publish_media_file(file_path: str) -> Dict[str, str]:
+    """
+    Copies a media file into the static folder under a content-addressed name.
+
+    The file is only copied when no file with the same digest has been
+    published yet, so restarts of the server do not rewrite the assets.
+
+    Args:
+        file_path (str): Path to the source media file.
+
+    Returns:
+        Dict[str, str]: The digest, static file name and URL of the file.
+    """
+    stem, extension = os.path.splitext(os.path.basename(file_path))
+    digest = hash_file(file_path)
+    static_name = f"{stem}.{digest}{extension}"
+    static_path = os.path.join(STATIC_MEDIA_DIR, static_name)
+    if not os.path.exists(static_path):
+        os.makedirs(STATIC_MEDIA_DIR, exist_ok=True)
+        remove_stale_versions(stem, extension)
+        temp_path = f"{static_path}.tmp"
+        shutil.copyfile(file_path, temp_path)
+        os.replace(temp_path, static_path)
+    entry = {
+        "digest": digest,
+        "static_name": static_name,
+        # The ``v`` query argument makes Tornado send far-future cache headers.
+        "url": f"{STATIC_MEDIA_URL}/{static_name}?v={digest}",
+    }
+    if extension.lower() == ".gif":
+        entry["size"] = get_gif_size(file_path)
+    return entry
+
+
+@st.cache_resource(show_spinner=False)
+def get_media_registry(
+    source_dirs: Tuple[str, ...] = MEDIA_SOURCE_DIRS
+) -> Dict[str, Dict]:
+    """
+    Hashes and publishes the media assets once per server process.
+
+    Args:
+        source_dirs (Tuple[str, ...]): Folders containing the media assets.
+
+    Returns:
+        Dict[str, Dict]: A mapping from asset file name to its published entry.
+    """
+    registry = {}
+    for source_dir in source_dirs:
+        if not os.path.isdir(source_dir):
+            logger.info("Media folder %s not found.", source_dir)
+            continue
+
+        for file_name in sorted(os.listdir(source_dir)):
+            if not file_name.lower().endswith(MEDIA_EXTENSIONS):
+                continue
+            try:
+                registry[file_name] = publish_media_file(
+                    os.path.join(source_dir, file_name)
+                )
+            except OSError as error:
+                logger.warning(
+                    "Could not publish media file %s: %s", file_name, error
+                )
+    return registry
+
+
+def get_media_url(media_path: str) -> Optional[str]:
+    """
+    Returns the static URL of a media asset.
+
+    Args:
+        media_path (str): Path or file name of the media asset.
+
+    Returns:
+        Optional[str]: The content-addressed URL, or None if the asset is missing.
+    """
+    entry = get_media_registry().get(os.path.basename(media_path))
+    if entry is None:
+        return None
+    return entry["url"]
+
+
+def get_media_sources(media_path: str) -> Dict:
+    """
+    Returns every published variant of a media asset.
+
+    Variants share the file name stem, e.g. ``write_req.gif`` and the
+    transcoded ``write_req.webm`` and ``write_req.mp4``.
+
+    Args:
+        media_path (str): Path or file name of any variant of the asset.
+
+    Returns:
+        Dict: The variant URLs keyed by extension, in preferred order, and the
+        pixel size of the GIF if known. Empty if no variant exists.
+    """
+    registry = get_media_registry()
+    stem = os.path.splitext(os.path.basename(media_path))[0]
+    sources = {}
+    size = None
+    for extension in MEDIA_SOURCE_ORDER:
+        entry = registry.get(f"{stem}{extension}")
+        if entry is None:
+            continue
+        sources[extension.lstrip(".")] = entry["url"]
+        size = size or entry.get("size")
+    if not sources:
+        return {}
+    return {"sources": sources, "size": size}
@@ -0,0 +1,303 @@
+import re
+import threading
+import time
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from utils.config import get_config
+from utils.downsampling import quote_identifier
+
+# The SQL block of a model response, or the response itself without one.
+SQL_BLOCK_PATTERN = re.compile(
+    r"```(?:sql)?\s*(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE
+)
+# String literals, quoted identifiers, comments, whitespace runs and other text.
+SQL_TOKEN_PATTERN = re.compile(
+    r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/|\s+|[^'\"\s/-]+|[/-]",
+    re.DOTALL,
+)
+
+
+def describe_schema(df: pd.DataFrame) -> str:
+    """
+    Lists the columns of a dataset with their DuckDB types for a prompt.
+
+    Only the schema is described; no values of the dataset are included.
+
+    Args:
+        df (pd.DataFrame): The dataset.
+
+    Returns:
+        str: One line per column with its quoted name and type.
+    """
+    connection = duckdb.connect()
+    try:
+        connection.register("dataset", to_arrow(df.iloc[:0]))
+        columns = connection.execute("DESCRIBE dataset").fetchall()
+    finally:
+        connection.close()
+    return "\n".join(
+        f"{quote_identifier(name)} {data_type}" for name, data_type, *_ in columns
+    )
+
+
+def to_arrow(df: pd.DataFrame) -> pa.Table:
+    """
+    Converts a dataset to an Arrow table for DuckDB, without its index.
+
+    Arrow-backed and numeric columns are not copied.
+
+    Args:
+        df (pd.DataFrame): The dataset.
+
+    Returns:
+        pa.Table: The table.
+    """
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def extract_sql(response: str) -> str:
+    """
+    Extracts the SQL query from a model response.
+
+    Args:
+        response (str): The response, with or without a fenced code block.
+
+    Returns:
+        str: The query without surrounding whitespace and trailing semicolons.
+    """
+    match = SQL_BLOCK_PATTERN.search(response)
+    sql = match.group(1) if match else response
+    return sql.strip().rstrip(";").strip()
+
+
+def normalise_sql(sql: str) -> str:
+    """
+    Normalises a query so equivalent spellings share a cache entry.
+
+    Comments are removed, whitespace runs collapse to one space, trailing
+    semicolons are dropped and everything outside string literals and
+    quoted identifiers is lowercased, as DuckDB keywords and unquoted
+    identifiers are case-insensitive.
+
+    Args:
+        sql (str): The query.
+
+    Returns:
+        str: The normalised query.
+    """
+    parts = []
+    for token in SQL_TOKEN_PATTERN.findall(sql):
+        if token.startswith(("--", "/*")) or token.isspace():
+            # Whitespace inside string literals is kept as it is.
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+        elif token.startswith(("'", '"')):
+            parts.append(token)
+        else:
+            parts.append(token.lower())
+    return "".join(parts).rstrip("; ").strip()
+
+
+class QueryResultCache:
+    """
+    LRU cache of query results keyed by dataset hash and normalised SQL.
+
+    Results are immutable for a dataset, so entries never expire; the
+    least recently used ones are dropped once the cache holds more than
+    ``max_entries`` results or ``max_bytes`` of them.
+
+    Args:
+        max_entries (int): Maximum number of cached results.
+        max_bytes (int): Maximum memory used by the cached results.
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[Dict]:
+        """
+        Gets a cached result and marks it as recently used.
+
+        Args:
+            key (Tuple[str, str]): The dataset hash and the normalised query.
+
+        Returns:
+            Optional[Dict]: The result, or None if it is not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: Tuple[str, str], entry: Dict):
+        """
+        Caches a result, evicting the least recently used ones over the caps.
+
+        Args:
+            key (Tuple[str, str]): The dataset hash and the normalised query.
+            entry (Dict): The result, as returned by ``QueryEngine.run``.
+        """
+        nbytes = int(entry["result"].memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous["nbytes"]
+            self._entries[key] = {**entry, "nbytes": nbytes}
+            self.nbytes += nbytes
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted["nbytes"]
+
+
+class QueryEngine:
+    """
+    Runs read-only SQL queries over a dataset with DuckDB.
+
+    Every query gets its own in-memory DuckDB connection with file system
+    access disabled, and the dataset is registered as the ``dataset`` view
+    of its Arrow data, so DuckDB scans the loaded buffers without copying
+    them. Only single SELECT statements are accepted. Results are capped at
+    ``max_result_rows`` rows and cached by dataset hash and normalised SQL.
+
+    Queries come from the model or the user, so each connection is limited
+    to ``memory_limit_mb`` of memory and ``threads`` threads, and a query
+    still running after ``timeout_seconds`` is interrupted.
+
+    Args:
+        result_cache (Optional[QueryResultCache]): The result cache, None to
+            disable caching.
+        max_result_rows (int): Maximum number of rows returned per query.
+        memory_limit_mb (float): Memory limit of a query's connection.
+        threads (int): Number of threads of a query's connection.
+        timeout_seconds (float): Time after which a query is interrupted.
+    """
+
+    def __init__(
+        self,
+        result_cache: Optional[QueryResultCache] = None,
+        max_result_rows: int = 10000,
+        memory_limit_mb: float = 512,
+        threads: int = 2,
+        timeout_seconds: float = 30,
+    ):
+        self.result_cache = result_cache
+        self.max_result_rows = max_result_rows
+        self.memory_limit_mb = memory_limit_mb
+        self.threads = threads
+        self.timeout_seconds = timeout_seconds
+
+    def _connect(self) -> duckdb.DuckDBPyConnection:
+        return duckdb.connect(
+            config={
+                "enable_external_access": False,
+                "memory_limit": f"{int(self.memory_limit_mb)}MB",
+                "threads": self.threads,
+            }
+        )
+
+    @staticmethod
+    def validate(connection: duckdb.DuckDBPyConnection, sql: str):
+        """
+        Checks that a query is a single SELECT statement.
+
+        Args:
+            connection (duckdb.DuckDBPyConnection): The connection to parse with.
+            sql (str): The query.
+
+        Raises:
+            ValueError: If the query is empty, holds several statements or
+                is not a SELECT statement.
+        """
+        statements = connection.extract_statements(sql) if sql.strip() else []
+        if len(statements) != 1:
+            raise ValueError("Enter exactly one SQL statement.")
+        if statements[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("Only SELECT queries can be run on the dataset.")
+
+    def run(self, df: pd.DataFrame, sql: str, dataset_hash: str) -> Dict:
+        """
+        Runs a query over a dataset, or returns its cached result.
+
+        Args:
+            df (pd.DataFrame): The dataset, queried as ``dataset``.
+            sql (str): The query.
+            dataset_hash (str): The dataset hash, part of the cache key.
+
+        Returns:
+            Dict: The ``result`` DataFrame, whether it was ``truncated`` to
+            ``max_result_rows``, the query time in ``seconds`` and whether it
+            came from the cache in ``cached``.
+
+        Raises:
+            ValueError: If the query is not a single SELECT statement.
+            TimeoutError: If the query runs longer than ``timeout_seconds``.
+            duckdb.Error: If DuckDB cannot run the query, e.g. because it
+                needs more than ``memory_limit_mb`` of memory.
+        """
+        sql = sql.strip().rstrip(";")
+        key = (dataset_hash, normalise_sql(sql))
+        if self.result_cache is not None:
+            entry = self.result_cache.get(key)
+            if entry is not None:
+                return {**entry, "cached": True}
+
+        start = time.perf_counter()
+        connection = self._connect()
+        timer = threading.Timer(self.timeout_seconds, connection.interrupt)
+        timer.daemon = True
+        try:
+            self.validate(connection, sql)
+            connection.register("dataset", to_arrow(df))
+            timer.start()
+            result = connection.sql(sql).limit(self.max_result_rows + 1).df()
+        except duckdb.InterruptException as error:
+            raise TimeoutError(
+                f"The query was stopped after {self.timeout_seconds:g} seconds."
+            ) from error
+        finally:
+            timer.cancel()
+            connection.close()
+        entry = {
+            "result": result.iloc[: self.max_result_rows],
+            "truncated": len(result) > self.max_result_rows,
+            "seconds": time.perf_counter() - start,
+        }
+        if self.result_cache is not None:
+            self.result_cache.set(key, entry)
+        return {**entry, "cached": False}
+
+
+@st.cache_resource(show_spinner=False)
+def get_query_engine() -> QueryEngine:
+    """
+    Creates the query engine shared by all sessions from the app config.
+
+    Returns:
+        QueryEngine: The engine, with a result cache unless disabled.
+    """
+    config = get_config("query")
+    result_cache = None
+    if config.get("cache_enabled", True):
+        result_cache = QueryResultCache(
+            max_entries=config.get("max_entries", 128),
+            max_bytes=int(config.get("max_memory_mb", 64) * 1024 * 1024),
+        )
+    return QueryEngine(
+        result_cache,
+        max_result_rows=config.get("max_result_rows", 10000),
+        memory_limit_mb=config.get("query_memory_limit_mb", 512),
+        threads=config.get("threads", 2),
+        timeout_seconds=config.get("timeout_seconds", 30),
+    )
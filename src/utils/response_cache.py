@@ -0,0 +1,207 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import streamlit as st
+from collections import OrderedDict
+from typing import Iterator, Optional
+
+from utils.config import get_config, resolve_path
+
+logger = logging.getLogger(__name__)
+
+# Words together with the whitespace that follows them.
+REPLAY_CHUNK_PATTERN = re.compile(r"\s*\S+\s*|\s+")
+
+
+class ResponseCache:
+    """Cache of model responses with an in-process LRU and a SQLite tier.
+
+    Entries are keyed on the model, the normalised prompt and the sampling
+    parameters. The SQLite tier is optional; when it is configured, entries
+    survive restarts and are shared between server processes. Both tiers
+    drop entries older than ``ttl_seconds``; the SQLite tier also evicts the
+    least recently used entries once it grows over ``max_disk_bytes``.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: float = 86400,
+        sqlite_path: Optional[str] = None,
+        max_disk_bytes: int = 100 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        if sqlite_path:
+            self._connection = self._open_database(sqlite_path)
+
+    @staticmethod
+    def _open_database(sqlite_path: str) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(sqlite_path), exist_ok=True)
+        connection = sqlite3.connect(
+            sqlite_path, timeout=5, check_same_thread=False, isolation_level=None
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+        )
+        return connection
+
+    @staticmethod
+    def normalise_prompt(prompt: str) -> str:
+        """Normalise line endings and surrounding whitespace of a prompt."""
+        lines = prompt.replace("\r\n", "\n").split("\n")
+        return "\n".join(line.rstrip() for line in lines).strip()
+
+    @classmethod
+    def make_key(
+        cls, model: str, prompt: str, temperature: float, top_p: float, **params
+    ) -> str:
+        """Build the cache key of a model call.
+
+        Args:
+            model: The model name.
+            prompt: The prompt sent to the model.
+            temperature: The sampling temperature.
+            top_p: The nucleus sampling parameter.
+            **params: Any other model input that changes the response.
+
+        Returns:
+            A hex digest identifying the call.
+        """
+        payload = json.dumps(
+            {
+                "model": model,
+                "prompt": cls.normalise_prompt(prompt),
+                "temperature": round(float(temperature), 4),
+                "top_p": round(float(top_p), 4),
+                **params,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached response.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            The response, or None if it is not cached or has expired.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                response, created = entry
+                if now - created <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    return response
+                del self._entries[key]
+
+            if self._connection is None:
+                return None
+            row = self._connection.execute(
+                "SELECT response, created FROM responses"
+                " WHERE key = ? AND created >= ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?", (now, key)
+            )
+            self._remember(key, row[0], row[1])
+            return row[0]
+
+    def set(self, key: str, response: str):
+        """Cache a complete response.
+
+        Args:
+            key: The cache key.
+            response: The full response text.
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            if self._connection is None:
+                return
+            try:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (key, response, len(response.encode("utf-8")), now, now),
+                )
+                self._evict_disk(now)
+            except sqlite3.Error as error:
+                logger.warning("Could not store the response on disk: %s", error)
+
+    def _remember(self, key: str, response: str, created: float):
+        self._entries[key] = (response, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _evict_disk(self, now: float):
+        self._connection.execute(
+            "DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,)
+        )
+        (total_size,) = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if total_size <= self.max_disk_bytes:
+            return
+        rows = self._connection.execute(
+            "SELECT key, size FROM responses ORDER BY accessed"
+        ).fetchall()
+        stale_keys = []
+        for key, size in rows:
+            if total_size <= self.max_disk_bytes:
+                break
+            stale_keys.append((key,))
+            total_size -= size
+        self._connection.executemany(
+            "DELETE FROM responses WHERE key = ?", stale_keys
+        )
+
+    @staticmethod
+    def replay(response: str) -> Iterator[str]:
+        """Stream a cached response word by word, like a model response."""
+        for match in REPLAY_CHUNK_PATTERN.finditer(response):
+            yield match.group(0)
+
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache() -> Optional[ResponseCache]:
+    """Create the process-wide response cache from the app config.
+
+    Returns:
+        The response cache, or None if it is disabled.
+    """
+    config = get_config("response_cache")
+    if not config.get("enabled", True):
+        return None
+    sqlite_path = config.get("sqlite_path")
+    return ResponseCache(
+        max_entries=config.get("max_entries", 256),
+        ttl_seconds=config.get("ttl_seconds", 86400),
+        sqlite_path=resolve_path(sqlite_path) if sqlite_path else None,
+        max_disk_bytes=int(config.get("max_disk_mb", 100) * 1024 * 1024),
+    )
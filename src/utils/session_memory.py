@@ -0,0 +1,388 @@
+import logging
+import os
+import threading
+import time
+import uuid
+import weakref
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import streamlit as st
+from typing import Any, Callable, Dict, Optional
+
+from utils.config import get_config, resolve_path
+from utils.ingestion import ARROW_STRING_TYPES
+
+logger = logging.getLogger(__name__)
+
+
+class SpillableDataFrame:
+    """
+    Handle to a session's dataframe that can be spilled to disk.
+
+    Sessions keep the handle in ``st.session_state`` instead of the
+    dataframe. While the dataframe is spilled, only its Arrow IPC file on
+    disk holds the data; ``get`` reloads it transparently by memory-mapping
+    the file. Objects derived from the dataframe, e.g. a chart renderer,
+    are kept on the handle so they are dropped with it or when it spills
+    and never keep a spilled dataframe in memory.
+
+    Dataframes memory-mapped from the dataset disk cache already have their
+    data on disk. Spilling them links the cache file instead of writing a
+    copy, and ``nbytes`` only counts their memory that is not mapped.
+
+    Args:
+        manager (SessionMemoryManager): The manager tracking the handle.
+        df (pd.DataFrame): The dataframe.
+        dataset_hash (str): The hash of the dataset.
+        source_path (Optional[str]): The dataset cache file ``df`` is
+            memory-mapped from.
+        mapped_bytes (int): The memory of ``df`` mapped from that file.
+    """
+
+    def __init__(
+        self,
+        manager: "SessionMemoryManager",
+        df: pd.DataFrame,
+        dataset_hash: str,
+        source_path: Optional[str] = None,
+        mapped_bytes: int = 0,
+    ):
+        self.dataset_hash = dataset_hash
+        self.source_path = source_path
+        self.nbytes = max(
+            int(df.memory_usage(index=True, deep=True).sum()) - mapped_bytes, 0
+        )
+        self.dtypes = df.dtypes
+        self.last_access = time.monotonic()
+        self.spill_path = None
+        self.spillable = True
+        self._df = df
+        self._derived = {}
+        # Release callbacks of the derived objects and the spill file, run by
+        # a single finalizer when the handle is garbage collected.
+        self._releases = {}
+        self._spill_files = set()
+        weakref.finalize(self, _release, self._releases, self._spill_files)
+        self._manager = manager
+        self._lock = threading.RLock()
+
+    @property
+    def is_spilled(self) -> bool:
+        return self._df is None
+
+    def get(self) -> pd.DataFrame:
+        """
+        Returns the dataframe, reloading it if it was spilled.
+
+        Returns:
+            pd.DataFrame: The dataframe.
+        """
+        with self._lock:
+            self.last_access = time.monotonic()
+            if self._df is None:
+                self._df = self._manager.reload(self)
+                self._spill_files.clear()
+            df = self._df
+        self._manager.enforce_limit(keep=self)
+        return df
+
+    def get_derived(
+        self,
+        name: str,
+        build: Callable[[pd.DataFrame], Any],
+        release: Optional[Callable[[], None]] = None,
+    ) -> Any:
+        """
+        Returns an object derived from the dataframe, building it on first use.
+
+        Args:
+            name (str): The name of the derived object.
+            build (Callable[[pd.DataFrame], Any]): Builds the object from the
+                dataframe.
+            release (Optional[Callable[[], None]]): Drops references to the
+                object held elsewhere; called when the object is dropped
+                because the dataframe spills or the handle is collected. It
+                must not reference the object or the dataframe.
+
+        Returns:
+            Any: The derived object.
+        """
+        df = self.get()
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = build(df)
+                if release is not None:
+                    self._releases[name] = release
+            return self._derived[name]
+
+    def spill(self) -> bool:
+        """
+        Writes the dataframe to disk and drops it and its derived objects
+        from memory.
+
+        Returns:
+            bool: Whether the dataframe was spilled.
+        """
+        with self._lock:
+            if self._df is None or not self.spillable:
+                return False
+            self._df = self._manager.spill(self, self._df)
+            if self._df is not None:
+                return False
+            self._spill_files.add(self.spill_path)
+            self._derived = {}
+            releases = list(self._releases.values())
+            self._releases.clear()
+        for release in releases:
+            release()
+        return True
+
+
+class SessionMemoryManager:
+    """
+    Tracks the dataframes held by sessions and spills them to disk.
+
+    A dataframe is spilled when its session has not accessed it for
+    ``idle_seconds``, checked every ``sweep_interval`` seconds by a
+    background thread, or when the resident dataframes of all sessions
+    exceed ``max_bytes``, least recently accessed first. Spilled dataframes
+    are written as Arrow IPC files and memory-mapped again on the next
+    access. Spill files are removed when they are reloaded or when the
+    session's handle is garbage collected.
+
+    Args:
+        spill_directory (str): Directory of the spill files.
+        max_bytes (int): Memory ceiling of the resident dataframes.
+        idle_seconds (float): Idle time after which a dataframe is spilled.
+        sweep_interval (float): Seconds between idle checks.
+    """
+
+    def __init__(
+        self,
+        spill_directory: str,
+        max_bytes: int = 2 * 1024 * 1024 * 1024,
+        idle_seconds: float = 600,
+        sweep_interval: float = 30,
+    ):
+        self.spill_directory = spill_directory
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.sweep_interval = sweep_interval
+        self._handles = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._metrics = {
+            "spills": 0,
+            "reloads": 0,
+            "spill_failures": 0,
+            "spilled_bytes": 0,
+            "reloaded_bytes": 0,
+        }
+        os.makedirs(spill_directory, exist_ok=True)
+        self._thread = threading.Thread(
+            target=self._sweep_loop, name="session-memory-sweep", daemon=True
+        )
+
+    def start(self) -> "SessionMemoryManager":
+        """Start checking for idle sessions in the background."""
+        self._thread.start()
+        return self
+
+    def track(
+        self,
+        df: pd.DataFrame,
+        dataset_hash: str,
+        source_path: Optional[str] = None,
+        mapped_bytes: int = 0,
+    ) -> SpillableDataFrame:
+        """
+        Starts tracking a session's dataframe.
+
+        Args:
+            df (pd.DataFrame): The dataframe.
+            dataset_hash (str): The hash of the dataset.
+            source_path (Optional[str]): The dataset cache file ``df`` is
+                memory-mapped from.
+            mapped_bytes (int): The memory of ``df`` mapped from that file.
+
+        Returns:
+            SpillableDataFrame: The handle to keep in the session state.
+        """
+        handle = SpillableDataFrame(self, df, dataset_hash, source_path, mapped_bytes)
+        with self._lock:
+            self._handles.add(handle)
+        self.enforce_limit(keep=handle)
+        return handle
+
+    def spill(
+        self, handle: SpillableDataFrame, df: pd.DataFrame
+    ) -> Optional[pd.DataFrame]:
+        """
+        Writes a dataframe to a spill file; called by the handle.
+
+        The spill file of a dataframe mapped from the dataset disk cache is a
+        hard link to the cache file, so it is not written again and outlives
+        the eviction of the cache file.
+
+        Args:
+            handle (SpillableDataFrame): The handle of the dataframe.
+            df (pd.DataFrame): The dataframe.
+
+        Returns:
+            Optional[pd.DataFrame]: None once spilled, or the dataframe if it
+            could not be written.
+        """
+        file_name = f"{handle.dataset_hash[:16]}-{uuid.uuid4().hex}.arrow"
+        path = os.path.join(self.spill_directory, file_name)
+        if handle.source_path is not None and _link_file(handle.source_path, path):
+            return self._spilled(handle, path)
+        try:
+            table = pa.Table.from_pandas(df)
+            with pa.OSFile(path, "wb") as sink:
+                with ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+        except (OSError, pa.ArrowInvalid, pa.ArrowTypeError) as error:
+            logger.warning(
+                "Could not spill dataset %s: %s", handle.dataset_hash[:12], error
+            )
+            handle.spillable = False
+            if os.path.exists(path):
+                os.remove(path)
+            with self._lock:
+                self._metrics["spill_failures"] += 1
+            return df
+        return self._spilled(handle, path)
+
+    def _spilled(self, handle: SpillableDataFrame, path: str):
+        handle.spill_path = path
+        with self._lock:
+            self._metrics["spills"] += 1
+            self._metrics["spilled_bytes"] += handle.nbytes
+        logger.info(
+            "Spilled dataset %s, stats: %s", handle.dataset_hash[:12], self.stats()
+        )
+
+    def reload(self, handle: SpillableDataFrame) -> pd.DataFrame:
+        """
+        Memory-maps a spilled dataframe and removes its spill file.
+
+        Args:
+            handle (SpillableDataFrame): The handle of the dataframe.
+
+        Returns:
+            pd.DataFrame: The dataframe.
+        """
+        source = pa.memory_map(handle.spill_path, "r")
+        table = ipc.open_file(source).read_all()
+        df = table.to_pandas(split_blocks=True, types_mapper=ARROW_STRING_TYPES.get)
+        # Strings stay zero-copy Arrow strings unless they were objects.
+        object_columns = handle.dtypes.index[handle.dtypes == object]
+        if len(object_columns):
+            df = df.astype(dict.fromkeys(object_columns, object))
+        # The mapping stays readable after the file is removed.
+        _remove_file(handle.spill_path)
+        handle.spill_path = None
+        with self._lock:
+            self._metrics["reloads"] += 1
+            self._metrics["reloaded_bytes"] += handle.nbytes
+        logger.info(
+            "Reloaded dataset %s, stats: %s", handle.dataset_hash[:12], self.stats()
+        )
+        return df
+
+    def enforce_limit(self, keep: Optional[SpillableDataFrame] = None):
+        """
+        Spills the least recently used dataframes over the memory ceiling.
+
+        Args:
+            keep (Optional[SpillableDataFrame]): A handle that is in use and
+                must stay in memory.
+        """
+        with self._lock:
+            resident = [handle for handle in self._handles if not handle.is_spilled]
+        total_bytes = sum(handle.nbytes for handle in resident)
+        for handle in sorted(resident, key=lambda handle: handle.last_access):
+            if total_bytes <= self.max_bytes:
+                break
+            if handle is not keep and handle.spill():
+                total_bytes -= handle.nbytes
+
+    def spill_idle(self):
+        """Spills the dataframes that have not been accessed recently."""
+        deadline = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [
+                handle
+                for handle in self._handles
+                if not handle.is_spilled and handle.last_access < deadline
+            ]
+        for handle in idle:
+            handle.spill()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.spill_idle()
+            except Exception as error:
+                logger.error("Could not spill idle datasets: %s", error)
+
+    def stats(self) -> Dict:
+        """
+        Returns the memory held by sessions and the spill metrics.
+
+        Returns:
+            Dict: Resident and spilled dataframe counts and bytes, and the
+            number of spills and reloads.
+        """
+        with self._lock:
+            handles = list(self._handles)
+            metrics = dict(self._metrics)
+        resident = [handle for handle in handles if not handle.is_spilled]
+        return {
+            "resident_dataframes": len(resident),
+            "resident_bytes": sum(handle.nbytes for handle in resident),
+            "spilled_dataframes": len(handles) - len(resident),
+            **metrics,
+        }
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _link_file(source: str, path: str) -> bool:
+    # Fails e.g. across file systems or once the cache file was evicted.
+    try:
+        os.link(source, path)
+    except OSError as error:
+        logger.info("Could not link cached dataset %s: %s", source, error)
+        return False
+    return True
+
+
+def _release(releases: Dict[str, Callable[[], None]], spill_files: set):
+    for release in releases.values():
+        release()
+    for path in spill_files:
+        _remove_file(path)
+
+
+@st.cache_resource(show_spinner=False)
+def get_session_memory_manager() -> SessionMemoryManager:
+    """
+    Creates the process-wide session memory manager from the app config.
+
+    Returns:
+        SessionMemoryManager: The started session memory manager.
+    """
+    config = get_config("session_memory")
+    return SessionMemoryManager(
+        spill_directory=resolve_path(config.get("spill_directory", ".cache/spill")),
+        max_bytes=int(config.get("max_memory_mb", 2048) * 1024 * 1024),
+        idle_seconds=config.get("idle_seconds", 600),
+        sweep_interval=config.get("sweep_interval_seconds", 30),
+    ).start()
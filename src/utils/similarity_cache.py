@@ -0,0 +1,395 @@
+import hashlib
+import logging
+import re
+import threading
+import numpy as np
+import streamlit as st
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils.config import get_config
+
+logger = logging.getLogger(__name__)
+
+CODE_BLOCK_PATTERN = re.compile(r"```[^\n]*\n(.*?)\n```", re.DOTALL)
+LANGUAGE_PATTERN = re.compile(r"The following (.+?) code is provided")
+BLOCK_COMMENT = r"/\*.*?\*/"
+COMMENT_PATTERNS = {
+    "hash": re.compile(r"#[^\n]*"),
+    "sql": re.compile(BLOCK_COMMENT + r"|--[^\n]*", re.DOTALL),
+    "c": re.compile(BLOCK_COMMENT + r"|//[^\n]*", re.DOTALL),
+}
+COMMENT_STYLES = {
+    "Python": "hash",
+    "R": "hash",
+    "Ruby": "hash",
+    "Perl": "hash",
+    "SQL": "sql",
+    "Lua": "sql",
+}
+# String literals, identifiers, numbers and single symbols.
+TOKEN_PATTERN = re.compile(
+    r"\"(?:[^\"\\\n]|\\.)*\"|'(?:[^'\\\n]|\\.)*'|[A-Za-z_]\w*|\d+(?:\.\d+)?|\S"
+)
+# Keywords of the common languages, which are never variable names.
+KEYWORDS = frozenset(
+    """
+    and as assert async await break case catch class const continue def del
+    elif else except export extends false finally for from func function if
+    import in interface is lambda let match new nil none nonlocal not null or
+    package pass private protected public raise return self static struct
+    super switch this throw true try var void while with yield
+    """.split()
+)
+# Keywords followed by the name they bind, e.g. ``def name`` or ``let name``.
+BINDING_KEYWORDS = frozenset("class const def func function lambda let var".split())
+# Keywords whose name is followed by a parameter list.
+DEFINITION_KEYWORDS = frozenset("def func function".split())
+# Keywords after which ``as`` does not bind a variable but renames an import.
+IMPORT_KEYWORDS = frozenset("import with except".split())
+
+
+def split_prompt(prompt: str) -> Optional[Tuple[str, str]]:
+    """
+    Splits a prompt into its first code block and the surrounding text.
+
+    Args:
+        prompt (str): The prompt.
+
+    Returns:
+        Optional[Tuple[str, str]]: The code and the prompt with the code
+        replaced by a placeholder, or None if the prompt has no code block.
+    """
+    match = CODE_BLOCK_PATTERN.search(prompt)
+    if match is None:
+        return None
+    context = prompt[: match.start(1)] + "<code>" + prompt[match.end(1) :]
+    return match.group(1), context
+
+
+def is_identifier(token: str) -> bool:
+    return (token[0].isalpha() or token[0] == "_") and token.lower() not in KEYWORDS
+
+
+def get_bound_names(
+    tokens: List[str], assignments: bool = True
+) -> Tuple[Set[str], Set[int]]:
+    """
+    Finds the names a piece of code binds as variables.
+
+    Names are bound by assignments, loop targets, ``def``, ``function`` and
+    similar keywords, function parameters and ``with``, ``except`` or SQL
+    ``AS`` targets. Attributes, keyword arguments of calls and names
+    imported with ``import ... as`` are not bound.
+
+    Args:
+        tokens (List[str]): The tokens of the code.
+        assignments (bool): Whether ``=`` assigns, False for SQL where it
+            compares.
+
+    Returns:
+        Tuple[Set[str], Set[int]]: The bound names and the positions of the
+        keyword arguments, which keep their name even if it is bound.
+    """
+    bound = set()
+    keyword_arguments = set()
+    depth = 0
+    # Depth of the parameter list being read, 0 outside of one.
+    parameter_depth = 0
+    loop_targets = False
+    for i, token in enumerate(tokens):
+        previous = tokens[i - 1].lower() if i > 0 else ""
+        following = tokens[i + 1] if i + 1 < len(tokens) else ""
+        if token in ("(", "["):
+            depth += 1
+            if i >= 2 and tokens[i - 2].lower() in DEFINITION_KEYWORDS:
+                parameter_depth = parameter_depth or depth
+        elif token in (")", "]"):
+            if depth == parameter_depth:
+                parameter_depth = 0
+            depth = max(depth - 1, 0)
+        if token.lower() in ("for", "in", "of", ":", ";", "("):
+            loop_targets = token.lower() == "for"
+        if not is_identifier(token) or previous == ".":
+            continue
+        if previous == "as":
+            context = next(
+                (
+                    word.lower()
+                    for word in reversed(tokens[: i - 1])
+                    if word.lower() in IMPORT_KEYWORDS
+                ),
+                "with",
+            )
+            if context != "import":
+                bound.add(token)
+        elif previous in BINDING_KEYWORDS or loop_targets:
+            bound.add(token)
+        elif parameter_depth and depth == parameter_depth:
+            # Parameter names come last, after any type: ``int a, b: int``.
+            if following in (",", ")", "=", ":") and previous != ":":
+                bound.add(token)
+        elif assignments and following == "=" and tokens[i + 2 : i + 3] != ["="]:
+            if depth and previous in ("(", ","):
+                keyword_arguments.add(i)
+            else:
+                bound.add(token)
+    return bound, keyword_arguments
+
+
+def get_code_tokens(code: str, language: str = "") -> list:
+    """
+    Tokenizes code without comments, whitespace and local variable names.
+
+    Variables the code binds are replaced by a placeholder, so renamed
+    variables still match. Calls, attributes, imported names and literals
+    are kept as they are, as they decide what the code does. SQL is
+    lowercased outside string literals, as it is case-insensitive.
+
+    Args:
+        code (str): The source code.
+        language (str): The programming language, selects the comment syntax.
+
+    Returns:
+        list: The normalised tokens.
+    """
+    comment_pattern = COMMENT_PATTERNS[COMMENT_STYLES.get(language, "c")]
+    tokens = TOKEN_PATTERN.findall(comment_pattern.sub(" ", code))
+    if language == "SQL":
+        tokens = [token if token[0] in "'\"" else token.lower() for token in tokens]
+    bound, keyword_arguments = get_bound_names(tokens, language != "SQL")
+    normalised = []
+    for i, token in enumerate(tokens):
+        if token.lower() in KEYWORDS:
+            token = token.lower()
+        elif (
+            token in bound
+            and i not in keyword_arguments
+            and (i == 0 or tokens[i - 1] != ".")
+        ):
+            token = "ID"
+        normalised.append(token)
+    return normalised
+
+
+class MinHashLSH:
+    """
+    Near-duplicate index of code submissions and their responses.
+
+    Code is reduced to shingles of normalised tokens, fingerprinted with
+    MinHash and indexed with banded locality-sensitive hashing. A lookup
+    only considers entries whose prompt text around the code (which holds
+    the language and refactor options) and sampling parameters match, and
+    returns the most similar one above ``threshold``.
+
+    Args:
+        threshold (float): Minimum estimated Jaccard similarity of a match.
+        num_perm (int): Number of MinHash permutations.
+        bands (int): Number of LSH bands; must divide ``num_perm``.
+        shingle_size (int): Number of tokens per shingle.
+        max_entries (int): Number of entries kept, least recently used first out.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        num_perm: int = 128,
+        bands: int = 32,
+        shingle_size: int = 4,
+        max_entries: int = 512,
+        seed: int = 1,
+    ):
+        assert num_perm % bands == 0, "bands must divide num_perm."
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_entries = max_entries
+        generator = np.random.default_rng(seed)
+        max_value = np.iinfo(np.uint64).max
+        # Multiply-shift hash functions, one per permutation.
+        self._multipliers = (
+            generator.integers(1, max_value, num_perm, dtype=np.uint64) | 1
+        ).reshape(-1, 1)
+        self._offsets = generator.integers(
+            0, max_value, num_perm, dtype=np.uint64
+        ).reshape(-1, 1)
+        self._entries = OrderedDict()
+        self._buckets = [dict() for _ in range(bands)]
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_signature(self, code: str, language: str = "") -> Optional[np.ndarray]:
+        """
+        Computes the MinHash signature of a piece of code.
+
+        Args:
+            code (str): The source code.
+            language (str): The programming language of the code.
+
+        Returns:
+            Optional[np.ndarray]: The signature, or None if the code is empty.
+        """
+        tokens = get_code_tokens(code, language)
+        if not tokens:
+            return None
+        size = min(self.shingle_size, len(tokens))
+        shingles = {
+            " ".join(tokens[i : i + size]) for i in range(len(tokens) - size + 1)
+        }
+        hashes = np.fromiter(
+            (
+                int.from_bytes(
+                    hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(),
+                    "little",
+                )
+                for shingle in shingles
+            ),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        permuted = (self._multipliers * hashes + self._offsets) >> np.uint64(32)
+        return permuted.min(axis=1)
+
+    def fingerprint(self, prompt: str, params: Dict) -> Optional[Tuple]:
+        """
+        Computes the signature and band keys of the code in a prompt.
+
+        Args:
+            prompt (str): The prompt containing the submitted code.
+            params (Dict): Sampling parameters that must match exactly.
+
+        Returns:
+            Optional[Tuple]: The signature and band keys, or None if the prompt
+            holds no code.
+        """
+        parts = split_prompt(prompt)
+        if parts is None:
+            return None
+        code, context = parts
+        language = LANGUAGE_PATTERN.search(context)
+        signature = self.get_signature(code, language.group(1) if language else "")
+        if signature is None:
+            return None
+        text = " ".join(context.split()) + repr(sorted(params.items()))
+        context_key = hashlib.sha256(text.encode("utf-8")).digest()
+        band_keys = [
+            context_key + band.tobytes()
+            for band in signature.reshape(self.bands, self.rows)
+        ]
+        return signature, band_keys
+
+    def lookup(self, prompt: str, params: Dict) -> Optional[Tuple[str, float]]:
+        """
+        Finds the response to a near-identical earlier submission.
+
+        Args:
+            prompt (str): The prompt containing the submitted code.
+            params (Dict): Sampling parameters that must match exactly.
+
+        Returns:
+            Optional[Tuple[str, float]]: The cached response and its estimated
+            similarity, or None if there is no match.
+        """
+        fingerprint = self.fingerprint(prompt, params)
+        if fingerprint is None:
+            return None
+        signature, band_keys = fingerprint
+
+        with self._lock:
+            candidates = set()
+            for band, key in enumerate(band_keys):
+                candidates.update(self._buckets[band].get(key, ()))
+
+            best_id, best_similarity = None, 0.0
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                similarity = float(np.mean(entry["signature"] == signature))
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None or best_similarity < self.threshold:
+                self.misses += 1
+                logger.info("Similarity cache miss, stats: %s", self.stats())
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            logger.info(
+                "Similarity cache hit (%.2f), stats: %s",
+                best_similarity,
+                self.stats(),
+            )
+            return self._entries[best_id]["response"], best_similarity
+
+    def add(self, prompt: str, params: Dict, response: str):
+        """
+        Indexes the response to a submission.
+
+        Args:
+            prompt (str): The prompt containing the submitted code.
+            params (Dict): Sampling parameters used for the response.
+            response (str): The full response.
+        """
+        fingerprint = self.fingerprint(prompt, params)
+        if fingerprint is None:
+            return
+        signature, band_keys = fingerprint
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "signature": signature,
+                "band_keys": band_keys,
+                "response": response,
+            }
+            for band, key in enumerate(band_keys):
+                self._buckets[band].setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        for band, key in enumerate(entry["band_keys"]):
+            bucket = self._buckets[band][key]
+            bucket.discard(entry_id)
+            if not bucket:
+                del self._buckets[band][key]
+
+    def stats(self) -> Dict:
+        """
+        Returns the hit and miss counts of the index.
+
+        Returns:
+            Dict: Hits, misses, hit rate and number of entries.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+@st.cache_resource(show_spinner=False)
+def get_similarity_cache() -> Optional[MinHashLSH]:
+    """
+    Creates the process-wide similarity cache from the app config.
+
+    Returns:
+        Optional[MinHashLSH]: The similarity cache, or None if it is disabled.
+    """
+    config = get_config("similarity_cache")
+    if not config.get("enabled", False):
+        return None
+    return MinHashLSH(
+        threshold=config.get("threshold", 0.9),
+        num_perm=config.get("num_perm", 128),
+        bands=config.get("bands", 32),
+        shingle_size=config.get("shingle_size", 4),
+        max_entries=config.get("max_entries", 512),
+    )
@@ -0,0 +1,486 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import Iterator, List, Optional, Tuple, Union
+
+
+class TDigest:
+    """
+    Mergeable sketch of a distribution for approximate quantiles.
+
+    A merging t-digest: values are buffered and periodically folded into
+    weighted centroids. The centroids are sized by the ``k1`` scale function,
+    so they are small near the tails and quantiles close to 0 and 1 stay
+    accurate. Folding sorts the values once and groups them with NumPy
+    instead of visiting them one by one.
+
+    Args:
+        compression (float): Controls the number of centroids, about
+            ``compression / 2``; higher is more accurate.
+    """
+
+    def __init__(self, compression: float = 100):
+        self.compression = compression
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self._buffer: List[np.ndarray] = []
+        self._buffered = 0
+
+    def add(self, values: np.ndarray):
+        """
+        Adds values to the digest.
+
+        Args:
+            values (np.ndarray): The values, without missing values.
+        """
+        if len(values) == 0:
+            return
+        values = np.asarray(values, dtype=np.float64)
+        self.count += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._buffer.append(values)
+        self._buffered += len(values)
+        if self._buffered > 20 * self.compression:
+            self._compress()
+
+    def merge(self, other: "TDigest"):
+        """
+        Merges another digest into this one.
+
+        Args:
+            other (TDigest): The digest to merge.
+        """
+        other._compress()
+        if other.count == 0:
+            return
+        self._compress()
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._fold(
+            np.concatenate([self._means, other._means]),
+            np.concatenate([self._weights, other._weights]),
+        )
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        values = np.concatenate(self._buffer)
+        self._buffer, self._buffered = [], 0
+        self._fold(
+            np.concatenate([self._means, values]),
+            np.concatenate([self._weights, np.ones(len(values))]),
+        )
+
+    def _fold(self, means: np.ndarray, weights: np.ndarray):
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        # Centroids whose midpoints fall into the same unit of the k1 scale
+        # are merged.
+        quantiles = (np.cumsum(weights) - weights / 2) / total
+        scale = self.compression / (2 * np.pi) * np.arcsin(2 * quantiles - 1)
+        groups = np.floor(scale).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, np.diff(groups) != 0])
+        self._weights = np.add.reduceat(weights, starts)
+        self._means = np.add.reduceat(means * weights, starts) / self._weights
+
+    @property
+    def centroids(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The means and weights of the centroids, sorted by mean."""
+        self._compress()
+        return self._means, self._weights
+
+    @classmethod
+    def from_centroids(
+        cls,
+        means: np.ndarray,
+        weights: np.ndarray,
+        minimum: float,
+        maximum: float,
+        compression: float = 100,
+    ) -> "TDigest":
+        """
+        Rebuilds a digest from its centroids, e.g. to restore a stored digest.
+
+        Args:
+            means (np.ndarray): The means of the centroids, sorted.
+            weights (np.ndarray): The weights of the centroids.
+            minimum (float): The smallest value added.
+            maximum (float): The largest value added.
+            compression (float): Compression of the digest.
+
+        Returns:
+            TDigest: The digest.
+        """
+        digest = cls(compression)
+        digest._means = np.asarray(means, dtype=np.float64)
+        digest._weights = np.asarray(weights, dtype=np.float64)
+        digest.count = int(round(digest._weights.sum()))
+        digest.min, digest.max = minimum, maximum
+        return digest
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+            float: The estimated value, NaN if the digest is empty.
+        """
+        self._compress()
+        if self.count == 0:
+            return np.nan
+        midpoints = np.cumsum(self._weights) - self._weights / 2
+        return float(
+            np.interp(
+                q * self.count,
+                np.r_[0.0, midpoints, self.count],
+                np.r_[self.min, self._means, self.max],
+            )
+        )
+
+
+class HyperLogLog:
+    """
+    Mergeable sketch for approximate distinct counts.
+
+    Each value is hashed to 64 bits; the first ``precision`` bits pick one
+    of ``2 ** precision`` registers, which keeps the longest run of leading
+    zeros seen in the remaining bits. The relative error is about
+    ``1.04 / sqrt(2 ** precision)``, 1.6% for the default precision, with
+    one byte of memory per register.
+
+    Args:
+        precision (int): Number of index bits, between 11 and 16.
+    """
+
+    def __init__(self, precision: int = 12):
+        if not 11 <= precision <= 16:
+            raise ValueError("The HyperLogLog precision must be between 11 and 16.")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, hashes: np.ndarray):
+        """
+        Adds hashed values to the sketch.
+
+        Args:
+            hashes (np.ndarray): 64-bit hashes of the values, see ``hash_values``.
+        """
+        if len(hashes) == 0:
+            return
+        value_bits = 64 - self.precision
+        index = (hashes >> np.uint64(value_bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << value_bits) - 1)
+        # The remaining bits fit a float64 mantissa, so frexp gives their
+        # exact bit length.
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = (value_bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog"):
+        """
+        Merges another sketch of the same precision into this one.
+
+        Args:
+            other (HyperLogLog): The sketch to merge.
+        """
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        """
+        Estimates the number of distinct values added.
+
+        Returns:
+            int: The estimated distinct count.
+        """
+        num_registers = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / num_registers)
+        estimate = (
+            alpha
+            * num_registers**2
+            / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        )
+        empty = int(np.count_nonzero(self.registers == 0))
+        # Linear counting is more accurate for small cardinalities.
+        if estimate <= 2.5 * num_registers and empty:
+            estimate = num_registers * np.log(num_registers / empty)
+        return int(round(estimate))
+
+
+class HeavyHitters:
+    """
+    Mergeable Misra-Gries summary of the most frequent values.
+
+    Keeps at most ``capacity`` counters. Every batch is counted exactly,
+    merged into the counters, and all counters are then reduced by the
+    ``capacity + 1``-th largest count so only the frequent values survive.
+    Any value occurring more than ``n / (capacity + 1)`` times in ``n``
+    values is kept, and its count is underestimated by at most ``error``,
+    the total subtracted from the counters.
+
+    Args:
+        capacity (int): Maximum number of tracked values.
+    """
+
+    def __init__(self, capacity: int = 32):
+        self.capacity = capacity
+        self.counters = {}
+        self.error = 0
+
+    def add(self, column: pa.Array):
+        """
+        Counts the non-null values of a column chunk.
+
+        Args:
+            column (pa.Array): The values.
+        """
+        value_counts = pc.value_counts(pc.drop_null(column))
+        if len(value_counts) == 0:
+            return
+        counts = value_counts.field("counts").to_numpy()
+        if len(counts) > self.capacity:
+            # Reduce the batch first so only a few values reach the dict.
+            threshold = -np.partition(-counts, self.capacity)[self.capacity]
+            keep = np.flatnonzero(counts > threshold)
+            value_counts, counts = value_counts.take(keep), counts[keep] - threshold
+            self.error += int(threshold)
+        values = value_counts.field("values").to_pylist()
+        self._merge(dict(zip(values, counts.tolist())))
+
+    def merge(self, other: "HeavyHitters"):
+        """
+        Merges another summary into this one.
+
+        Args:
+            other (HeavyHitters): The summary to merge.
+        """
+        self.error += other.error
+        self._merge(other.counters)
+
+    def _merge(self, counters: dict):
+        merged = dict(self.counters)
+        for value, count in counters.items():
+            merged[value] = merged.get(value, 0) + count
+        if len(merged) > self.capacity:
+            threshold = sorted(merged.values(), reverse=True)[self.capacity]
+            merged = {
+                value: count - threshold
+                for value, count in merged.items()
+                if count > threshold
+            }
+            self.error += threshold
+        self.counters = merged
+
+    def top(self, k: int) -> List[Tuple[object, int]]:
+        """
+        Returns the most frequent values.
+
+        Only values whose count is larger than the error bound are returned,
+        so values of near-uniform columns are not reported as frequent.
+
+        Args:
+            k (int): Number of values.
+
+        Returns:
+            List[Tuple[object, int]]: Values with their lower-bound counts,
+            most frequent first.
+        """
+        frequent = [item for item in self.counters.items() if item[1] > self.error]
+        return sorted(frequent, key=lambda item: -item[1])[:k]
+
+
+class DuplicateCounter:
+    """
+    Exact count of duplicate rows from 64-bit row hashes.
+
+    Only the hashes are kept, eight bytes per row instead of the rows. They
+    are split by their top bits into ``num_partitions`` partitions, so every
+    partition can be deduplicated on its own. In memory, a partition keeps
+    its distinct hashes sorted and merges new hashes once they outnumber
+    them, which keeps the total cost at O(n log n). Once the hashes take
+    more than ``max_memory_bytes``, the partitions move to files in a
+    temporary directory and new hashes are appended to them; the files are
+    deduplicated one at a time when the duplicates are counted, so memory
+    holds the buffer and a single partition. Two different rows share a
+    hash with negligible probability.
+
+    Args:
+        buffer_rows (int): Hashes buffered before they are partitioned.
+        max_memory_bytes (int): Memory of the hashes kept in memory.
+        num_partitions (int): Number of partitions, a power of two.
+        spill_directory (Optional[str]): Parent directory of the partition
+            files, the system temporary directory if None.
+    """
+
+    def __init__(
+        self,
+        buffer_rows: int = 1 << 20,
+        max_memory_bytes: int = 256 * 1024 * 1024,
+        num_partitions: int = 256,
+        spill_directory: Optional[str] = None,
+    ):
+        if num_partitions & (num_partitions - 1):
+            raise ValueError("The number of partitions must be a power of two.")
+        self.buffer_rows = buffer_rows
+        self.max_memory_bytes = max_memory_bytes
+        self.num_partitions = num_partitions
+        self.spill_directory = spill_directory
+        self.num_rows = 0
+        shift = np.uint64(64 - (num_partitions.bit_length() - 1))
+        # The smallest hash of every partition.
+        self._starts = np.arange(num_partitions, dtype=np.uint64) << shift
+        self._distinct = [np.empty(0, dtype=np.uint64)] * num_partitions
+        self._pending: List[List[np.ndarray]] = [[] for _ in range(num_partitions)]
+        self._pending_rows = [0] * num_partitions
+        self._buffer: List[np.ndarray] = []
+        self._buffered = 0
+        self._directory: Optional[tempfile.TemporaryDirectory] = None
+
+    @property
+    def nbytes(self) -> int:
+        """Memory taken by the hashes, without the partition files."""
+        rows = self._buffered + sum(self._pending_rows)
+        return 8 * (rows + sum(len(distinct) for distinct in self._distinct))
+
+    @property
+    def spilled(self) -> bool:
+        """Whether the partitions were moved to files."""
+        return self._directory is not None
+
+    def add(self, hashes: np.ndarray):
+        """
+        Adds the hashes of a chunk of rows.
+
+        Args:
+            hashes (np.ndarray): Row hashes, see ``hash_rows``.
+        """
+        self.num_rows += len(hashes)
+        self._buffer.append(np.asarray(hashes, dtype=np.uint64))
+        self._buffered += len(hashes)
+        if self._buffered >= self.buffer_rows:
+            self._flush()
+
+    def merge(self, other: "DuplicateCounter"):
+        """
+        Merges the rows counted by another counter with the same partitions.
+
+        Args:
+            other (DuplicateCounter): The counter to merge.
+        """
+        other._flush()
+        self.num_rows += other.num_rows
+        for partition in range(other.num_partitions):
+            for hashes in other._read_partition(partition):
+                self._add_to_partition(partition, hashes)
+        self._check_memory()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        # Sorted, the hashes of a partition are contiguous.
+        hashes = np.unique(np.concatenate(self._buffer))
+        self._buffer, self._buffered = [], 0
+        bounds = np.r_[np.searchsorted(hashes, self._starts), len(hashes)]
+        for partition in range(self.num_partitions):
+            start, end = bounds[partition], bounds[partition + 1]
+            if start < end:
+                self._add_to_partition(partition, hashes[start:end])
+        self._check_memory()
+
+    def _add_to_partition(self, partition: int, hashes: np.ndarray):
+        if self.spilled:
+            with open(self._path(partition), "ab") as partition_file:
+                hashes.tofile(partition_file)
+            return
+        self._pending[partition].append(hashes)
+        self._pending_rows[partition] += len(hashes)
+        if self._pending_rows[partition] >= len(self._distinct[partition]):
+            self._compact(partition)
+
+    def _compact(self, partition: int):
+        if not self._pending[partition]:
+            return
+        # The sorted runs are merged, not sorted again, by the stable sort.
+        hashes = np.concatenate([self._distinct[partition], *self._pending[partition]])
+        hashes.sort(kind="stable")
+        self._distinct[partition] = hashes[np.r_[True, hashes[1:] != hashes[:-1]]]
+        self._pending[partition], self._pending_rows[partition] = [], 0
+
+    def _check_memory(self):
+        if self.spilled or self.nbytes <= self.max_memory_bytes:
+            return
+        if self.spill_directory is not None:
+            os.makedirs(self.spill_directory, exist_ok=True)
+        self._directory = tempfile.TemporaryDirectory(
+            prefix="duplicates-", dir=self.spill_directory
+        )
+        for partition in range(self.num_partitions):
+            self._compact(partition)
+            self._distinct[partition].tofile(self._path(partition))
+            self._distinct[partition] = np.empty(0, dtype=np.uint64)
+
+    def _path(self, partition: int) -> str:
+        return os.path.join(self._directory.name, f"{partition}.bin")
+
+    def _read_partition(self, partition: int) -> Iterator[np.ndarray]:
+        if self.spilled:
+            yield np.fromfile(self._path(partition), dtype=np.uint64)
+        else:
+            self._compact(partition)
+            yield self._distinct[partition]
+
+    def close(self):
+        """Removes the partition files; the counter cannot be used afterwards."""
+        if self._directory is not None:
+            self._directory.cleanup()
+
+    @property
+    def duplicates(self) -> int:
+        """Number of rows that repeat an earlier row."""
+        self._flush()
+        distinct = sum(
+            len(np.unique(hashes))
+            for partition in range(self.num_partitions)
+            for hashes in self._read_partition(partition)
+        )
+        return self.num_rows - distinct
+
+
+def hash_rows(rows: Union[pd.DataFrame, pa.RecordBatch]) -> np.ndarray:
+    """
+    Hashes whole rows for ``DuplicateCounter``, ignoring the index.
+
+    Args:
+        rows (Union[pd.DataFrame, pa.RecordBatch]): The rows.
+
+    Returns:
+        np.ndarray: One unsigned 64-bit hash per row.
+    """
+    if isinstance(rows, pa.RecordBatch):
+        rows = rows.to_pandas()
+    return pd.util.hash_pandas_object(rows, index=False).to_numpy()
+
+
+def hash_values(column: pa.Array) -> np.ndarray:
+    """
+    Hashes the non-null values of a column for ``HyperLogLog``.
+
+    Args:
+        column (pa.Array): The values.
+
+    Returns:
+        np.ndarray: One unsigned 64-bit hash per non-null value.
+    """
+    values = pc.drop_null(column).to_numpy(zero_copy_only=False)
+    return pd.util.hash_array(values)
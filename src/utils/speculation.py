@@ -0,0 +1,258 @@
+import threading
+import time
+import streamlit as st
+from concurrent.futures import Future, ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from utils.config import get_config
+
+
+class Speculation:
+    """
+    A model response generated in the background before it is requested.
+
+    The chunks are collected as they arrive, so a request for a response
+    that is still being generated streams the chunks received so far and
+    then follows the rest.
+
+    Args:
+        key (str): The cache key of the model call.
+        num_tokens (int): Tokens of the prompt, charged to the token budget.
+    """
+
+    def __init__(self, key: str, num_tokens: int):
+        self.key = key
+        self.num_tokens = num_tokens
+        self.created = time.monotonic()
+        self.chunks = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.future: Optional[Future] = None
+        self.refunded = False
+        self._cancelled = threading.Event()
+        self._condition = threading.Condition()
+
+    def run(self, stream: Callable[[], Iterable[str]], ctx=None):
+        """
+        Collects a response on a worker thread until it ends or is cancelled.
+
+        Args:
+            stream (Callable[[], Iterable[str]]): Starts streaming the response.
+            ctx: The script run context of the session, for cached resources.
+        """
+        add_script_run_ctx(threading.current_thread(), ctx)
+        try:
+            for chunk in stream():
+                if self._cancelled.is_set():
+                    break
+                with self._condition:
+                    self.chunks.append(chunk)
+                    self._condition.notify_all()
+        except Exception as error:
+            self.error = error
+        finally:
+            with self._condition:
+                self.done = True
+                self._condition.notify_all()
+
+    def cancel(self) -> bool:
+        """
+        Stops the speculation, before it starts if it is still queued.
+
+        Returns:
+            bool: True if it had not started yet.
+        """
+        self._cancelled.set()
+        return self.future is not None and self.future.cancel()
+
+    @property
+    def failed(self) -> bool:
+        """Whether the response ended with an error or was cancelled."""
+        return self.error is not None or self._cancelled.is_set()
+
+    def stream(self) -> Iterator[str]:
+        """
+        Streams the response, waiting for the chunks not received yet.
+
+        Yields:
+            str: The chunks of the response.
+
+        Raises:
+            Exception: The error raised while generating the response.
+        """
+        position = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: position < len(self.chunks) or self.done
+                )
+                chunks, done = self.chunks[position:], self.done
+            position += len(chunks)
+            yield from chunks
+            if done:
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class SpeculationCache:
+    """
+    Speculative model responses of one session.
+
+    Speculations run on an executor shared by all sessions, which caps how
+    many run at once. Every session may spend ``token_budget`` tokens on
+    speculations that are never requested: prompt tokens are charged when a
+    speculation starts, response tokens when it ends, and both are refunded
+    when its response is requested, as the tokens would have been spent
+    anyway. Speculations that are not requested within ``ttl_seconds`` are
+    cancelled.
+
+    Args:
+        executor (ThreadPoolExecutor): Runs the speculations.
+        count_tokens (Callable[[str], int]): Counts the tokens of a text.
+        token_budget (int): Tokens a session may spend on unused speculations.
+        ttl_seconds (float): Time after which unused speculations are cancelled.
+    """
+
+    def __init__(
+        self,
+        executor: ThreadPoolExecutor,
+        count_tokens: Callable[[str], int],
+        token_budget: int = 8000,
+        ttl_seconds: float = 300,
+    ):
+        self.executor = executor
+        self.count_tokens = count_tokens
+        self.token_budget = token_budget
+        self.ttl_seconds = ttl_seconds
+        self.spent_tokens = 0
+        self._entries: Dict[str, Speculation] = {}
+        self._lock = threading.Lock()
+
+    def start(
+        self, key: str, num_tokens: int, stream: Callable[[], Iterable[str]]
+    ) -> Optional[Speculation]:
+        """
+        Starts generating a response in the background.
+
+        Args:
+            key (str): The cache key of the model call.
+            num_tokens (int): Tokens of the prompt.
+            stream (Callable[[], Iterable[str]]): Starts streaming the response.
+
+        Returns:
+            Optional[Speculation]: The speculation, None if it would exceed
+            the token budget.
+        """
+        self.expire()
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key]
+            if self.spent_tokens + num_tokens > self.token_budget:
+                return None
+            self.spent_tokens += num_tokens
+            speculation = Speculation(key, num_tokens)
+            self._entries[key] = speculation
+        speculation.future = self.executor.submit(
+            self._run, speculation, stream, get_script_run_ctx()
+        )
+        return speculation
+
+    def _run(self, speculation: Speculation, stream, ctx):
+        speculation.run(stream, ctx)
+        num_tokens = self.count_tokens("".join(speculation.chunks))
+        with self._lock:
+            if not speculation.refunded:
+                speculation.num_tokens += num_tokens
+                self.spent_tokens += num_tokens
+
+    def take(self, key: str) -> Optional[Speculation]:
+        """
+        Removes the speculation of a model call to serve its response.
+
+        Args:
+            key (str): The cache key of the model call.
+
+        Returns:
+            Optional[Speculation]: The speculation, None if there is none or
+            it has not started, failed or been cancelled.
+        """
+        self.expire()
+        with self._lock:
+            speculation = self._entries.pop(key, None)
+        if speculation is None:
+            return None
+        self._refund(speculation)
+        if speculation.future.cancel() or speculation.failed:
+            return None
+        return speculation
+
+    def cancel(self, keep: Iterable[str] = ()):
+        """
+        Cancels the speculations, except those of the given keys.
+
+        Args:
+            keep (Iterable[str]): Keys of the speculations to keep.
+        """
+        keep = set(keep)
+        with self._lock:
+            cancelled = [
+                self._entries.pop(key) for key in list(self._entries) if key not in keep
+            ]
+        for speculation in cancelled:
+            if speculation.cancel():
+                self._refund(speculation)
+
+    def expire(self):
+        """Cancels the speculations older than ``ttl_seconds``."""
+        now = time.monotonic()
+        with self._lock:
+            keep = [
+                key
+                for key, speculation in self._entries.items()
+                if now - speculation.created <= self.ttl_seconds
+            ]
+        self.cancel(keep)
+
+    def _refund(self, speculation: Speculation):
+        with self._lock:
+            self.spent_tokens -= speculation.num_tokens
+            speculation.num_tokens = 0
+            # Response tokens are not charged once the prompt is refunded.
+            speculation.refunded = True
+
+
+@st.cache_resource(show_spinner=False)
+def get_speculation_executor() -> ThreadPoolExecutor:
+    """
+    Creates the thread pool shared by the speculations of all sessions.
+
+    Returns:
+        ThreadPoolExecutor: The pool, with ``max_concurrency`` threads.
+    """
+    config = get_config("speculation")
+    return ThreadPoolExecutor(
+        max_workers=config.get("max_concurrency", 2), thread_name_prefix="speculation"
+    )
+
+
+def get_speculation_cache(count_tokens: Callable[[str], int]) -> SpeculationCache:
+    """
+    Gets the speculation cache of the current session, creating it if needed.
+
+    Args:
+        count_tokens (Callable[[str], int]): Counts the tokens of a text.
+
+    Returns:
+        SpeculationCache: The cache.
+    """
+    if "speculation_cache" not in st.session_state:
+        config = get_config("speculation")
+        st.session_state["speculation_cache"] = SpeculationCache(
+            get_speculation_executor(),
+            count_tokens,
+            token_budget=config.get("token_budget", 8000),
+            ttl_seconds=config.get("ttl_seconds", 300),
+        )
+    return st.session_state["speculation_cache"]
@@ -0,0 +1,117 @@
+import logging
+import math
+import os
+import threading
+import streamlit as st
+from typing import Optional
+from tokenizers import Tokenizer
+
+from utils.config import get_config, resolve_path
+
+logger = logging.getLogger(__name__)
+
+
+class TokenizerLoader:
+    """Loads the tokenizer in a background thread.
+
+    The tokenizer is read from a local ``tokenizer.json`` through the Rust
+    ``tokenizers`` backend, falling back to the Hugging Face Hub when the file
+    is missing and ``hub_model`` is set. Until it is ready, token counts are
+    estimated from the text length so callers never wait for the load.
+    """
+
+    def __init__(self, path: str, hub_model: str, chars_per_token: float = 3.0):
+        self.path = path
+        self.hub_model = hub_model
+        self.chars_per_token = chars_per_token
+        self._tokenizer = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(
+            target=self._load, name="tokenizer-warm-up", daemon=True
+        )
+
+    def start(self) -> "TokenizerLoader":
+        """Start loading the tokenizer in the background."""
+        self._thread.start()
+        return self
+
+    def _load(self):
+        try:
+            if os.path.exists(self.path):
+                self._tokenizer = Tokenizer.from_file(self.path)
+            elif not self.hub_model:
+                logger.warning(
+                    "Tokenizer file %s not found, token counts will be"
+                    " estimated.",
+                    self.path,
+                )
+            else:
+                logger.warning(
+                    "Tokenizer file %s not found, downloading %s.",
+                    self.path,
+                    self.hub_model,
+                )
+                self._tokenizer = Tokenizer.from_pretrained(self.hub_model)
+        except Exception as error:
+            logger.error(
+                "Could not load the tokenizer, token counts will be"
+                " estimated: %s",
+                error,
+            )
+        finally:
+            self._ready.set()
+
+    def get(self, timeout: Optional[float] = 0) -> Optional[Tokenizer]:
+        """Get the tokenizer if it has been loaded.
+
+        Args:
+            timeout: Seconds to wait for the load to finish. None waits
+                until the load has finished.
+
+        Returns:
+            The tokenizer, or None if it is still loading or failed to load.
+        """
+        self._ready.wait(timeout)
+        return self._tokenizer
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether exact token counts are available."""
+        return self._tokenizer is not None
+
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens in a text, estimating them while loading.
+
+        Args:
+            text: The text to count.
+
+        Returns:
+            The number of tokens.
+        """
+        tokenizer = self.get()
+        if tokenizer is None:
+            return math.ceil(len(text) / self.chars_per_token)
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+@st.cache_resource(show_spinner=False)
+def get_tokenizer_loader() -> TokenizerLoader:
+    """Create the process-wide tokenizer loader and start loading.
+
+    The tokenizer path comes from the ``tokenizer`` section of the app config
+    and can be overridden with the ``PUFFIN_TOKENIZER_PATH`` environment
+    variable.
+
+    Returns:
+        The started tokenizer loader.
+    """
+    config = get_config("tokenizer")
+    path = os.environ.get(
+        "PUFFIN_TOKENIZER_PATH",
+        resolve_path(config.get("path", "assets/tokenizer/tokenizer.json")),
+    )
+    return TokenizerLoader(
+        path=path,
+        hub_model=config.get("hub_model", "huggyllama/llama-7b"),
+        chars_per_token=config.get("chars_per_token", 3.0),
+    ).start()
@@ -1,25 +1,41 @@
-import base64
+import logging
+import os
 import streamlit as st
+import streamlit.components.v1 as components
+from utils.media import get_media_sources, get_media_url
+
+logger = logging.getLogger(__name__)
+
+_lazy_media = components.declare_component(
+    "lazy_media",
+    path=os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "components",
+        "lazy_media",
+    ),
+)
 
 
 def display_gif(gif_path, width=None, height=None):
     """
     Display a GIF from a local file in a Streamlit app.
 
+    The GIF is served through Streamlit's static file serving under a
+    content-addressed URL, so only a small img tag is sent to the browser and
+    the file itself can be cached. Missing files are skipped.
+
     Parameters:
     gif_path (str): Path to the GIF file to be displayed.
     width (str, optional): Width of the GIF (e.g., '500px', '50%'). Defaults to None.
     height (str, optional): Height of the GIF (e.g., '500px', '50%'). Defaults to None.
     """
-    # Open the GIF file in binary mode
-    with open(gif_path, "rb") as file_:
-        contents = file_.read()
-
-    # Encode the GIF file to base64
-    data_url = base64.b64encode(contents).decode("utf-8")
+    gif_url = get_media_url(gif_path)
+    if gif_url is None:
+        logger.warning("GIF %s not found, skipping.", gif_path)
+        return
 
     # Create the img tag with optional width and height
-    img_tag = f'<img src="data:image/gif;base64,{data_url}" alt="GIF"'
+    img_tag = f'<img src="{gif_url}" alt="GIF"'
     if width:
         img_tag += f' width="{width}"'
     if height:
@@ -30,6 +46,37 @@ def display_gif(gif_path, width=None, height=None):
     st.markdown(img_tag, unsafe_allow_html=True)
 
 
+def display_media(media_path, width="100%", alt="Demo", key=None):
+    """
+    Display a tutorial clip that is only downloaded once it is on screen.
+
+    The clip is played from its transcoded WebM/MP4 versions when they exist,
+    with the GIF as fallback. Until the clip scrolls into view (or its
+    expander is opened) only a placeholder with its aspect ratio is rendered.
+    Missing files are skipped.
+
+    Parameters:
+    media_path (str): Path or file name of the clip, e.g. 'write_req.gif'.
+    width (str, optional): Width of the clip (e.g., '500px', '50%'). Defaults to '100%'.
+    alt (str, optional): Alternative text of the clip. Defaults to 'Demo'.
+    key (str, optional): Widget key of the component. Defaults to None.
+    """
+    media = get_media_sources(media_path)
+    if not media:
+        logger.warning("Media %s not found, skipping.", media_path)
+        return
+
+    media_width, media_height = media["size"] or (16, 9)
+    _lazy_media(
+        sources=media["sources"],
+        width=width,
+        aspect_ratio=f"{media_width} / {media_height}",
+        alt=alt,
+        key=key,
+        default=None,
+    )
+
+
 def set_page_width(width: int):
     """Set the page width for a Streamlit app with custom CSS.
 
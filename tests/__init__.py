@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app imports its modules from src, e.g. ``from utils.config import ...``.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
@@ -0,0 +1,60 @@
+import unittest
+
+from utils.arctic_operations import ArcticOps
+
+
+class WordCountOps(ArcticOps):
+    """Counts words instead of tokens, so budgets are easy to reason about."""
+
+    def get_num_tokens(self, prompt: str) -> int:
+        return len(prompt.split())
+
+    def get_message_num_tokens(self, message: dict) -> int:
+        return self.get_num_tokens(self.format_message(message))
+
+
+class TestCompactMessages(unittest.TestCase):
+    def setUp(self):
+        # Compaction needs no model backend, so the constructor is skipped.
+        self.ops = WordCountOps.__new__(WordCountOps)
+        self.ops.excerpt_chars = 20
+
+    def message(self, role: str, num_words: int, word: str = "word") -> dict:
+        return {"role": role, "content": " ".join([word] * num_words)}
+
+    def test_short_history_is_kept(self):
+        messages = [self.message("user", 5), self.message("assistant", 5)]
+        self.ops.max_prompt_tokens = 1000
+        self.assertEqual(self.ops.compact_messages(messages), messages)
+
+    def test_kept_history_is_contiguous(self):
+        messages = [
+            self.message("user", 10, "code"),
+            self.message("assistant", 10, "old"),
+            self.message("user", 200, "long"),
+            self.message("assistant", 10, "recent"),
+            self.message("user", 10, "latest"),
+        ]
+        self.ops.max_prompt_tokens = 100
+        kept = self.ops.compact_messages(messages)
+        # The long user turn does not fit, so the older answer before it is
+        # left out as well, even though it would fit.
+        self.assertEqual(
+            [message["content"].split()[0] for message in kept],
+            ["code", "recent", "latest"],
+        )
+
+    def test_long_answers_are_shortened(self):
+        messages = [
+            self.message("user", 10, "code"),
+            self.message("assistant", 200, "answer"),
+            self.message("user", 10, "latest"),
+        ]
+        self.ops.max_prompt_tokens = 60
+        kept = self.ops.compact_messages(messages)
+        self.assertEqual(len(kept), 3)
+        self.assertTrue(kept[1]["content"].startswith("(Earlier response, shortened)"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import numpy as np
+import pandas as pd
+
+from utils.correlation import compute_correlations
+
+
+def make_offset_data(offset: float, seed: int = 0) -> pd.DataFrame:
+    generator = np.random.default_rng(seed)
+    num_rows = 1000
+    base = generator.normal(size=num_rows)
+    df = pd.DataFrame(
+        {
+            name: offset + base * (index + 1) + generator.normal(size=num_rows)
+            for index, name in enumerate("abcde")
+        }
+    )
+    # Every column but the last misses different rows.
+    for name in "abcd":
+        df.loc[generator.choice(num_rows, 100, replace=False), name] = np.nan
+    return df
+
+
+class TestComputeCorrelations(unittest.TestCase):
+    def test_matches_pandas_with_missing_values_and_offsets(self):
+        for offset in (0.0, 1e6, 1e9):
+            df = make_offset_data(offset)
+            for method in ("pearson", "spearman"):
+                with self.subTest(offset=offset, method=method):
+                    matrix = compute_correlations(df, method)["matrix"]
+                    np.testing.assert_allclose(
+                        matrix.to_numpy(), df.corr(method).to_numpy(), atol=1e-9
+                    )
+
+    def test_matches_pandas_across_blocks(self):
+        df = make_offset_data(1e6)
+        result = compute_correlations(
+            df, "spearman", top_k=3, block_size=2, max_workers=2
+        )
+        expected = df.corr("spearman").where(~np.eye(5, dtype=bool)).abs()
+        self.assertAlmostEqual(
+            result["top_pairs"]["Correlation"].abs().max(), expected.max().max()
+        )
+
+    def test_constant_column_has_no_correlation(self):
+        df = pd.DataFrame({"a": [1.0, 2.0, np.nan, 4.0], "b": [5.0, 5.0, 5.0, 5.0]})
+        matrix = compute_correlations(df)["matrix"]
+        self.assertTrue(np.isnan(matrix.loc["a", "b"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
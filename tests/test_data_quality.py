@@ -0,0 +1,45 @@
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+from utils.data_quality import count_duplicate_rows
+
+
+class TestCountDuplicateRows(unittest.TestCase):
+    def setUp(self):
+        generator = np.random.default_rng(0)
+        self.df = pd.DataFrame(
+            {
+                "number": generator.integers(0, 20, 30000),
+                "text": generator.choice(["a", "b", None], 30000),
+                "value": generator.choice([0.5, np.nan], 30000),
+            }
+        )
+
+    def test_matches_pandas(self):
+        for chunk_rows in (1000, 100000):
+            with self.subTest(chunk_rows=chunk_rows):
+                self.assertEqual(
+                    count_duplicate_rows(self.df, chunk_rows),
+                    self.df.duplicated().sum(),
+                )
+
+    def test_matches_pandas_when_the_hashes_spill(self):
+        with tempfile.TemporaryDirectory() as spill_directory:
+            duplicates = count_duplicate_rows(
+                self.df,
+                chunk_rows=1000,
+                max_memory_bytes=1024,
+                spill_directory=spill_directory,
+            )
+        self.assertEqual(duplicates, self.df.duplicated().sum())
+
+    def test_index_is_ignored(self):
+        df = pd.DataFrame({"a": [1, 1, 2]}, index=[0, 1, 2])
+        self.assertEqual(count_duplicate_rows(df), 1)
+        self.assertEqual(count_duplicate_rows(df.iloc[:0]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
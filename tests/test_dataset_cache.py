@@ -0,0 +1,70 @@
+import io
+import json
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from utils.dataset_cache import METADATA_KEY, DatasetDiskCache
+from utils.ingestion import IngestedDataset, read_csv
+
+
+class TestDatasetDiskCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = DatasetDiskCache(directory.name)
+        generator = np.random.default_rng(0)
+        num_rows = 5000
+        df = pd.DataFrame(
+            {
+                "number": generator.normal(size=num_rows).round(2),
+                "label": generator.choice(["a", "b", None], num_rows),
+                "time": pd.Timestamp("2024-01-01", tz="UTC")
+                + pd.to_timedelta(generator.integers(0, 20, num_rows), unit="D"),
+            }
+        )
+        self.data = df.to_csv(index=False).encode()
+
+    def round_trip(self, dataset: IngestedDataset) -> IngestedDataset:
+        self.cache.put("key", *dataset.to_cache())
+        table, metadata = self.cache.get("key")
+        return IngestedDataset.from_cache("hash", table, metadata)
+
+    def test_large_file_statistics(self):
+        dataset = read_csv(
+            io.BytesIO(self.data), memory_budget_bytes=1 << 14, block_size=1 << 14
+        )
+        self.assertTrue(dataset.large_file)
+        cached = self.round_trip(dataset)
+        stats, cached_stats = dataset.stats, cached.stats
+        self.assertEqual(cached.schema, dataset.schema)
+        self.assertEqual(cached.num_rows, dataset.num_rows)
+        self.assertEqual(cached_stats.duplicate_rows, stats.duplicate_rows)
+        self.assertEqual(cached_stats.non_null_counts, stats.non_null_counts)
+        self.assertEqual(cached_stats.distinct_counts, stats.distinct_counts)
+        self.assertEqual(cached_stats.top_values(), stats.top_values())
+        pd.testing.assert_frame_equal(cached_stats.describe(), stats.describe())
+        pd.testing.assert_frame_equal(cached.sample, dataset.sample)
+
+    def test_metadata_is_json(self):
+        dataset = read_csv(io.BytesIO(self.data))
+        self.cache.put("key", *dataset.to_cache())
+        with pa.memory_map(self.cache.path("key")) as source:
+            schema = pa.ipc.open_file(source).schema
+        values = json.loads(schema.metadata[METADATA_KEY])
+        self.assertEqual(values["num_rows"], 5000)
+        self.assertIsNone(values["stats"])
+        cached = self.round_trip(dataset)
+        pd.testing.assert_frame_equal(cached.sample, dataset.sample)
+
+    def test_unreadable_entries_are_misses(self):
+        with open(self.cache.path("key"), "wb") as file:
+            file.write(b"not an arrow file")
+        self.assertIsNone(self.cache.get("key"))
+        self.assertIsNone(self.cache.get("missing"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import numpy as np
+import pandas as pd
+
+from utils.dataset_profile import _format_repeated_values, profile_columns
+
+
+class TestProfileColumns(unittest.TestCase):
+    def setUp(self):
+        generator = np.random.default_rng(0)
+        num_rows = 500
+        dates = generator.choice(["2020-01-01", "2021-05-03", None], num_rows)
+        self.df = pd.DataFrame(
+            {
+                "float": generator.choice([1.5, 2.5, np.nan, 0.0], num_rows),
+                "int": generator.integers(0, 5, num_rows),
+                "bool": generator.choice([True, False], num_rows),
+                "date": pd.to_datetime(dates),
+                "date_utc": pd.to_datetime(dates).tz_localize("UTC"),
+                "object": generator.choice(["x", "y", None], num_rows).astype(object),
+                "arrow": pd.Series(
+                    generator.choice(["x", "y", None], num_rows),
+                    dtype="string[pyarrow]",
+                ),
+                "category": pd.Categorical(generator.choice(["p", "q"], num_rows)),
+                "once": [1.0] + [np.nan] * (num_rows - 1),
+            }
+        )
+
+    def test_counts_match_pandas(self):
+        profile = profile_columns(self.df).set_index("Column")
+        pd.testing.assert_series_equal(
+            profile["Unique"], self.df.nunique(), check_names=False
+        )
+        pd.testing.assert_series_equal(
+            profile["Non-Null Count"], self.df.notna().sum(), check_names=False
+        )
+
+    def test_top_values_match_pandas(self):
+        profile = profile_columns(self.df, top_values=2).set_index("Column")
+        for column in self.df.columns:
+            with self.subTest(column=column):
+                value_counts = self.df[column].value_counts().head(2)
+                value_counts = value_counts[value_counts > 1]
+                expected = ", ".join(
+                    f"{value} ({count})" for value, count in value_counts.items()
+                )
+                self.assertEqual(profile.loc[column, "Top Values"], expected)
+
+    def test_dates_are_formatted_as_timestamps(self):
+        top = profile_columns(self.df).set_index("Column").loc["date", "Top Values"]
+        self.assertIn("2020-01-01 00:00:00 (", top)
+        self.assertNotIn("T00:00:00.000000000", top)
+
+    def test_empty_frames(self):
+        self.assertEqual(len(profile_columns(self.df.iloc[:0])), len(self.df.columns))
+        self.assertTrue(profile_columns(pd.DataFrame()).empty)
+
+    def test_repeated_values_of_sketches(self):
+        self.assertEqual(_format_repeated_values([("a", 3), ("b", 1)]), "a (3)")
+        self.assertEqual(_format_repeated_values([("a", 1)]), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
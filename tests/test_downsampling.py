@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+import pandas as pd
+
+from utils.downsampling import ROWS_COLUMN, downsample_line, downsample_scatter, lttb
+
+
+class TestDownsampling(unittest.TestCase):
+    def setUp(self):
+        generator = np.random.default_rng(0)
+        num_rows = 10000
+        self.df = pd.DataFrame(
+            {
+                "time": pd.date_range("2024-01-01", periods=num_rows, freq="min"),
+                "value": generator.normal(size=num_rows).cumsum(),
+                "Rows": generator.integers(0, 10, num_rows),
+            }
+        )
+
+    def test_lttb_keeps_first_and_last_points(self):
+        x = np.arange(1000, dtype=np.float64)
+        selected = lttb(x, np.sin(x / 50), 100)
+        self.assertEqual(len(selected), 100)
+        self.assertEqual((selected[0], selected[-1]), (0, 999))
+        self.assertTrue((np.diff(selected) > 0).all())
+
+    def test_line_with_time_zone(self):
+        df = self.df.assign(time=self.df["time"].dt.tz_localize("Europe/Berlin"))
+        naive = downsample_line(self.df, "time", "value", max_points=200)
+        aware = downsample_line(df, "time", "value", max_points=200)
+        self.assertEqual(len(aware), 200)
+        np.testing.assert_array_equal(aware["value"], naive["value"])
+
+    def test_scatter_counts_every_row(self):
+        for max_points in (100, 20000):
+            points = downsample_scatter(self.df, "Rows", "value", max_points)
+            self.assertEqual(list(points.columns), ["Rows", "value", ROWS_COLUMN])
+            self.assertEqual(points[ROWS_COLUMN].sum(), len(self.df))
+            self.assertLessEqual(len(points), max(max_points, 100))
+
+
+if __name__ == "__main__":
+    unittest.main()
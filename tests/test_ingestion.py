@@ -0,0 +1,37 @@
+import io
+import unittest
+import pyarrow as pa
+
+from utils.ingestion import deduplicate_names, load_csv, read_csv
+
+
+class TestReadCsv(unittest.TestCase):
+    def test_column_changing_type_is_read_as_strings(self):
+        rows = b"".join(b"%d,%d\n" % (i, i) for i in range(20000))
+        data = b"a,b\n" + rows + b"1,x1\n"
+        for memory_budget_bytes in (1 << 30, 1 << 12):
+            with self.subTest(memory_budget_bytes=memory_budget_bytes):
+                dataset = read_csv(
+                    io.BytesIO(data),
+                    memory_budget_bytes=memory_budget_bytes,
+                    block_size=1 << 14,
+                )
+                self.assertEqual(dataset.num_rows, 20001)
+                self.assertEqual(dataset.schema.field("b").type, pa.string())
+
+    def test_duplicate_names_are_renamed_like_pandas(self):
+        dataset = read_csv(io.BytesIO(b"a,a,b\n1,2,3\n"))
+        self.assertEqual(list(dataset.df.columns), ["a", "a.1", "b"])
+        self.assertEqual(deduplicate_names(["a", "a", "a.1"]), ["a", "a.2", "a.1"])
+
+
+class TestLoadCsv(unittest.TestCase):
+    def test_unreadable_files_raise_arrow_invalid(self):
+        for data in (b"", b"a,b\n1,2\n1,2,3,4\n"):
+            with self.subTest(data=data):
+                with self.assertRaises(pa.ArrowInvalid):
+                    load_csv(io.BytesIO(data))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import duckdb
+import pandas as pd
+
+from utils.query_engine import (
+    QueryEngine,
+    QueryResultCache,
+    extract_sql,
+    normalise_sql,
+)
+
+
+class TestExtractSql(unittest.TestCase):
+    def test_fenced_block(self):
+        response = "Here is the query:\n```sql\nSELECT 1;\n```\nIt selects one."
+        self.assertEqual(extract_sql(response), "SELECT 1")
+
+    def test_unterminated_block(self):
+        response = "```SQL\nSELECT a FROM dataset;;"
+        self.assertEqual(extract_sql(response), "SELECT a FROM dataset")
+
+    def test_plain_response(self):
+        self.assertEqual(extract_sql("  SELECT 1 ; \n"), "SELECT 1")
+
+
+class TestNormaliseSql(unittest.TestCase):
+    def test_equivalent_spellings(self):
+        self.assertEqual(
+            normalise_sql("SELECT  A\n FROM dataset -- all rows\n;"),
+            normalise_sql("select a /* comment */ from DATASET"),
+        )
+
+    def test_literals_and_quoted_names_keep_their_case(self):
+        self.assertEqual(
+            normalise_sql("SELECT \"Name\" FROM dataset WHERE x = 'A  B'"),
+            "select \"Name\" from dataset where x = 'A  B'",
+        )
+        self.assertNotEqual(normalise_sql("SELECT 'A'"), normalise_sql("SELECT 'a'"))
+
+    def test_comment_markers_inside_literals(self):
+        self.assertEqual(normalise_sql("SELECT '--x', 5-3"), "select '--x', 5-3")
+
+
+class TestQueryEngine(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({"a": range(100), "b": ["x", "y"] * 50})
+        self.engine = QueryEngine(QueryResultCache(), max_result_rows=10)
+
+    def test_validate(self):
+        connection = duckdb.connect()
+        self.addCleanup(connection.close)
+        QueryEngine.validate(connection, "SELECT * FROM dataset")
+        for sql in (
+            "",
+            "SELECT 1; SELECT 2",
+            "DROP TABLE dataset",
+            "COPY dataset TO 'x.csv'",
+        ):
+            with self.subTest(sql=sql), self.assertRaises(ValueError):
+                QueryEngine.validate(connection, sql)
+
+    def test_run_truncates_and_caches(self):
+        answer = self.engine.run(self.df, "SELECT * FROM dataset", "hash")
+        self.assertEqual(len(answer["result"]), 10)
+        self.assertTrue(answer["truncated"])
+        self.assertFalse(answer["cached"])
+        answer = self.engine.run(self.df, "select * from DATASET;", "hash")
+        self.assertTrue(answer["cached"])
+
+    def test_files_cannot_be_read(self):
+        with self.assertRaises(duckdb.Error):
+            self.engine.run(self.df, "SELECT * FROM read_csv('/etc/passwd')", "hash")
+
+    def test_limits(self):
+        engine = QueryEngine(memory_limit_mb=64, threads=1, timeout_seconds=0.2)
+        answer = engine.run(
+            self.df,
+            "SELECT current_setting('memory_limit') AS memory, "
+            "current_setting('threads') AS threads",
+            "hash",
+        )
+        self.assertEqual(answer["result"].iloc[0].tolist(), ["61.0 MiB", 1])
+        with self.assertRaises(TimeoutError):
+            engine.run(self.df, "SELECT count(*) FROM range(1000000000000)", "hash")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+import weakref
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from utils.dataset_cache import DatasetDiskCache
+from utils.ingestion import IngestedDataset
+from utils.session_memory import SessionMemoryManager
+
+
+class TestSessionMemory(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.manager = SessionMemoryManager(
+            os.path.join(self.directory.name, "spill"), max_bytes=1 << 30
+        )
+        generator = np.random.default_rng(0)
+        self.df = pd.DataFrame(
+            {
+                "number": generator.normal(size=10000),
+                "text": generator.choice(["a", "b", "c"], 10000).astype(object),
+            }
+        )
+
+    def spill_files(self):
+        return os.listdir(self.manager.spill_directory)
+
+    def test_spill_and_reload(self):
+        handle = self.manager.track(self.df, "hash")
+        self.assertTrue(handle.spill())
+        self.assertEqual(len(self.spill_files()), 1)
+        pd.testing.assert_frame_equal(handle.get(), self.df)
+        self.assertEqual(self.spill_files(), [])
+        del handle
+        self.assertEqual(self.manager.stats()["resident_dataframes"], 0)
+
+    def test_finalizers_do_not_accumulate(self):
+        handle = self.manager.track(self.df, "hash")
+        released = []
+        handle.get_derived("length", len, lambda: released.append(True))
+        finalizers = len(weakref.finalize._registry)
+        for _ in range(5):
+            handle.spill()
+            handle.get_derived("length", len, lambda: released.append(True))
+        self.assertEqual(len(weakref.finalize._registry), finalizers)
+        self.assertEqual(len(released), 5)
+        handle.spill()
+        del handle
+        # The derived object was released once more by the spill, and the
+        # finalizer of the collected handle removed the spill file.
+        self.assertEqual(len(released), 6)
+        self.assertEqual(self.spill_files(), [])
+
+    def test_cached_dataset_is_linked_instead_of_written(self):
+        cache = DatasetDiskCache(os.path.join(self.directory.name, "datasets"))
+        df = self.df.astype({"text": "string[pyarrow]"})
+        dataset = IngestedDataset(df, "hash", pa.Schema.from_pandas(df), len(df))
+        cache.put("key", *dataset.to_cache())
+        cached = IngestedDataset.from_cache(
+            "hash", *cache.get("key"), source_path=cache.path("key")
+        )
+        handle = self.manager.track(
+            cached.df,
+            cached.dataset_hash,
+            source_path=cached.source_path,
+            mapped_bytes=cached.mapped_bytes,
+        )
+        total_bytes = cached.df.memory_usage(index=True, deep=True).sum()
+        self.assertLess(handle.nbytes, total_bytes / 2)
+
+        self.assertTrue(handle.spill())
+        spill_path = os.path.join(self.manager.spill_directory, self.spill_files()[0])
+        self.assertTrue(os.path.samefile(spill_path, cache.path("key")))
+        # The linked copy outlives the eviction of the cache file.
+        cache.remove("key")
+        pd.testing.assert_frame_equal(handle.get(), cached.df)
+
+
+if __name__ == "__main__":
+    unittest.main()
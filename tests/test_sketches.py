@@ -0,0 +1,150 @@
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from utils.sketches import (
+    DuplicateCounter,
+    HeavyHitters,
+    HyperLogLog,
+    TDigest,
+    hash_rows,
+    hash_values,
+)
+
+
+class TestTDigest(unittest.TestCase):
+    def test_quantiles_are_close_to_exact(self):
+        values = np.random.default_rng(0).lognormal(size=100000)
+        digest = TDigest()
+        for chunk in np.array_split(values, 37):
+            digest.add(chunk)
+        for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+            with self.subTest(q=q):
+                # The error is bounded in rank, not in value.
+                rank = np.mean(values <= digest.quantile(q))
+                self.assertAlmostEqual(rank, q, delta=0.005)
+        self.assertEqual(digest.quantile(0.0), values.min())
+        self.assertEqual(digest.quantile(1.0), values.max())
+
+    def test_merge_matches_single_digest(self):
+        values = np.random.default_rng(1).normal(size=50000)
+        first, second = TDigest(), TDigest()
+        first.add(values[:20000])
+        second.add(values[20000:])
+        first.merge(second)
+        self.assertEqual(first.count, len(values))
+        self.assertAlmostEqual(first.quantile(0.5), np.median(values), delta=0.02)
+
+    def test_empty_digest_has_no_quantiles(self):
+        self.assertTrue(np.isnan(TDigest().quantile(0.5)))
+
+
+class TestHyperLogLog(unittest.TestCase):
+    def test_count_is_within_the_error_bound(self):
+        for num_distinct in (100, 10000, 200000):
+            with self.subTest(num_distinct=num_distinct):
+                values = pa.array(np.arange(num_distinct).repeat(2))
+                sketch = HyperLogLog(12)
+                sketch.add(hash_values(values))
+                self.assertAlmostEqual(
+                    sketch.count(), num_distinct, delta=0.05 * num_distinct
+                )
+
+    def test_merge_counts_the_union(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        first.add(hash_values(pa.array(np.arange(0, 6000))))
+        second.add(hash_values(pa.array(np.arange(3000, 9000))))
+        first.merge(second)
+        self.assertAlmostEqual(first.count(), 9000, delta=450)
+
+    def test_precision_is_checked(self):
+        with self.assertRaises(ValueError):
+            HyperLogLog(8)
+
+
+class TestHeavyHitters(unittest.TestCase):
+    def test_frequent_values_are_found(self):
+        generator = np.random.default_rng(2)
+        values = np.concatenate(
+            [np.full(3000, "a"), np.full(2000, "b"), generator.integers(0, 5000, 10000)]
+        ).astype(str)
+        generator.shuffle(values)
+        summary = HeavyHitters(capacity=8)
+        for chunk in np.array_split(values, 10):
+            summary.add(pa.array(chunk))
+        top = summary.top(2)
+        self.assertEqual([value for value, _ in top], ["a", "b"])
+        # Counts are lower bounds, at most the error below the true count.
+        self.assertLessEqual(top[0][1], 3000)
+        self.assertGreaterEqual(top[0][1], 3000 - summary.error)
+
+    def test_uniform_values_are_not_frequent(self):
+        summary = HeavyHitters(capacity=4)
+        summary.add(pa.array(np.arange(1000)))
+        self.assertEqual(summary.top(3), [])
+
+    def test_nulls_are_ignored(self):
+        summary = HeavyHitters()
+        summary.add(pa.array([None, None, None, 1]))
+        self.assertEqual(summary.top(1), [(1, 1)])
+
+
+class TestDuplicateCounter(unittest.TestCase):
+    def setUp(self):
+        generator = np.random.default_rng(3)
+        self.df = pd.DataFrame(
+            {
+                "a": generator.integers(0, 50, 20000),
+                "b": generator.integers(0, 50, 20000).astype(str),
+            }
+        )
+        self.expected = int(self.df.duplicated().sum())
+
+    def count(self, counter: DuplicateCounter, chunk_rows: int = 999) -> int:
+        for start in range(0, len(self.df), chunk_rows):
+            counter.add(hash_rows(self.df.iloc[start : start + chunk_rows]))
+        return counter.duplicates
+
+    def test_counts_duplicates_exactly(self):
+        counter = DuplicateCounter(buffer_rows=4096)
+        self.assertEqual(self.count(counter), self.expected)
+        self.assertFalse(counter.spilled)
+
+    def test_spills_partitions_over_the_memory_limit(self):
+        with tempfile.TemporaryDirectory() as spill_directory:
+            counter = DuplicateCounter(
+                buffer_rows=4096,
+                max_memory_bytes=8 * 1024,
+                num_partitions=16,
+                spill_directory=spill_directory,
+            )
+            self.assertEqual(self.count(counter), self.expected)
+            self.assertTrue(counter.spilled)
+            self.assertLessEqual(counter.nbytes, 8 * 4096)
+            counter.close()
+
+    def test_merge_counts_duplicates_across_counters(self):
+        first = DuplicateCounter(buffer_rows=1000)
+        second = DuplicateCounter(buffer_rows=1000, max_memory_bytes=0)
+        half = len(self.df) // 2
+        first.add(hash_rows(self.df.iloc[:half]))
+        second.add(hash_rows(self.df.iloc[half:]))
+        first.merge(second)
+        second.close()
+        self.assertEqual(first.duplicates, self.expected)
+
+    def test_counts_record_batches_like_dataframes(self):
+        batch = pa.RecordBatch.from_pandas(self.df, preserve_index=False)
+        counter = DuplicateCounter()
+        counter.add(hash_rows(batch))
+        self.assertEqual(counter.duplicates, self.expected)
+
+    def test_number_of_partitions_is_checked(self):
+        with self.assertRaises(ValueError):
+            DuplicateCounter(num_partitions=10)
+
+
+if __name__ == "__main__":
+    unittest.main()